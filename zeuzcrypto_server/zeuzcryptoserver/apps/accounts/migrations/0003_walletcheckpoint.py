@@ -0,0 +1,32 @@
+# Generated by Django 5.2.7 on 2026-10-18 12:11
+
+import django.db.models.deletion
+import uuid
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0002_wallettransaction'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='WalletCheckpoint',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('balance', models.DecimalField(decimal_places=2, max_digits=15)),
+                ('as_of', models.DateTimeField()),
+                ('entries', models.PositiveIntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='wallet_checkpoints', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'db_table': 'account_wallet_checkpoints',
+                'ordering': ['-as_of'],
+                'indexes': [models.Index(fields=['user', 'as_of'], name='account_wal_user_id_a03184_idx')],
+            },
+        ),
+    ]
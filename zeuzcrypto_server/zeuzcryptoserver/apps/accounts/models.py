@@ -281,6 +281,26 @@ class WalletTransaction(models.Model):
     def __str__(self):
         return f"{self.user.email} - {self.transaction_type} - {self.amount}"
 
+
+class WalletCheckpoint(models.Model):
+    """Wallet balance as of ``as_of``; later ledger entries are added on top of it"""
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    user = models.ForeignKey('User', on_delete=models.CASCADE, related_name='wallet_checkpoints')
+    balance = models.DecimalField(max_digits=15, decimal_places=2)
+    as_of = models.DateTimeField()
+    entries = models.PositiveIntegerField(default=0)  # ledger rows folded in since the previous checkpoint
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        db_table = 'account_wallet_checkpoints'
+        ordering = ['-as_of']
+        indexes = [
+            models.Index(fields=['user', 'as_of']),
+        ]
+
+    def __str__(self):
+        return f"{self.user.email} - {self.balance} @ {self.as_of}"
+
 class UserProfile(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE, related_name="profile")
     avatar = models.ImageField(upload_to="avatars/", null=True, blank=True)
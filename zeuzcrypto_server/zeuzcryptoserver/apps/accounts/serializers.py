@@ -6,6 +6,7 @@ from django.contrib.auth.password_validation import validate_password
 from django.utils import timezone
 from .models import User, UserProfile, UserWallet, UserBatch, UserApproval
 from apps.admin.subscriptions.models import Subscription
+from apps.client.trading.wallet_services import WalletService
 
 class UserProfileSerializer(serializers.ModelSerializer):
     class Meta:
@@ -19,6 +20,16 @@ class UserWalletSerializer(serializers.ModelSerializer):
         fields = ['balance']
         read_only_fields = ['balance']
 
+    def to_representation(self, instance):
+        """In ledger mode the stored balance is stale: report the ledger-derived one"""
+        data = super().to_representation(instance)
+        balance = getattr(instance, 'ledger_balance', None)
+        if balance is None and WalletService.ledger_mode():
+            balance = WalletService.ledger_balance(instance.user_id)
+        if balance is not None:
+            data['balance'] = self.fields['balance'].to_representation(balance)
+        return data
+
 
 class UserSerializer(serializers.ModelSerializer):
     profile = UserProfileSerializer(read_only=True)
@@ -365,7 +376,9 @@ class UserDetailWithAllDataSerializer(serializers.ModelSerializer):
     def get_wallet(self, obj):
         """Return wallet details"""
         try:
-            wallet = UserWallet.objects.get(user=obj)
-            return UserWalletSerializer(wallet).data
+            wallets = UserWallet.objects.filter(user=obj)
+            if WalletService.ledger_mode():
+                wallets = WalletService.annotate_ledger(wallets)
+            return UserWalletSerializer(wallets.get()).data
         except UserWallet.DoesNotExist:
             return None
\ No newline at end of file
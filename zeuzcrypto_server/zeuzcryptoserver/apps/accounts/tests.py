@@ -1,3 +1,31 @@
-from django.test import TestCase
+from decimal import Decimal
 
-# Create your tests here.
+from django.conf import settings
+from django.test import TestCase, override_settings
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from apps.client.trading.wallet_services import WalletService
+from .models import User, UserWallet
+from .serializers import UserSerializer
+from .views import WalletView
+
+
+class WalletBalanceTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(email='wallet@example.com', mobile='9200000001', password='pw12345678')
+        UserWallet.objects.filter(user=self.user).update(balance=Decimal('100.00'))
+
+    def wallet_response(self):
+        request = APIRequestFactory().get('/wallet/')
+        force_authenticate(request, user=self.user)
+        return WalletView.as_view()(request).data
+
+    def test_ledger_mode_reports_ledger_balance(self):
+        with override_settings(TRADING_SETTINGS={**settings.TRADING_SETTINGS, 'WALLET_LEDGER_MODE': True}):
+            WalletService.settle(self.user, [WalletService.leg('DEBIT', 40, 'buy')])
+
+            self.assertEqual(self.wallet_response(), {'balance': '60.00'})
+            self.assertEqual(UserSerializer(User.objects.get(pk=self.user.pk)).data['wallet'], {'balance': '60.00'})
+
+        # The row itself was not written per order
+        self.assertEqual(self.wallet_response(), {'balance': '100.00'})
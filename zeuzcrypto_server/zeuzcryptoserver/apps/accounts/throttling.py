@@ -0,0 +1,17 @@
+# accounts/throttling.py
+from apps.caching import IPSlidingWindowThrottle
+
+
+class LoginRateThrottle(IPSlidingWindowThrottle):
+    """Login attempts per client IP"""
+    scope = "login"
+
+
+class RegistrationRateThrottle(IPSlidingWindowThrottle):
+    """B2C registrations per client IP"""
+    scope = "registration"
+
+
+class PasswordResetRateThrottle(IPSlidingWindowThrottle):
+    """Password reset emails per client IP"""
+    scope = "password_reset"
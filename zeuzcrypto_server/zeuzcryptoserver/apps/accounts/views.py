@@ -10,11 +10,13 @@ from django.utils import timezone
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework import filters
 from apps.admin.subscriptions.models import Subscription
+from apps.client.trading.wallet_services import WalletService
 
 from .models import User, UserProfile, UserWallet, UserBatch, UserApproval
 from .serializers import *
 
 from apps.permission.permissions import IsAdmin, IsB2BAdmin, IsAdminOrB2BAdmin, IsOwnerOrAdmin
+from .throttling import LoginRateThrottle, RegistrationRateThrottle, PasswordResetRateThrottle
 
 
 # Authentication Views
@@ -38,6 +40,7 @@ from apps.permission.permissions import IsAdmin, IsB2BAdmin, IsAdminOrB2BAdmin,
 #         })
 class LoginView(APIView):
     permission_classes = [AllowAny]
+    throttle_classes = [LoginRateThrottle]
 
     def post(self, request):
         serializer = LoginSerializer(data=request.data, context={'request': request})
@@ -95,6 +98,7 @@ class LogoutView(APIView):
 class RegisterView(APIView):
     """B2C user registration"""
     permission_classes = [AllowAny]
+    throttle_classes = [RegistrationRateThrottle]
 
     def post(self, request):
         serializer = UserRegistrationSerializer(data=request.data)
@@ -144,6 +148,7 @@ class B2BUserRegisterView(APIView):
 # Password Management Views
 class PasswordResetView(APIView):
     permission_classes = [AllowAny]
+    throttle_classes = [PasswordResetRateThrottle]
 
     def post(self, request):
         serializer = PasswordResetSerializer(data=request.data)
@@ -396,7 +401,10 @@ class WalletView(APIView):
     permission_classes = [IsAuthenticated]
 
     def get(self, request):
-        wallet = get_object_or_404(UserWallet, user=request.user)
+        wallets = UserWallet.objects.filter(user=request.user)
+        if WalletService.ledger_mode():
+            wallets = WalletService.annotate_ledger(wallets)
+        wallet = get_object_or_404(wallets)
         serializer = UserWalletSerializer(wallet)
         return Response(serializer.data)
 
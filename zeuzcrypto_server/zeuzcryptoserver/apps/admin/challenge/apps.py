@@ -5,4 +5,7 @@ class ChallengeConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "apps.admin.challenge"
 
+    def ready(self):
+        import apps.admin.challenge.signals
+
 
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.7 on 2026-10-18 12:11
+
+import django.db.models.deletion
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('challenge', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ChallengeWalletCheckpoint',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('available_balance', models.DecimalField(decimal_places=2, max_digits=15)),
+                ('locked_balance', models.DecimalField(decimal_places=2, max_digits=15)),
+                ('earned_balance', models.DecimalField(decimal_places=2, max_digits=15)),
+                ('as_of', models.DateTimeField()),
+                ('entries', models.PositiveIntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('wallet', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='checkpoints', to='challenge.challengewallet')),
+            ],
+            options={
+                'db_table': 'challenge_wallet_checkpoints',
+                'ordering': ['-as_of'],
+                'indexes': [models.Index(fields=['wallet', 'as_of'], name='challenge_w_wallet__20024d_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 5.2.7 on 2026-10-18 12:20
+
+import django.db.models.deletion
+import uuid
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('challenge', '0002_challengewalletcheckpoint'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ChallengeProgramLeaderboard',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('rank', models.IntegerField()),
+                ('avg_score', models.DecimalField(decimal_places=2, max_digits=5)),
+                ('avg_return', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('total_coins', models.PositiveIntegerField(default=0)),
+                ('weeks_played', models.PositiveIntegerField(default=0)),
+                ('last_updated', models.DateTimeField(auto_now=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('program', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='leaderboard_entries', to='challenge.challengeprogram')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'db_table': 'challenge_program_leaderboard',
+                'ordering': ['rank'],
+                'indexes': [models.Index(fields=['program', 'rank'], name='challenge_p_program_efcf8d_idx')],
+                'unique_together': {('program', 'user')},
+            },
+        ),
+    ]
@@ -138,3 +138,23 @@ class ChallengeLeaderboard(models.Model):
         unique_together = [['week', 'participation']]
         indexes = [models.Index(fields=['week', 'rank'])]
 
+
+class ChallengeProgramLeaderboard(models.Model):
+    """Materialized program (cumulative) leaderboard, one row per user"""
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    program = models.ForeignKey('ChallengeProgram', on_delete=models.CASCADE, related_name='leaderboard_entries')
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    rank = models.IntegerField()
+    avg_score = models.DecimalField(max_digits=5, decimal_places=2)
+    avg_return = models.DecimalField(max_digits=10, decimal_places=2)
+    total_coins = models.PositiveIntegerField(default=0)
+    weeks_played = models.PositiveIntegerField(default=0)
+    last_updated = models.DateTimeField(auto_now=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        db_table = 'challenge_program_leaderboard'
+        ordering = ['rank']
+        unique_together = [['program', 'user']]
+        indexes = [models.Index(fields=['program', 'rank'])]
+
@@ -138,6 +138,25 @@ class ChallengeWalletTransaction(models.Model):
         ]
 
 
+class ChallengeWalletCheckpoint(models.Model):
+    """Wallet buckets as of ``as_of``; later transactions are added on top of them"""
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    wallet = models.ForeignKey(ChallengeWallet, on_delete=models.CASCADE, related_name='checkpoints')
+    available_balance = models.DecimalField(max_digits=15, decimal_places=2)
+    locked_balance = models.DecimalField(max_digits=15, decimal_places=2)
+    earned_balance = models.DecimalField(max_digits=15, decimal_places=2)
+    as_of = models.DateTimeField()
+    entries = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        db_table = 'challenge_wallet_checkpoints'
+        ordering = ['-as_of']
+        indexes = [
+            models.Index(fields=['wallet', 'as_of']),
+        ]
+
+
 
 
 # import uuid
@@ -3,6 +3,7 @@
 from apps.admin.challenge.services.wallet_service import WalletService
 from apps.admin.challenge.services.trade_service import TradeService
 from apps.admin.challenge.services.scoring_service import ScoringService
+from apps.admin.challenge.services.equity_service import EquityService
 from apps.admin.challenge.services.reward_service import RewardService
 from apps.admin.challenge.services.task_verification import TaskVerificationEngine
 from apps.admin.challenge.services.admin_service import AdminService
@@ -14,6 +15,7 @@ __all__ = [
     'WalletService',
     'TradeService',
     'ScoringService',
+    'EquityService',
     'RewardService',
     'TaskVerificationEngine',
     'AdminService',
@@ -0,0 +1,166 @@
+# equity_service.py
+import math
+import logging
+from datetime import timedelta
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Q
+from django.utils import timezone
+from apps.admin.challenge.models.wallet_models import ChallengeWallet, ChallengeWalletTransaction
+from apps.admin.challenge.services.wallet_service import WalletService
+
+logger = logging.getLogger(__name__)
+
+
+class EquityService:
+    """
+    Equity curves of challenge wallets and the risk metrics behind the
+    money management score.
+
+    Equity (available + locked + earned coins) is replayed from the wallet
+    ledger in order. Closed trades (PROFIT_ADD / LOSS_DEDUCT) are the
+    curve's returns; deposits, bonuses and resets move equity without
+    counting as one. Each wallet keeps an accumulator - running peak, max
+    drawdown and the Welford mean/variance of returns - cached per
+    participation as of ``now - EQUITY_CURVE_LAG``, so a later run streams
+    only the rows that arrived since. Rows inside the lag window are applied
+    to a copy and never cached, as slower commits may still land before them.
+    """
+
+    # Ledger types that are trading results; every other type is a capital flow
+    RETURN_TYPES = ('PROFIT_ADD', 'LOSS_DEDUCT')
+
+    @staticmethod
+    def cache_key(participation_id):
+        return f"challenge:equity:{participation_id}"
+
+    @staticmethod
+    def new_state():
+        return {
+            'as_of': None,
+            'equity': None,
+            'peak': 0.0,
+            'max_drawdown': 0.0,
+            'returns': 0,
+            'mean': 0.0,
+            'm2': 0.0,
+        }
+
+    @staticmethod
+    def fold(state, transaction_type, amount, initial_balance):
+        """Apply one ledger row to an accumulator in place"""
+        if transaction_type == 'RESET':
+            state['equity'] = state['peak'] = amount
+            return
+
+        effect = WalletService.LEDGER_EFFECTS.get(transaction_type)
+        delta = amount * sum(effect) if effect else 0.0
+        if not delta:
+            return  # Locks and unlocks move coins between buckets only
+
+        if state['equity'] is None:
+            # A ledger without its opening deposit starts from the wallet's initial balance
+            state['equity'] = 0.0 if transaction_type == 'INITIAL_DEPOSIT' else initial_balance
+            state['peak'] = state['equity']
+
+        equity = state['equity']
+        state['equity'] = equity + delta
+
+        if transaction_type not in EquityService.RETURN_TYPES:
+            # Capital flows shift the peak with the equity so they read as neither gain nor drawdown
+            state['peak'] += delta
+            return
+
+        if equity > 0:
+            value = delta / equity
+            state['returns'] += 1
+            change = value - state['mean']
+            state['mean'] += change / state['returns']
+            state['m2'] += change * (value - state['mean'])
+
+        state['peak'] = max(state['peak'], state['equity'])
+        if state['peak'] > 0:
+            state['max_drawdown'] = max(state['max_drawdown'], (state['peak'] - state['equity']) / state['peak'])
+
+    @staticmethod
+    def metrics(state):
+        """Risk metrics of an accumulator; ``sharpe_like`` is None until returns vary"""
+        count = state['returns']
+        volatility = math.sqrt(state['m2'] / (count - 1)) if count > 1 else 0.0
+        return {
+            'trades': count,
+            'equity': round(state['equity'] or 0.0, 2),
+            'max_drawdown_pct': round(state['max_drawdown'] * 100, 2),
+            'volatility_pct': round(volatility * 100, 2),
+            'sharpe_like': round(state['mean'] / volatility, 2) if volatility else None,
+        }
+
+    @staticmethod
+    def week_metrics(week, participation_ids=None, now=None):
+        """
+        ``{participation_id: metrics}`` for a week's wallets (or the given
+        participations), from one streaming pass over their new ledger rows.
+        """
+        now = now or timezone.now()
+        cache_settings = getattr(settings, 'CACHE_SETTINGS', {})
+        upto = now - timedelta(seconds=cache_settings.get('EQUITY_CURVE_LAG', 60))
+
+        wallets = ChallengeWallet.objects.filter(participation__week=week)
+        if participation_ids is not None:
+            wallets = wallets.filter(participation_id__in=participation_ids)
+        wallets = {
+            wallet_id: (participation_id, float(initial_balance))
+            for wallet_id, participation_id, initial_balance
+            in wallets.values_list('id', 'participation_id', 'initial_balance')
+        }
+        if not wallets:
+            return {}
+
+        keys = {wallet_id: EquityService.cache_key(participation_id) for wallet_id, (participation_id, _) in wallets.items()}
+        try:
+            cached = cache.get_many(list(keys.values()))
+        except Exception as e:
+            logger.error(f"❌ Equity curve cache unavailable, replaying full ledgers: {e}")
+            cached = {}
+        states = {wallet_id: cached.get(key) or EquityService.new_state() for wallet_id, key in keys.items()}
+
+        # Fresh wallets replay their whole ledger, cached ones resume after their as_of
+        fresh = [wallet_id for wallet_id, state in states.items() if state['as_of'] is None]
+        resumed = [state['as_of'] for state in states.values() if state['as_of'] is not None]
+        rows = ChallengeWalletTransaction.objects.filter(wallet__participation__week=week)
+        if participation_ids is not None:
+            rows = rows.filter(wallet_id__in=list(wallets))
+        if resumed:
+            since = Q(created_at__gt=min(resumed))
+            rows = rows.filter(since | Q(wallet_id__in=fresh) if fresh else since)
+
+        tails = {}
+        streamed = 0
+        for wallet_id, transaction_type, amount, created_at in rows.order_by(
+            'wallet_id', 'created_at', 'id'
+        ).values_list('wallet_id', 'transaction_type', 'amount', 'created_at').iterator(chunk_size=2000):
+            state = states[wallet_id]
+            if state['as_of'] is not None and created_at <= state['as_of']:
+                continue
+            if created_at > upto:
+                if wallet_id not in tails:
+                    tails[wallet_id] = dict(state)
+                state = tails[wallet_id]
+            EquityService.fold(state, transaction_type, float(amount), wallets[wallet_id][1])
+            streamed += 1
+
+        for state in states.values():
+            state['as_of'] = upto
+        try:
+            cache.set_many(
+                {keys[wallet_id]: state for wallet_id, state in states.items()},
+                timeout=cache_settings.get('EQUITY_CURVE_TTL', 7 * 24 * 3600),
+            )
+        except Exception as e:
+            logger.error(f"❌ Failed to cache equity curves: {e}")
+
+        logger.debug(f"Equity curves: {len(states)} wallets, {streamed} ledger rows streamed")
+        return {
+            participation_id: EquityService.metrics(tails.get(wallet_id, states[wallet_id]))
+            for wallet_id, (participation_id, _) in wallets.items()
+        }
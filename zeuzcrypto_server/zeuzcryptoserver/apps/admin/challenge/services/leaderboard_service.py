@@ -1,17 +1,446 @@
 
 # ==================== FILE: apps/challenges/services/leaderboard_service.py ====================
 
-from django.db.models import Avg, Sum
-from apps.admin.challenge.models.challenge_models import  UserChallengeParticipation
-from apps.admin.challenge.models.analytics_models import ChallengeLeaderboard, ChallengeScore
+import logging
+from decimal import Decimal
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Avg, Count, Sum
+from django.utils import timezone
+from apps.admin.challenge.models.challenge_models import  UserChallengeParticipation, ChallengeWeek
+from apps.admin.challenge.models.analytics_models import ChallengeLeaderboard, ChallengeProgramLeaderboard, ChallengeScore
+from apps.admin.challenge.models.reward_models import UserChallengeReward
 from apps.accounts.models import User
+from apps.caching import invalidate_namespaces, ranking
+
+logger = logging.getLogger(__name__)
+
+# Weeks/programs whose ranking changed since their leaderboard table was last written
+DIRTY_WEEKS_KEY = "leaderboard:dirty_weeks"
+DIRTY_PROGRAMS_KEY = "leaderboard:dirty_programs"
 
 class LeaderboardService:
-    """Service for leaderboard operations"""
+    """
+    Service for leaderboard operations
+
+    Week rankings live in a sorted set per week (``apps.caching.ranking``):
+    a score change is one O(log n) update, and top-N / rank reads come from
+    the set. ``ChallengeLeaderboard`` is written in bulk by the
+    ``persist_leaderboards`` task for the weeks that changed.
+
+    Program leaderboards are materialized in ``ChallengeProgramLeaderboard``
+    (one row per user, ranked by average score then user id) and refreshed
+    per ``CACHE_SETTINGS['PROGRAM_LEADERBOARD_REFRESH']``: ``"immediate"``
+    rebuilds on every committed score change, ``"batched"`` leaves it to
+    ``persist_leaderboards``.
+    """
+
+    @staticmethod
+    def week_cache_namespace(week_id):
+        return f"leaderboard:week:{week_id}"
+
+    @staticmethod
+    def program_cache_namespace(program_id):
+        return f"leaderboard:program:{program_id}"
+
+    @staticmethod
+    def invalidate_cache(week_id, program_id=None):
+        """Drop cached leaderboards of a week and of the program it belongs to"""
+        if program_id is None:
+            program_id = ChallengeWeek.objects.filter(id=week_id).values_list('program_id', flat=True).first()
+        invalidate_namespaces(
+            LeaderboardService.week_cache_namespace(week_id),
+            LeaderboardService.program_cache_namespace(program_id) if program_id else None,
+        )
+    
+    # ---------------------------
+    # Rankings
+    # ---------------------------
+    @staticmethod
+    def week_ranking_key(week_id):
+        return f"leaderboard:ranking:week:{week_id}"
+
+    @staticmethod
+    def program_ranking_key(program_id):
+        return f"leaderboard:ranking:program:{program_id}"
+
+    @staticmethod
+    def pending_key(key):
+        """Members whose score changed while ``key`` was not loaded"""
+        return f"{key}:pending"
+
+    @staticmethod
+    def _mark_pending(key, member):
+        ranking.add(LeaderboardService.pending_key(key), str(member), timezone.now().timestamp(), only_if_loaded=False)
+
+    @staticmethod
+    def _load_ranking(key, scores, member_scores):
+        """
+        Load ``key`` from ``(member, score)`` rows if needed; False when the
+        ranking is unavailable.
+
+        A score committed after ``scores()`` was read but before ``replace``
+        misses the unloaded set, so writers mark its member pending; once the
+        set is in place the pending members are re-read through
+        ``member_scores(members)`` and applied (absent ones are removed).
+        """
+        try:
+            if not ranking.exists(key):
+                ranking.replace(
+                    key,
+                    {str(member): float(score) for member, score in scores()},
+                    timeout=getattr(settings, 'CACHE_SETTINGS', {}).get('LEADERBOARD_RANKING_TTL', 7 * 24 * 3600),
+                )
+                LeaderboardService._apply_pending(key, member_scores)
+            return True
+        except Exception as e:
+            logger.error(f"❌ Leaderboard ranking {key} unavailable: {e}")
+            return False
+
+    @staticmethod
+    def _apply_pending(key, member_scores, batch_size=500):
+        pending_key = LeaderboardService.pending_key(key)
+        while True:
+            members = [member for member, _ in ranking.pop_lowest(pending_key, batch_size)]
+            if not members:
+                return
+            current = {str(member): float(score) for member, score in member_scores(members)}
+            for member in members:
+                if member in current:
+                    ranking.add(key, member, current[member])
+                else:
+                    ranking.remove(key, member)
+
+    @staticmethod
+    def load_week_ranking(week_id):
+        """Week set: participations by total_score"""
+        scores = ChallengeScore.objects.filter(participation__week_id=week_id)
+        return LeaderboardService._load_ranking(
+            LeaderboardService.week_ranking_key(week_id),
+            lambda: scores.values_list('participation_id', 'total_score'),
+            lambda members: scores.filter(participation_id__in=members).values_list('participation_id', 'total_score'),
+        )
+
+    @staticmethod
+    def _program_scores(program_id):
+        """Users of a program by average total_score, in ranking order"""
+        return ChallengeScore.objects.filter(
+            participation__week__program_id=program_id
+        ).values('participation__user').annotate(
+            avg_score=Avg('total_score')
+        ).order_by('-avg_score', '-participation__user')
+
+    @staticmethod
+    def load_program_ranking(program_id):
+        """Program set: users by their average total_score across the program's weeks"""
+        scores = LeaderboardService._program_scores(program_id)
+        return LeaderboardService._load_ranking(
+            LeaderboardService.program_ranking_key(program_id),
+            lambda: scores.values_list('participation__user', 'avg_score'),
+            lambda members: scores.filter(participation__user__in=members).values_list('participation__user', 'avg_score'),
+        )
+
+    @staticmethod
+    def _refresh_program_member(program_id, user_id):
+        """Re-average one user in a loaded program set (one aggregate over their weeks)"""
+        key = LeaderboardService.program_ranking_key(program_id)
+        if not ranking.exists(key):
+            LeaderboardService._mark_pending(key, user_id)
+            return
+        avg_score = ChallengeScore.objects.filter(
+            participation__week__program_id=program_id, participation__user_id=user_id
+        ).aggregate(avg_score=Avg('total_score'))['avg_score']
+        if avg_score is None:
+            ranking.remove(key, str(user_id))
+        else:
+            ranking.add(key, str(user_id), float(avg_score))
+
+    @staticmethod
+    def record_score(week_id, participation_id, total_score, program_id=None, user_id=None):
+        """Apply one score change to the week (and program) ranking and queue the week for persistence"""
+        try:
+            key = LeaderboardService.week_ranking_key(week_id)
+            if not ranking.add(key, str(participation_id), float(total_score)):
+                LeaderboardService._mark_pending(key, participation_id)
+            if program_id and user_id:
+                LeaderboardService._refresh_program_member(program_id, user_id)
+            LeaderboardService.mark_dirty(week_id)
+        except Exception as e:
+            logger.error(f"❌ Failed to rank participation {participation_id} in week {week_id}: {e}")
+        if program_id:
+            LeaderboardService.program_changed(program_id)
+
+    @staticmethod
+    def remove_participation(week_id, participation_id, program_id=None, user_id=None):
+        try:
+            key = LeaderboardService.week_ranking_key(week_id)
+            if ranking.exists(key):
+                ranking.remove(key, str(participation_id))
+            else:
+                LeaderboardService._mark_pending(key, participation_id)
+            if program_id and user_id:
+                LeaderboardService._refresh_program_member(program_id, user_id)
+            LeaderboardService.mark_dirty(week_id)
+        except Exception as e:
+            logger.error(f"❌ Failed to unrank participation {participation_id} in week {week_id}: {e}")
+        if program_id:
+            LeaderboardService.program_changed(program_id)
+
+    @staticmethod
+    def week_rescored(week_id, program_id=None):
+        """
+        Refresh after a week's scores were rewritten in bulk (no ChallengeScore
+        signals fire): both rankings are dropped so the next read reloads them,
+        and the leaderboard tables and response caches follow.
+        """
+        if program_id is None:
+            program_id = ChallengeWeek.objects.filter(id=week_id).values_list('program_id', flat=True).first()
+        try:
+            ranking.replace(LeaderboardService.week_ranking_key(week_id), {})
+            if program_id:
+                ranking.replace(LeaderboardService.program_ranking_key(program_id), {})
+            LeaderboardService.mark_dirty(week_id)
+        except Exception as e:
+            logger.error(f"❌ Failed to drop rankings of rescored week {week_id}: {e}")
+        if program_id:
+            LeaderboardService.program_changed(program_id)
+        LeaderboardService.invalidate_cache(week_id, program_id)
+
+    @staticmethod
+    def program_changed(program_id):
+        """Refresh the program leaderboard table now or queue it, per the refresh policy"""
+        policy = getattr(settings, 'CACHE_SETTINGS', {}).get('PROGRAM_LEADERBOARD_REFRESH', 'batched')
+        try:
+            if policy == 'immediate':
+                LeaderboardService.update_program_leaderboard(program_id)
+            else:
+                LeaderboardService.mark_program_dirty(program_id)
+        except Exception as e:
+            logger.error(f"❌ Failed to refresh program leaderboard {program_id}: {e}")
+
+    @staticmethod
+    def mark_dirty(week_id):
+        ranking.add(DIRTY_WEEKS_KEY, str(week_id), timezone.now().timestamp(), only_if_loaded=False)
+
+    @staticmethod
+    def mark_program_dirty(program_id):
+        ranking.add(DIRTY_PROGRAMS_KEY, str(program_id), timezone.now().timestamp(), only_if_loaded=False)
+
+    @staticmethod
+    def _pop_dirty(key, count):
+        try:
+            return [member for member, _ in ranking.pop_lowest(key, count)]
+        except Exception as e:
+            logger.error(f"❌ Failed to read {key}: {e}")
+            return []
+
+    @staticmethod
+    def pop_dirty_weeks(count):
+        return LeaderboardService._pop_dirty(DIRTY_WEEKS_KEY, count)
+
+    @staticmethod
+    def pop_dirty_programs(count):
+        return LeaderboardService._pop_dirty(DIRTY_PROGRAMS_KEY, count)
+
+    @staticmethod
+    def _score_str(score):
+        return str(Decimal(str(score)).quantize(Decimal('0.01')))
+
+    @staticmethod
+    def _around(key, member, k, build_rows):
+        """Rank of ``member`` and the ``k`` entries either side of it, all from the sorted set"""
+        position = ranking.rank(key, member)
+        if position is None:
+            return None
+        start = max(position - k, 0)
+        return {
+            'rank': position + 1,
+            'score': LeaderboardService._score_str(ranking.score(key, member)),
+            'participants': ranking.count(key),
+            'entries': build_rows(ranking.range(key, start, position + k), first_rank=start + 1),
+        }
+
+    @staticmethod
+    def _page(entries, after_rank, limit, build_rows):
+        """One keyset page from ``limit + 1`` entries ranked after ``after_rank``"""
+        return {
+            'results': build_rows(entries[:limit], first_rank=after_rank + 1),
+            'next_after_rank': after_rank + limit if len(entries) > limit else None,
+        }
+
+    @staticmethod
+    def get_week_rank(week_id, participation_id):
+        """``{'rank', 'score', 'participants'}`` of one participation, None if unranked"""
+        around = LeaderboardService.get_week_neighbours(week_id, participation_id, k=0)
+        if around is not None:
+            around.pop('entries')
+        return around
+
+    @staticmethod
+    def get_week_neighbours(week_id, participation_id, k=5):
+        """A participation's rank with the ``k`` entries above and below it"""
+        if LeaderboardService.load_week_ranking(week_id):
+            try:
+                return LeaderboardService._around(
+                    LeaderboardService.week_ranking_key(week_id), str(participation_id), k,
+                    LeaderboardService._ranked_rows,
+                )
+            except Exception as e:
+                logger.error(f"❌ Ranking read failed for week {week_id}, using the database: {e}")
+
+        # Persisted ranks, through the (week, rank) index
+        mine = ChallengeLeaderboard.objects.filter(
+            week_id=week_id, participation_id=participation_id
+        ).values('rank', 'total_score').first()
+        if mine is None:
+            return None
+        entries = ChallengeLeaderboard.objects.filter(
+            week_id=week_id, rank__gte=mine['rank'] - k, rank__lte=mine['rank'] + k
+        ).order_by('rank').values_list('participation_id', 'rank')
+        return {
+            'rank': mine['rank'],
+            'score': str(mine['total_score']),
+            'participants': ChallengeLeaderboard.objects.filter(week_id=week_id).count(),
+            'entries': LeaderboardService._persisted_rows(entries),
+        }
+
+    @staticmethod
+    def get_week_page(week_id, after_rank=0, limit=50):
+        """Week ranking page after ``after_rank``; deep pages cost the same as the first"""
+        if LeaderboardService.load_week_ranking(week_id):
+            try:
+                entries = ranking.range(
+                    LeaderboardService.week_ranking_key(week_id), after_rank, after_rank + limit
+                )
+                return LeaderboardService._page(entries, after_rank, limit, LeaderboardService._ranked_rows)
+            except Exception as e:
+                logger.error(f"❌ Ranking read failed for week {week_id}, using the database: {e}")
+
+        entries = list(ChallengeLeaderboard.objects.filter(
+            week_id=week_id, rank__gt=after_rank
+        ).order_by('rank').values_list('participation_id', 'rank')[:limit + 1])
+        return {
+            'results': LeaderboardService._persisted_rows(entries[:limit]),
+            'next_after_rank': after_rank + limit if len(entries) > limit else None,
+        }
+
+    @staticmethod
+    def get_program_neighbours(program_id, user_id, k=5):
+        """A user's program rank with the ``k`` users above and below"""
+        key = LeaderboardService.program_ranking_key(program_id)
+        if LeaderboardService.load_program_ranking(program_id):
+            try:
+                return LeaderboardService._around(key, str(user_id), k, LeaderboardService._program_rows)
+            except Exception as e:
+                logger.error(f"❌ Ranking read failed for program {program_id}, using the database: {e}")
+
+        # Materialized ranks, through the (program, rank) index
+        mine = ChallengeProgramLeaderboard.objects.filter(
+            program_id=program_id, user_id=user_id
+        ).values('rank', 'avg_score').first()
+        if mine is None:
+            return None
+        entries = ChallengeProgramLeaderboard.objects.filter(
+            program_id=program_id, rank__gte=mine['rank'] - k, rank__lte=mine['rank'] + k
+        ).order_by('rank').values_list('user_id', 'avg_score', 'rank')
+        first_rank = entries[0][2] if entries else mine['rank']
+        return {
+            'rank': mine['rank'],
+            'score': str(mine['avg_score']),
+            'participants': ChallengeProgramLeaderboard.objects.filter(program_id=program_id).count(),
+            'entries': LeaderboardService._program_rows(
+                [(str(member), score) for member, score, _ in entries], first_rank=first_rank
+            ),
+        }
+
+    @staticmethod
+    def get_program_page(program_id, after_rank=0, limit=50):
+        """Program ranking page after ``after_rank``"""
+        if LeaderboardService.load_program_ranking(program_id):
+            try:
+                entries = ranking.range(
+                    LeaderboardService.program_ranking_key(program_id), after_rank, after_rank + limit
+                )
+                return LeaderboardService._page(entries, after_rank, limit, LeaderboardService._program_rows)
+            except Exception as e:
+                logger.error(f"❌ Ranking read failed for program {program_id}, using the database: {e}")
+
+        entries = ChallengeProgramLeaderboard.objects.filter(
+            program_id=program_id, rank__gt=after_rank
+        ).order_by('rank').values_list('user_id', 'avg_score')[:limit + 1]
+        return LeaderboardService._page(
+            [(str(member), score) for member, score in entries], after_rank, limit,
+            LeaderboardService._program_rows,
+        )
+
+    @staticmethod
+    def _ranked_rows(entries, first_rank, ranks=None):
+        """
+        Leaderboard rows for ranked ``(participation_id, score)`` pairs, one
+        query for the details. Ranks count up from ``first_rank`` unless
+        given per participation in ``ranks``.
+        """
+        scores = ChallengeScore.objects.filter(
+            participation_id__in=[participation_id for participation_id, _ in entries]
+        ).select_related('participation__user')
+        by_participation = {str(score.participation_id): score for score in scores}
+
+        data = []
+        for rank, (participation_id, _) in enumerate(entries, start=first_rank):
+            if ranks is not None:
+                rank = ranks[participation_id]
+            score = by_participation.get(participation_id)
+            if score is None:
+                continue  # Deleted since it was ranked
+            participation = score.participation
+            data.append({
+                'rank': rank,
+                'user_email': participation.user.email,
+                'user_id': str(participation.user.id),
+                'portfolio_return_pct': str(participation.portfolio_return_pct),
+                'total_score': str(score.total_score),
+                'behavioral_tag': score.behavioral_tag,
+                'pnl_score': str(score.pnl_score),
+                'total_trades': participation.total_trades,
+            })
+        return data
+    
+    @staticmethod
+    def _persisted_rows(entries):
+        """Leaderboard rows for ``(participation_id, rank)`` pairs read from ChallengeLeaderboard"""
+        ranks = {str(participation_id): rank for participation_id, rank in entries}
+        return LeaderboardService._ranked_rows(
+            [(participation_id, None) for participation_id in ranks], first_rank=1, ranks=ranks
+        )
+
+    @staticmethod
+    def _program_rows(entries, first_rank):
+        """Program rows for ranked ``(user_id, avg_score)`` pairs, one query for the users"""
+        emails = dict(User.objects.filter(
+            id__in=[user_id for user_id, _ in entries]
+        ).values_list('id', 'email'))
+        emails = {str(user_id): email for user_id, email in emails.items()}
+        return [
+            {
+                'rank': rank,
+                'user_email': emails.get(user_id),
+                'user_id': user_id,
+                'avg_score': LeaderboardService._score_str(avg_score),
+            }
+            for rank, (user_id, avg_score) in enumerate(entries, start=first_rank)
+            if user_id in emails
+        ]
     
     @staticmethod
     def get_week_leaderboard(week_id, limit=10, sort_by='total_score'):
         """Get top performers for a specific week"""
+        if sort_by == 'total_score' and LeaderboardService.load_week_ranking(week_id):
+            try:
+                entries = ranking.range(LeaderboardService.week_ranking_key(week_id), 0, limit - 1)
+                return LeaderboardService._ranked_rows(entries, first_rank=1)
+            except Exception as e:
+                logger.error(f"❌ Ranking read failed for week {week_id}, using the database: {e}")
+
         scores = ChallengeScore.objects.filter(
             participation__week_id=week_id
         ).select_related('participation__user').order_by(f'-{sort_by}')[:limit]
@@ -36,30 +465,27 @@ class LeaderboardService:
     
     @staticmethod
     def get_program_leaderboard(program_id, limit=10):
-        """Get top performers across entire program (cumulative)"""
-        user_scores = ChallengeScore.objects.filter(
-            participation__week__program_id=program_id
-        ).values('participation__user').annotate(
-            avg_score=Avg('total_score'),
-            avg_return=Avg('participation__portfolio_return_pct'),
-            total_coins=Sum('participation__earned_rewards__coins_earned')
-        ).order_by('-avg_score')[:limit]
-        
-        data = []
-        rank = 1
-        for item in user_scores:
-            user = User.objects.get(id=item['participation__user'])
-            data.append({
-                'rank': rank,
-                'user_email': user.email,
-                'user_id': str(user.id),
-                'avg_score': str(item['avg_score']),
-                'avg_return': str(item['avg_return']),
-                'total_coins': item['total_coins'] or 0,
-            })
-            rank += 1
+        """Get top performers across entire program (cumulative), one query on the materialized table"""
+        entries = list(ChallengeProgramLeaderboard.objects.filter(
+            program_id=program_id
+        ).select_related('user').order_by('rank')[:limit])
+        if not entries and LeaderboardService.update_program_leaderboard(program_id)['entries']:
+            # Never materialized (e.g. scores written before the table existed)
+            entries = list(ChallengeProgramLeaderboard.objects.filter(
+                program_id=program_id
+            ).select_related('user').order_by('rank')[:limit])
         
-        return data
+        return [
+            {
+                'rank': entry.rank,
+                'user_email': entry.user.email,
+                'user_id': str(entry.user_id),
+                'avg_score': str(entry.avg_score),
+                'avg_return': str(entry.avg_return),
+                'total_coins': entry.total_coins,
+            }
+            for entry in entries
+        ]
     
     @staticmethod
     def get_behavioral_leaderboard(week_id, behavioral_tag='DISCIPLINED', limit=10):
@@ -84,36 +510,102 @@ class LeaderboardService:
     
     @staticmethod
     def update_cached_leaderboard(week):
-        """Update cached leaderboard entries for a week"""
-        # Clear existing entries
-        ChallengeLeaderboard.objects.filter(week=week).delete()
-        
-        # Get sorted participations
-        scores = ChallengeScore.objects.filter(
-            participation__week=week
-        ).select_related('participation__user', 'participation').order_by('-total_score')
-        
-        # Create leaderboard entries
-        rank = 1
-        for score in scores:
-            participation = score.participation
-            
-            # Get analytics if available
-            try:
-                analytics = participation.trade_analytics
-                win_rate = analytics.win_rate
-            except:
-                win_rate = 0
-            
-            ChallengeLeaderboard.objects.create(
-                week=week,
-                participation=participation,
-                user=participation.user,
+        """
+        Write a week's ranking to ChallengeLeaderboard in bulk.
+
+        One query reads every score with its participation and analytics
+        fields (same order as the sorted set: score, then participation id,
+        descending); rows are upserted in batches and entries that were not
+        rewritten (participants gone from the week) are pruned.
+        """
+        week_id = getattr(week, 'pk', week)
+        started = timezone.now()
+        rows = ChallengeScore.objects.filter(
+            participation__week_id=week_id
+        ).order_by('-total_score', '-participation_id').values(
+            'participation_id', 'participation__user_id', 'total_score', 'behavioral_tag',
+            'participation__portfolio_return_pct', 'participation__total_trades',
+            'participation__trade_analytics__win_rate',
+        )
+
+        entries = [
+            ChallengeLeaderboard(
+                week_id=week_id,
+                participation_id=row['participation_id'],
+                user_id=row['participation__user_id'],
+                rank=rank,
+                total_score=row['total_score'],
+                portfolio_return_pct=row['participation__portfolio_return_pct'],
+                total_trades=row['participation__total_trades'],
+                win_rate=row['participation__trade_analytics__win_rate'] or 0,
+                behavioral_tag=row['behavioral_tag'],
+            )
+            for rank, row in enumerate(rows, start=1)
+        ]
+
+        with transaction.atomic():
+            ChallengeLeaderboard.objects.bulk_create(
+                entries,
+                batch_size=1000,
+                update_conflicts=True,
+                unique_fields=['week', 'participation'],
+                update_fields=[
+                    'rank', 'total_score', 'portfolio_return_pct', 'total_trades',
+                    'win_rate', 'behavioral_tag', 'last_updated',
+                ],
+            )
+            removed, _ = ChallengeLeaderboard.objects.filter(week_id=week_id, last_updated__lt=started).delete()
+
+        return {'entries': len(entries), 'removed': removed}
+
+    @staticmethod
+    def update_program_leaderboard(program):
+        """
+        Materialize a program's cumulative leaderboard.
+
+        Score averages and reward coins are aggregated by user in two grouped
+        queries (kept apart so rewards cannot multiply score rows), ranked by
+        average score then user id - the program ranking's order - and
+        upserted in batches; users no longer in the program are pruned.
+        """
+        program_id = getattr(program, 'pk', program)
+        started = timezone.now()
+        scores = LeaderboardService._program_scores(program_id).annotate(
+            avg_return=Avg('participation__portfolio_return_pct'),
+            weeks_played=Count('id'),
+        )
+        coins = dict(
+            UserChallengeReward.objects.filter(
+                participation__week__program_id=program_id
+            ).values('participation__user').annotate(
+                total=Sum('coins_earned')
+            ).values_list('participation__user', 'total')
+        )
+
+        cents = Decimal('0.01')
+        entries = [
+            ChallengeProgramLeaderboard(
+                program_id=program_id,
+                user_id=row['participation__user'],
                 rank=rank,
-                total_score=score.total_score,
-                portfolio_return_pct=participation.portfolio_return_pct,
-                total_trades=participation.total_trades,
-                win_rate=win_rate,
-                behavioral_tag=score.behavioral_tag
+                avg_score=Decimal(str(row['avg_score'])).quantize(cents),
+                avg_return=Decimal(str(row['avg_return'] or 0)).quantize(cents),
+                total_coins=coins.get(row['participation__user']) or 0,
+                weeks_played=row['weeks_played'],
+            )
+            for rank, row in enumerate(scores, start=1)
+        ]
+
+        with transaction.atomic():
+            ChallengeProgramLeaderboard.objects.bulk_create(
+                entries,
+                batch_size=1000,
+                update_conflicts=True,
+                unique_fields=['program', 'user'],
+                update_fields=['rank', 'avg_score', 'avg_return', 'total_coins', 'weeks_played', 'last_updated'],
             )
-            rank += 1
\ No newline at end of file
+            removed, _ = ChallengeProgramLeaderboard.objects.filter(
+                program_id=program_id, last_updated__lt=started
+            ).delete()
+
+        return {'entries': len(entries), 'removed': removed}
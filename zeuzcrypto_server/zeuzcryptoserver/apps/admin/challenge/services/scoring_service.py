@@ -1,9 +1,17 @@
 
 # ==================== FILE: apps/challenges/services/scoring_service.py ====================
 
+import time
+import logging
 from decimal import Decimal
+from django.db import transaction
+from django.db.models import Avg
 # from apps.challenges.models import ChallengeScore
 from apps.admin.challenge.models.analytics_models import ChallengeScore
+from apps.admin.challenge.models.challenge_models import UserChallengeParticipation
+from apps.admin.challenge.services.equity_service import EquityService
+
+logger = logging.getLogger(__name__)
 
 
 class ScoringService:
@@ -57,11 +65,81 @@ class ScoringService:
         else:
             return Decimal('0.25') # Too conservative
     
+    @staticmethod
+    def calculate_drawdown_score(max_drawdown_pct):
+        """Calculate drawdown score from the equity curve's max drawdown % (0-10 scale)"""
+        drawdown = float(max_drawdown_pct)
+        
+        if drawdown <= 2:
+            return Decimal('10')
+        elif drawdown <= 5:
+            return Decimal('8')
+        elif drawdown <= 10:
+            return Decimal('6')
+        elif drawdown <= 20:
+            return Decimal('4')
+        elif drawdown <= 35:
+            return Decimal('2')
+        else:
+            return Decimal('0')
+    
+    @staticmethod
+    def calculate_sharpe_score(sharpe_like):
+        """Calculate consistency score from mean / volatility of trade returns (0-10 scale)"""
+        sharpe = float(sharpe_like)
+        
+        if sharpe >= 1:
+            return Decimal('10')
+        elif sharpe >= 0.5:
+            return Decimal('8')
+        elif sharpe >= 0.2:
+            return Decimal('6')
+        elif sharpe >= 0:
+            return Decimal('4')
+        elif sharpe >= -0.5:
+            return Decimal('2')
+        else:
+            return Decimal('0')
+    
+    @staticmethod
+    def money_management_from_metrics(metrics):
+        """Money management score from equity curve metrics (see EquityService.metrics)"""
+        if not metrics or not metrics['trades']:
+            return Decimal('5')  # No closed trades yet: neutral
+        
+        drawdown_score = ScoringService.calculate_drawdown_score(metrics['max_drawdown_pct'])
+        if metrics['sharpe_like'] is None:
+            return drawdown_score  # Too few (or identical) returns for a volatility
+        
+        return (
+            (drawdown_score * Decimal('0.6')) +
+            (ScoringService.calculate_sharpe_score(metrics['sharpe_like']) * Decimal('0.4'))
+        )
+    
     @staticmethod
     def calculate_money_management_score(participation):
         """Calculate money management score based on portfolio stability"""
-        # Simplified version - in production, analyze daily balance volatility
-        return Decimal('5')
+        return ScoringService.money_management_scores(
+            participation.week_id, [participation.id]
+        )[participation.id]
+    
+    @staticmethod
+    def money_management_scores(week, participation_ids):
+        """Money management scores for many participations of a week, keyed by participation id"""
+        metrics = EquityService.week_metrics(week, participation_ids)
+        return {
+            participation_id: ScoringService.money_management_from_metrics(metrics.get(participation_id))
+            for participation_id in participation_ids
+        }
+    
+    @staticmethod
+    def weighted_total(pnl_score, money_management_score, capital_allocation_score):
+        """Total score (weighted average)"""
+        return (
+            (pnl_score * Decimal('0.6')) +
+            (money_management_score * Decimal('0.25')) +
+            (capital_allocation_score * Decimal('0.15'))
+        )
     
     @staticmethod
     def assign_behavioral_tag(total_score):
@@ -104,10 +182,8 @@ class ScoringService:
         )
         
         # Total score (weighted average)
-        score.total_score = (
-            (score.pnl_score * Decimal('0.6')) +
-            (score.money_management_score * Decimal('0.25')) +
-            (score.capital_allocation_score * Decimal('0.15'))
+        score.total_score = ScoringService.weighted_total(
+            score.pnl_score, score.money_management_score, score.capital_allocation_score
         )
         
         # Behavioral tag
@@ -122,4 +198,66 @@ class ScoringService:
             'total_score': str(score.total_score),
             'behavioral_tag': score.behavioral_tag,
         }
+    
+    @staticmethod
+    def score_week(week, batch_size=1000):
+        """
+        Score every participation of a week in bulk.
 
+        One grouped query loads the participations with their average trade
+        allocation, scores are computed in a single pass with the same bands
+        as ``calculate_scores`` and all ``ChallengeScore`` rows are upserted
+        in batches. Bulk writes skip the ChallengeScore signals, so the week
+        and program rankings are refreshed explicitly once committed.
+        """
+        from apps.admin.challenge.services.leaderboard_service import LeaderboardService
+        
+        started = time.perf_counter()
+        rows = list(
+            UserChallengeParticipation.objects.filter(week=week).annotate(
+                avg_allocation=Avg('trades__allocation_percentage')
+            ).values_list('id', 'portfolio_return_pct', 'avg_allocation')
+        )
+        money_management = ScoringService.money_management_scores(week, [row[0] for row in rows])
+        
+        scores = []
+        for participation_id, return_pct, avg_allocation in rows:
+            pnl_score = ScoringService.calculate_pnl_score(return_pct)
+            money_management_score = money_management[participation_id]
+            capital_allocation_score = ScoringService.calculate_capital_allocation_score(avg_allocation or 0)
+            total_score = ScoringService.weighted_total(pnl_score, money_management_score, capital_allocation_score)
+            scores.append(ChallengeScore(
+                participation_id=participation_id,
+                pnl_score=pnl_score,
+                money_management_score=money_management_score,
+                capital_allocation_score=capital_allocation_score,
+                total_score=total_score.quantize(Decimal('0.01')),
+                behavioral_tag=ScoringService.assign_behavioral_tag(total_score),
+            ))
+        
+        week_id, program_id = week.id, week.program_id
+        with transaction.atomic():
+            ChallengeScore.objects.bulk_create(
+                scores,
+                batch_size=batch_size,
+                update_conflicts=True,
+                unique_fields=['participation'],
+                update_fields=[
+                    'pnl_score', 'money_management_score', 'capital_allocation_score',
+                    'total_score', 'behavioral_tag', 'calculated_at',
+                ],
+            )
+            transaction.on_commit(lambda: LeaderboardService.week_rescored(week_id, program_id))
+        
+        duration = time.perf_counter() - started
+        result = {
+            'week_id': str(week_id),
+            'scored': len(scores),
+            'duration_ms': round(duration * 1000, 1),
+            'per_second': round(len(scores) / duration, 1) if duration else None,
+        }
+        logger.info(
+            f"Scored {result['scored']} participations of week {week_id} "
+            f"in {result['duration_ms']} ms ({result['per_second']}/s)"
+        )
+        return result
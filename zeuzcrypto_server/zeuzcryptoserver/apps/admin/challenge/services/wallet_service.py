@@ -1,12 +1,30 @@
 # ==================== FILE: apps/challenges/services/wallet_service.py ====================
 
+from datetime import datetime, timezone as dt_timezone
 from decimal import Decimal
 from django.db import transaction
-from apps.admin.challenge.models.wallet_models   import ChallengeWallet, ChallengeWalletTransaction
+from django.db.models import Case, Count, DecimalField, F, OuterRef, Subquery, Sum, Value, When
+from django.db.models.functions import Coalesce
+from apps.admin.challenge.models.wallet_models   import ChallengeWallet, ChallengeWalletTransaction, ChallengeWalletCheckpoint
+
+# Checkpoint time of wallets that were never checkpointed
+LEDGER_EPOCH = datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
 
 
 class WalletService:
     """Service for wallet operations"""
+
+    # Effect of each transaction type on (available, locked, earned). RESET
+    # is absolute: the wallet restarts at (amount, 0, 0)
+    LEDGER_EFFECTS = {
+        'INITIAL_DEPOSIT': (1, 0, 0),
+        'TRADE_LOCK': (-1, 1, 0),
+        'TRADE_UNLOCK': (1, -1, 0),
+        'PROFIT_ADD': (0, 0, 1),
+        'LOSS_DEDUCT': (0, 0, -1),
+        'REWARD_BONUS': (0, 0, 1),
+    }
+    LEDGER_BUCKETS = ('available', 'locked', 'earned')
     
     @staticmethod
     @transaction.atomic
@@ -81,3 +99,82 @@ class WalletService:
             )
         return True
 
+    @staticmethod
+    def annotate_ledger(wallets, upto=None):
+        """
+        Annotate a ``ChallengeWallet`` queryset with its ledger-derived buckets.
+
+        ``ledger_available``/``ledger_locked``/``ledger_earned`` start from
+        the latest checkpoint (at or before ``upto``), or from the latest
+        RESET after it, and add the transactions up to ``upto`` through the
+        (wallet, created_at) index. ``ledger_entries`` counts those
+        transactions and ``ledger_reset`` is the amount of that RESET.
+        """
+        money = DecimalField(max_digits=15, decimal_places=2)
+        zero = Value(Decimal('0.00'))
+        buckets = WalletService.LEDGER_BUCKETS
+
+        checkpoints = ChallengeWalletCheckpoint.objects.filter(wallet=OuterRef('pk')).order_by('-as_of')
+        resets = ChallengeWalletTransaction.objects.filter(
+            wallet=OuterRef('pk'), transaction_type='RESET', created_at__gt=OuterRef('ledger_checkpoint_as_of')
+        ).order_by('-created_at')
+        if upto is not None:
+            checkpoints = checkpoints.filter(as_of__lte=upto)
+            resets = resets.filter(created_at__lte=upto)
+
+        wallets = wallets.annotate(
+            ledger_checkpoint_as_of=Coalesce(Subquery(checkpoints.values('as_of')[:1]), Value(LEDGER_EPOCH)),
+            **{
+                f'ledger_checkpoint_{bucket}': Subquery(checkpoints.values(f'{bucket}_balance')[:1])
+                for bucket in buckets
+            },
+        ).annotate(
+            ledger_reset=Subquery(resets.values('amount')[:1]),
+            ledger_as_of=Coalesce(Subquery(resets.values('created_at')[:1]), 'ledger_checkpoint_as_of'),
+        )
+
+        entries = ChallengeWalletTransaction.objects.filter(
+            wallet=OuterRef('pk'), created_at__gt=OuterRef('ledger_as_of')
+        ).exclude(transaction_type='RESET')
+        if upto is not None:
+            entries = entries.filter(created_at__lte=upto)
+        totals = entries.order_by().values('wallet').annotate(
+            count=Count('id'),
+            **{
+                bucket: Sum(Case(
+                    *[
+                        When(transaction_type=transaction_type, then=F('amount') if effect[i] > 0 else -F('amount'))
+                        for transaction_type, effect in WalletService.LEDGER_EFFECTS.items()
+                        if effect[i]
+                    ],
+                    default=zero,
+                    output_field=money,
+                ))
+                for i, bucket in enumerate(buckets)
+            },
+        )
+
+        annotations = {'ledger_entries': Coalesce(Subquery(totals.values('count')), Value(0))}
+        for bucket in buckets:
+            base = Case(
+                When(ledger_reset__isnull=False, then=F('ledger_reset') if bucket == 'available' else zero),
+                default=Coalesce(f'ledger_checkpoint_{bucket}', zero),
+                output_field=money,
+            )
+            annotations[f'ledger_{bucket}'] = base + Coalesce(Subquery(totals.values(bucket)), zero, output_field=money)
+        return wallets.annotate(**annotations)
+
+    @staticmethod
+    def ledger_balances(wallet, upto=None):
+        """Ledger-derived ``{'available', 'locked', 'earned'}`` of a wallet"""
+        row = (
+            WalletService.annotate_ledger(ChallengeWallet.objects.filter(pk=wallet.pk), upto)
+            .values(*[f'ledger_{bucket}' for bucket in WalletService.LEDGER_BUCKETS])
+            .first()
+        )
+        if row is None:
+            return None
+        return {
+            bucket: Decimal(str(row[f'ledger_{bucket}'])).quantize(Decimal('0.01'))
+            for bucket in WalletService.LEDGER_BUCKETS
+        }
@@ -0,0 +1,73 @@
+# signals.py
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from apps.caching import invalidate_namespaces
+from apps.admin.challenge.models.challenge_models import ChallengeProgram, ChallengeWeek, UserChallengeParticipation
+from apps.admin.challenge.models.analytics_models import ChallengeScore
+from apps.admin.challenge.models.reward_models import UserChallengeReward
+from apps.admin.challenge.services.leaderboard_service import LeaderboardService
+
+
+# ---------------------------
+# Response cache invalidation
+# ---------------------------
+@receiver([post_save, post_delete], sender=ChallengeProgram)
+@receiver([post_save, post_delete], sender=ChallengeWeek)
+def invalidate_program_cache(sender, instance, **kwargs):
+    """Program listings include weeks_count, so week changes count too"""
+    invalidate_namespaces("challenge_programs")
+
+
+@receiver([post_save, post_delete], sender=UserChallengeParticipation)
+def invalidate_participation_leaderboards(sender, instance, **kwargs):
+    LeaderboardService.invalidate_cache(instance.week_id)
+
+
+@receiver([post_save, post_delete], sender=UserChallengeReward)
+def invalidate_reward_leaderboards(sender, instance, **kwargs):
+    """Rewards feed the program leaderboard's total_coins"""
+    keys = UserChallengeParticipation.objects.filter(
+        id=instance.participation_id
+    ).values_list('week_id', 'week__program_id').first()
+    if keys:
+        week_id, program_id = keys
+        transaction.on_commit(lambda: LeaderboardService.program_changed(program_id))
+        LeaderboardService.invalidate_cache(week_id, program_id)
+
+
+# ---------------------------
+# Week and program rankings
+# ---------------------------
+# Ranking updates are registered before the cache invalidation so a response
+# rebuilt right after the bump already sees the new rank
+def participation_keys(participation_id):
+    """(week_id, program_id, user_id) of a participation in one query"""
+    return UserChallengeParticipation.objects.filter(
+        id=participation_id
+    ).values_list('week_id', 'week__program_id', 'user_id').first()
+
+
+@receiver(post_save, sender=ChallengeScore)
+def rank_score(sender, instance, **kwargs):
+    keys = participation_keys(instance.participation_id)
+    if keys:
+        week_id, program_id, user_id = keys
+        participation_id, total_score = instance.participation_id, instance.total_score
+        transaction.on_commit(lambda: LeaderboardService.record_score(
+            week_id, participation_id, total_score, program_id=program_id, user_id=user_id
+        ))
+        LeaderboardService.invalidate_cache(week_id, program_id)
+
+
+@receiver(post_delete, sender=ChallengeScore)
+def unrank_score(sender, instance, **kwargs):
+    keys = participation_keys(instance.participation_id)
+    if keys:
+        week_id, program_id, user_id = keys
+        participation_id = instance.participation_id
+        transaction.on_commit(lambda: LeaderboardService.remove_participation(
+            week_id, participation_id, program_id=program_id, user_id=user_id
+        ))
+        LeaderboardService.invalidate_cache(week_id, program_id)
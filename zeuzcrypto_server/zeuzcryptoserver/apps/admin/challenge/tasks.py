@@ -0,0 +1,172 @@
+# tasks.py - Celery tasks for challenge wallets and leaderboards
+import time
+import logging
+from datetime import timedelta
+from decimal import Decimal
+from celery import shared_task
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Exists, OuterRef
+from django.utils import timezone
+from apps.admin.challenge.models.wallet_models import (
+    ChallengeWallet, ChallengeWalletTransaction, ChallengeWalletCheckpoint,
+)
+from apps.admin.challenge.services.wallet_service import WalletService
+from apps.admin.challenge.services.leaderboard_service import LeaderboardService
+
+logger = logging.getLogger(__name__)
+
+
+def reconcile_challenge_wallets(chunk_size: int = 1000, lag: int = 60, now=None) -> dict:
+    """
+    Verify every challenge wallet against its transactions and checkpoint it.
+
+    Same walk as the trading wallet reconciliation: keyset chunks by primary
+    key, one query per chunk deriving the buckets as of ``now - lag``. A
+    wallet with no transactions after the cutoff must match its stored
+    available/locked/earned balances; healthy wallets that moved since their
+    last checkpoint get a new one.
+    """
+    now = now or timezone.now()
+    upto = now - timedelta(seconds=lag)
+    started = time.perf_counter()
+    wallets = checkpoints = chunks = 0
+    mismatches = []
+    last_pk = None
+
+    buckets = WalletService.LEDGER_BUCKETS
+    newer_entries = ChallengeWalletTransaction.objects.filter(wallet=OuterRef("pk"), created_at__gt=upto)
+
+    while True:
+        queryset = ChallengeWallet.objects.order_by("pk")
+        if last_pk is not None:
+            queryset = queryset.filter(pk__gt=last_pk)
+        rows = list(
+            WalletService.annotate_ledger(queryset, upto)
+            .annotate(ledger_pending=Exists(newer_entries))
+            .values(
+                "pk", "ledger_entries", "ledger_reset", "ledger_checkpoint_available", "ledger_pending",
+                *[f"{bucket}_balance" for bucket in buckets],
+                *[f"ledger_{bucket}" for bucket in buckets],
+            )[:chunk_size]
+        )
+        if not rows:
+            break
+        last_pk = rows[-1]["pk"]
+
+        new_checkpoints = []
+        for row in rows:
+            derived = {
+                bucket: Decimal(str(row[f"ledger_{bucket}"])).quantize(Decimal("0.01"))
+                for bucket in buckets
+            }
+            if not row["ledger_pending"] and any(derived[bucket] != row[f"{bucket}_balance"] for bucket in buckets):
+                mismatches.append({
+                    "wallet_id": str(row["pk"]),
+                    "ledger": {bucket: str(derived[bucket]) for bucket in buckets},
+                    "found": {bucket: str(row[f"{bucket}_balance"]) for bucket in buckets},
+                })
+                continue
+
+            if row["ledger_entries"] or row["ledger_reset"] is not None or row["ledger_checkpoint_available"] is None:
+                new_checkpoints.append(ChallengeWalletCheckpoint(
+                    wallet_id=row["pk"],
+                    available_balance=derived["available"],
+                    locked_balance=derived["locked"],
+                    earned_balance=derived["earned"],
+                    as_of=upto,
+                    entries=row["ledger_entries"],
+                ))
+
+        with transaction.atomic():
+            ChallengeWalletCheckpoint.objects.bulk_create(new_checkpoints, batch_size=chunk_size)
+
+        wallets += len(rows)
+        checkpoints += len(new_checkpoints)
+        chunks += 1
+
+        if len(rows) < chunk_size:
+            break
+
+    for mismatch in mismatches[:20]:
+        logger.error(
+            f"Challenge wallet {mismatch['wallet_id']} off its ledger: "
+            f"ledger {mismatch['ledger']}, found {mismatch['found']}"
+        )
+
+    return {
+        "wallets": wallets,
+        "checkpoints": checkpoints,
+        "mismatched": len(mismatches),
+        "mismatches": mismatches[:100],
+        "as_of": upto.isoformat(),
+        "chunks": chunks,
+        "duration_ms": round((time.perf_counter() - started) * 1000, 1),
+    }
+
+
+@shared_task(bind=True, max_retries=3)
+def checkpoint_challenge_wallets(self):
+    """Reconcile every challenge wallet with its transactions and checkpoint the balances"""
+    try:
+        trading_settings = getattr(settings, "TRADING_SETTINGS", {})
+        result = reconcile_challenge_wallets(
+            chunk_size=trading_settings.get("WALLET_CHECKPOINT_CHUNK_SIZE", 1000),
+            lag=trading_settings.get("WALLET_CHECKPOINT_LAG", 60),
+        )
+
+        logger.info(
+            f"Challenge wallet reconciliation complete. Wallets: {result['wallets']}, "
+            f"checkpoints: {result['checkpoints']}, mismatched: {result['mismatched']} "
+            f"({result['chunks']} chunks, {result['duration_ms']} ms)"
+        )
+        return result
+
+    except Exception as e:
+        logger.error(f"Error in checkpoint_challenge_wallets task: {e}")
+        raise self.retry(exc=e, countdown=60)
+
+
+@shared_task(bind=True, max_retries=3)
+def persist_leaderboards(self):
+    """Write the week and program leaderboard tables whose ranking changed since the last run"""
+    try:
+        batch = getattr(settings, "CACHE_SETTINGS", {}).get("LEADERBOARD_PERSIST_BATCH", 100)
+        started = time.perf_counter()
+        weeks = LeaderboardService.pop_dirty_weeks(batch)
+        programs = LeaderboardService.pop_dirty_programs(batch)
+        entries = failed = 0
+
+        for week_id in weeks:
+            try:
+                entries += LeaderboardService.update_cached_leaderboard(week_id)["entries"]
+            except Exception as e:
+                logger.error(f"Failed to persist leaderboard of week {week_id}: {e}")
+                LeaderboardService.mark_dirty(week_id)
+                failed += 1
+
+        for program_id in programs:
+            try:
+                entries += LeaderboardService.update_program_leaderboard(program_id)["entries"]
+            except Exception as e:
+                logger.error(f"Failed to persist leaderboard of program {program_id}: {e}")
+                LeaderboardService.mark_program_dirty(program_id)
+                failed += 1
+
+        result = {
+            "weeks": len(weeks),
+            "programs": len(programs),
+            "entries": entries,
+            "failed": failed,
+            "duration_ms": round((time.perf_counter() - started) * 1000, 1),
+        }
+        if weeks or programs:
+            logger.info(
+                f"Persisted {result['entries']} leaderboard entries for {result['weeks']} weeks "
+                f"and {result['programs']} programs ({result['failed']} failed, {result['duration_ms']} ms)"
+            )
+        return result
+
+    except Exception as e:
+        logger.error(f"Error in persist_leaderboards task: {e}")
+        raise self.retry(exc=e, countdown=60)
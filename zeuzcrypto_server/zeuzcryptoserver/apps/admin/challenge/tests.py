@@ -1,3 +1,183 @@
+from datetime import timedelta
+from decimal import Decimal
+from unittest import mock
+
+from django.core.cache import cache
 from django.test import TestCase
+from django.utils import timezone
+
+from apps.accounts.models import User
+from apps.caching import ranking
+from .models.analytics_models import ChallengeScore
+from .models.challenge_models import ChallengeProgram, ChallengeWeek, UserChallengeParticipation
+from .models.wallet_models import ChallengeWalletTransaction
+from .services.equity_service import EquityService
+from .services.leaderboard_service import LeaderboardService
+from .services.scoring_service import ScoringService
+from .services.wallet_service import WalletService
+
+
+class ChallengeTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        ranking._sets.clear()
+        self.program = ChallengeProgram.objects.create(name='Program', description='Test program')
+        self.week = ChallengeWeek.objects.create(
+            program=self.program,
+            title='Week 1',
+            week_number=1,
+            target_goal=Decimal('10'),
+            trading_type='SPOT',
+            start_date=timezone.now(),
+            end_date=timezone.now() + timedelta(days=7),
+        )
+
+    def participation(self, name):
+        user = User.objects.create_user(
+            email=f'{name}@example.com', mobile=str(9100000000 + User.objects.count()), password='pw12345678'
+        )
+        return UserChallengeParticipation.objects.create(user=user, week=self.week)
+
+
+class ScoringTests(ChallengeTestCase):
+    def setUp(self):
+        super().setUp()
+        self.opened = timezone.now() - timedelta(hours=5)
+
+    def trade_results(self, participation, results):
+        """Challenge wallet of 10,000 coins with closed trades ``[(type, amount), ...]`` a minute apart"""
+        wallet = WalletService.create_wallet_for_participation(participation, Decimal('10000'))
+        ChallengeWalletTransaction.objects.filter(wallet=wallet).update(created_at=self.opened)
+        for minute, (transaction_type, amount) in enumerate(results, start=1):
+            row = ChallengeWalletTransaction.objects.create(
+                wallet=wallet, transaction_type=transaction_type, amount=Decimal(amount),
+                balance_before=0, balance_after=0, description='',
+            )
+            ChallengeWalletTransaction.objects.filter(id=row.id).update(
+                created_at=self.opened + timedelta(minutes=minute)
+            )
+
+    def test_week_metrics_follow_the_equity_curve(self):
+        steady = self.participation('steady')
+        self.trade_results(steady, [('PROFIT_ADD', '100'), ('PROFIT_ADD', '120'), ('PROFIT_ADD', '90')])
+        swing = self.participation('swing')
+        self.trade_results(swing, [
+            ('PROFIT_ADD', '500'), ('LOSS_DEDUCT', '2000'), ('REWARD_BONUS', '100'), ('PROFIT_ADD', '300'),
+        ])
+
+        metrics = EquityService.week_metrics(self.week)
+
+        self.assertEqual(metrics[steady.id]['trades'], 3)
+        self.assertEqual(metrics[steady.id]['equity'], 10310.0)
+        self.assertEqual(metrics[steady.id]['max_drawdown_pct'], 0.0)
+        self.assertGreater(metrics[steady.id]['sharpe_like'], 1)
+        # The bonus moves the peak with equity: the drawdown is the loss alone
+        self.assertEqual(metrics[swing.id]['trades'], 3)
+        self.assertEqual(metrics[swing.id]['max_drawdown_pct'], 19.05)
+
+    def test_score_week_uses_equity_metrics(self):
+        steady = self.participation('steady')
+        self.trade_results(steady, [('PROFIT_ADD', '100'), ('PROFIT_ADD', '120'), ('PROFIT_ADD', '90')])
+        wiped = self.participation('wiped')
+        self.trade_results(wiped, [('LOSS_DEDUCT', '4000')])
+        idle = self.participation('idle')
+        self.trade_results(idle, [])
+
+        result = ScoringService.score_week(self.week)
+
+        self.assertEqual(result['scored'], 3)
+        scores = {
+            score.participation_id: score
+            for score in ChallengeScore.objects.filter(participation__week=self.week)
+        }
+        # Smooth gains score top marks, a single 40% loss none, no trades stays neutral
+        self.assertEqual(scores[steady.id].money_management_score, Decimal('10'))
+        self.assertEqual(scores[wiped.id].money_management_score, Decimal('0'))
+        self.assertEqual(scores[idle.id].money_management_score, Decimal('5'))
+        # No return and no trades: the total is the money management share plus the allocation floor
+        self.assertEqual(scores[steady.id].total_score, Decimal('2.54'))
+        self.assertEqual(scores[wiped.id].total_score, Decimal('0.04'))
+        self.assertEqual(scores[idle.id].total_score, Decimal('1.29'))
+        self.assertEqual(scores[steady.id].money_management_score, ScoringService.calculate_money_management_score(steady))
+
+
+class LeaderboardReadTests(ChallengeTestCase):
+    def setUp(self):
+        super().setUp()
+        self.service = LeaderboardService
+        self.ranked = []
+        for index, total in enumerate(['5', '9', '7', '3', '8']):
+            participation = self.participation(f'player{index}')
+            ChallengeScore.objects.create(participation=participation, total_score=Decimal(total))
+            self.ranked.append((Decimal(total), participation))
+        self.ranked.sort(key=lambda item: item[0], reverse=True)  # 9, 8, 7, 5, 3
+
+    def emails(self, rows):
+        return [row['user_email'] for row in rows]
+
+    def expected_emails(self, start, stop):
+        return [participation.user.email for _, participation in self.ranked[start:stop]]
+
+    def test_week_rank(self):
+        third = self.ranked[2][1]
+
+        self.assertEqual(
+            self.service.get_week_rank(self.week.id, third.id),
+            {'rank': 3, 'score': '7.00', 'participants': 5},
+        )
+        self.assertIsNone(self.service.get_week_rank(self.week.id, self.participation('newcomer').id))
+
+    def test_week_neighbours(self):
+        around = self.service.get_week_neighbours(self.week.id, self.ranked[0][1].id, k=1)
+
+        self.assertEqual(around['rank'], 1)
+        self.assertEqual([row['rank'] for row in around['entries']], [1, 2])
+        self.assertEqual(self.emails(around['entries']), self.expected_emails(0, 2))
+
+    def test_week_pages(self):
+        first = self.service.get_week_page(self.week.id, after_rank=0, limit=2)
+        last = self.service.get_week_page(self.week.id, after_rank=4, limit=2)
+
+        self.assertEqual(self.emails(first['results']), self.expected_emails(0, 2))
+        self.assertEqual(first['next_after_rank'], 2)
+        self.assertEqual([row['rank'] for row in last['results']], [5])
+        self.assertIsNone(last['next_after_rank'])
+
+    def test_reads_fall_back_to_persisted_ranks(self):
+        self.service.update_cached_leaderboard(self.week.id)
+        ranking._sets.clear()
+
+        with mock.patch.object(ranking, 'exists', side_effect=ConnectionError('ranking down')):
+            rank = self.service.get_week_rank(self.week.id, self.ranked[1][1].id)
+            page = self.service.get_week_page(self.week.id, after_rank=1, limit=3)
+
+        self.assertEqual(rank, {'rank': 2, 'score': '8.00', 'participants': 5})
+        self.assertEqual(self.emails(page['results']), self.expected_emails(1, 4))
+        self.assertEqual(page['next_after_rank'], 4)
+
+    def test_program_neighbours_and_pages(self):
+        fourth = self.ranked[3][1]
+
+        around = self.service.get_program_neighbours(self.program.id, fourth.user_id, k=1)
+        page = self.service.get_program_page(self.program.id, after_rank=0, limit=3)
+
+        self.assertEqual((around['rank'], around['score'], around['participants']), (4, '5.00', 5))
+        self.assertEqual(self.emails(around['entries']), self.expected_emails(2, 5))
+        self.assertEqual(self.emails(page['results']), self.expected_emails(0, 3))
+        self.assertEqual(page['next_after_rank'], 3)
+
+    def test_score_committed_during_a_load_is_kept(self):
+        """A score landing between the ranking's database read and its load is re-applied"""
+        last = self.ranked[-1][1]
+        original = ranking.replace
+
+        def replace_after_concurrent_score(key, scores, timeout=None):
+            with self.captureOnCommitCallbacks(execute=True):
+                ChallengeScore.objects.filter(participation=last).update(total_score=Decimal('10'))
+                self.service.record_score(self.week.id, last.id, Decimal('10'))
+            return original(key, scores, timeout)
+
+        with mock.patch.object(ranking, 'replace', side_effect=replace_after_concurrent_score):
+            self.assertTrue(self.service.load_week_ranking(self.week.id))
 
-# Create your tests here.
+        self.assertEqual(self.service.get_week_rank(self.week.id, last.id)['rank'], 1)
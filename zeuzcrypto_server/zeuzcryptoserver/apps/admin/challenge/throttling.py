@@ -0,0 +1,7 @@
+# throttling.py
+from apps.caching import UserSlidingWindowThrottle
+
+
+class ChallengeOrderRateThrottle(UserSlidingWindowThrottle):
+    """Challenge trades opened per user"""
+    scope = "challenge_orders"
@@ -21,6 +21,7 @@ from apps.admin.challenge.serializers.admin_serializers import (
 )
 # from apps.challenges.services.admin_service import AdminService
 from apps.admin.challenge.services.admin_service import AdminService
+from apps.admin.challenge.services.scoring_service import ScoringService
 
 class ChallengeAdminViewSet(viewsets.ModelViewSet):
     """Admin challenge management (staff only)"""
@@ -121,6 +122,13 @@ class ChallengeWeekAdminViewSet(viewsets.ModelViewSet):
         stats = AdminService.calculate_week_statistics(week)
         return Response(stats)
     
+    @action(detail=True, methods=['post'])
+    def calculate_scores(self, request, pk=None):
+        """Score all participants of the week in one batch"""
+        week = self.get_object()
+        result = ScoringService.score_week(week)
+        return Response(result)
+    
     @action(detail=True, methods=['get'])
     def export_csv(self, request, pk=None):
         """Export participants to CSV"""
@@ -15,6 +15,7 @@ from django.db import IntegrityError
 from apps.admin.challenge.models.challenge_models import ChallengeProgram, ChallengeWeek, ChallengeTask , ChallengeReward
 from apps.admin.challenge.models.challenge_models import UserChallengeParticipation
 from apps.permission.permissions import IsAdmin
+from apps.caching import cached_response
 
 # from apps.challenges.serializers.challenge_serializers import (
 #     ChallengeProgramSerializer, ChallengeWeekSerializer,
@@ -48,6 +49,14 @@ class ChallengeProgramViewSet(viewsets.ReadOnlyModelViewSet):
     serializer_class = ChallengeProgramSerializer
     permission_classes = [IsAuthenticated]
 
+    @cached_response("challenge_programs")
+    def list(self, request, *args, **kwargs):
+        return super().list(request, *args, **kwargs)
+
+    @cached_response("challenge_programs")
+    def retrieve(self, request, *args, **kwargs):
+        return super().retrieve(request, *args, **kwargs)
+
 #
 # class ChallengeWeekViewSet(viewsets.ReadOnlyModelViewSet):
 #     """Challenge week management"""
@@ -8,6 +8,30 @@ from rest_framework.permissions import IsAuthenticated
 
 # from apps.challenges.services.leaderboard_service import LeaderboardService
 from apps.admin.challenge.services.leaderboard_service import LeaderboardService
+from apps.admin.challenge.models.challenge_models import UserChallengeParticipation
+from apps.caching import cached_response
+
+
+def week_namespace(request):
+    return LeaderboardService.week_cache_namespace(request.query_params.get('week_id'))
+
+
+def program_namespace(request):
+    return LeaderboardService.program_cache_namespace(request.query_params.get('program_id'))
+
+
+def scope_namespace(request):
+    """Week namespace when ``week_id`` is given, program namespace otherwise"""
+    if request.query_params.get('week_id'):
+        return week_namespace(request)
+    return program_namespace(request)
+
+
+def int_param(request, name, default, maximum):
+    try:
+        return min(max(int(request.query_params.get(name, default)), 0), maximum)
+    except (TypeError, ValueError):
+        return default
 
 
 class LeaderboardViewSet(viewsets.ViewSet):
@@ -15,6 +39,7 @@ class LeaderboardViewSet(viewsets.ViewSet):
     permission_classes = [IsAuthenticated]
     
     @action(detail=False, methods=['get'])
+    @cached_response(week_namespace)
     def week_leaderboard(self, request):
         """Get week leaderboard"""
         week_id = request.query_params.get('week_id')
@@ -31,6 +56,7 @@ class LeaderboardViewSet(viewsets.ViewSet):
         return Response(leaderboard)
     
     @action(detail=False, methods=['get'])
+    @cached_response(program_namespace)
     def program_leaderboard(self, request):
         """Get program cumulative leaderboard"""
         program_id = request.query_params.get('program_id')
@@ -46,6 +72,7 @@ class LeaderboardViewSet(viewsets.ViewSet):
         return Response(leaderboard)
     
     @action(detail=False, methods=['get'])
+    @cached_response(week_namespace)
     def behavioral_leaderboard(self, request):
         """Get leaderboard by behavioral tag"""
         week_id = request.query_params.get('week_id')
@@ -59,4 +86,52 @@ class LeaderboardViewSet(viewsets.ViewSet):
             )
         
         leaderboard = LeaderboardService.get_behavioral_leaderboard(week_id, behavioral_tag, limit)
-        return Response(leaderboard)
\ No newline at end of file
+        return Response(leaderboard)
+    
+    @action(detail=False, methods=['get'])
+    @cached_response(scope_namespace, per_user=True)
+    def my_rank(self, request):
+        """Current user's rank in a week or program with the k entries around it"""
+        week_id = request.query_params.get('week_id')
+        program_id = request.query_params.get('program_id')
+        k = int_param(request, 'k', 5, 50)
+        
+        if week_id:
+            participation_id = UserChallengeParticipation.objects.filter(
+                user=request.user, week_id=week_id
+            ).values_list('id', flat=True).first()
+            result = (
+                LeaderboardService.get_week_neighbours(week_id, participation_id, k)
+                if participation_id else None
+            )
+        elif program_id:
+            result = LeaderboardService.get_program_neighbours(program_id, request.user.id, k)
+        else:
+            return Response(
+                {'error': 'week_id or program_id required'},
+                status=400
+            )
+        
+        if result is None:
+            return Response({'error': 'Not ranked yet'}, status=404)
+        return Response(result)
+    
+    @action(detail=False, methods=['get'])
+    @cached_response(scope_namespace)
+    def ranking(self, request):
+        """Week or program ranking, keyset-paginated with ``after_rank``"""
+        week_id = request.query_params.get('week_id')
+        program_id = request.query_params.get('program_id')
+        after_rank = int_param(request, 'after_rank', 0, 10 ** 9)
+        limit = int_param(request, 'limit', 50, 200) or 50
+        
+        if week_id:
+            page = LeaderboardService.get_week_page(week_id, after_rank, limit)
+        elif program_id:
+            page = LeaderboardService.get_program_page(program_id, after_rank, limit)
+        else:
+            return Response(
+                {'error': 'week_id or program_id required'},
+                status=400
+            )
+        return Response(page)
@@ -21,6 +21,8 @@ from apps.admin.challenge.serializers.trade_serializers import (
     ChallengeTradeSerializer, ChallengeTradeCreateSerializer,
     ChallengeTradeDetailSerializer, ChallengeTradeHistorySerializer
 )
+from apps.admin.challenge.throttling import ChallengeOrderRateThrottle
+from apps.caching.order_gate import order_gate
 
 import traceback
 class CompleteTradingViewSet(viewsets.ModelViewSet):
@@ -30,6 +32,11 @@ class CompleteTradingViewSet(viewsets.ModelViewSet):
     """
     serializer_class = ChallengeTradeSerializer
     permission_classes = [IsAuthenticated]
+
+    def get_throttles(self):
+        if self.action == 'create':
+            return [ChallengeOrderRateThrottle()]
+        return super().get_throttles()
     
     def get_queryset(self):
         return ChallengeTrade.objects.filter(
@@ -45,7 +52,6 @@ class CompleteTradingViewSet(viewsets.ModelViewSet):
             return ChallengeTradeDetailSerializer
         return ChallengeTradeSerializer
     
-    @transaction.atomic
     def create(self, request, *args, **kwargs):
         """
         Main entry point for all trade types
@@ -53,7 +59,13 @@ class CompleteTradingViewSet(viewsets.ModelViewSet):
         """
         serializer = self.get_serializer(data=request.data)
         serializer.is_valid(raise_exception=True)
-        
+
+        # Queue on the gate before opening the transaction
+        with order_gate.guard(request.user.pk, serializer.validated_data['asset_symbol'], scope='challenge'):
+            return self._create_trade(request, serializer)
+
+    @transaction.atomic
+    def _create_trade(self, request, serializer):
         try:
             participation = UserChallengeParticipation.objects.select_for_update().get(
                 id=serializer.validated_data['participation_id'],
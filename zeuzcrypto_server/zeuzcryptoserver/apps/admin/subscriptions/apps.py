@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class SubscriptionsConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "apps.admin.subscriptions"
+
+    def ready(self):
+        import apps.admin.subscriptions.signals
@@ -0,0 +1,61 @@
+# entitlements.py
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+
+
+def entitlement_ttl() -> int:
+    return getattr(settings, "SUBSCRIPTION_SETTINGS", {}).get("ENTITLEMENT_CACHE_TTL", 300)
+
+
+def entitlement_cache_key(user_id) -> str:
+    return f"subscription_entitlement:{user_id}"
+
+
+def load_entitlement(user_id) -> dict:
+    """Active subscription id and end date of a user, straight from the database"""
+    from .models import Subscription
+
+    subscription = (
+        Subscription.objects
+        .filter(user_id=user_id, status="ACTIVE", end_date__gte=timezone.now())
+        .order_by("-end_date")
+        .values("id", "end_date")
+        .first()
+    )
+    if not subscription:
+        return {"subscription_id": None, "end_date": None}
+    return {"subscription_id": subscription["id"], "end_date": subscription["end_date"]}
+
+
+def get_entitlement(user_id) -> dict:
+    """
+    Cached entitlement of a user.
+
+    Entries are dropped whenever one of the user's subscriptions is saved or
+    an order completes, and never outlive the subscription's end date, so
+    callers only need to compare ``end_date`` with the current time.
+    """
+    key = entitlement_cache_key(user_id)
+    entitlement = cache.get(key)
+    if entitlement is None:
+        entitlement = load_entitlement(user_id)
+        ttl = entitlement_ttl()
+        if entitlement["end_date"]:
+            remaining = (entitlement["end_date"] - timezone.now()).total_seconds()
+            ttl = max(1, min(ttl, int(remaining) + 1))
+        cache.set(key, entitlement, ttl)
+    return entitlement
+
+
+def invalidate_entitlement(user_id):
+    """Drop the cached entitlement once the current transaction commits"""
+    key = entitlement_cache_key(user_id)
+    transaction.on_commit(lambda: cache.delete(key))
+
+
+def invalidate_entitlements(user_ids):
+    keys = [entitlement_cache_key(user_id) for user_id in set(user_ids)]
+    if keys:
+        transaction.on_commit(lambda: cache.delete_many(keys))
@@ -5,6 +5,7 @@ from django.conf import settings
 from django.core.validators import MinValueValidator, MaxValueValidator
 from django.utils import timezone
 from django.core.exceptions import ValidationError
+from .entitlements import invalidate_entitlement
 
 
 class Plan(models.Model):
@@ -319,6 +320,8 @@ class SubscriptionOrder(models.Model):
                 status="ACTIVE",
             )
 
+            invalidate_entitlement(self.user_id)
+
             # Log order completion in history
             SubscriptionHistory.log_event(
                 subscription=subscription,
@@ -480,6 +483,7 @@ class Subscription(models.Model):
 
         # Save the instance
         super().save(*args, **kwargs)
+        invalidate_entitlement(self.user_id)
 
         # Prepare new values for history
         new_values = {
@@ -536,6 +540,10 @@ class Subscription(models.Model):
                     },
                 )
 
+    def delete(self, *args, **kwargs):
+        invalidate_entitlement(self.user_id)
+        return super().delete(*args, **kwargs)
+
 
 # Updated SubscriptionHistory with new event types
 class SubscriptionHistory(models.Model):
@@ -0,0 +1,12 @@
+# signals.py
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from apps.caching import invalidate_namespaces
+from .models import Plan
+
+
+@receiver([post_save, post_delete], sender=Plan)
+def invalidate_plan_cache(sender, instance, **kwargs):
+    """Plan listings are served from the response cache"""
+    invalidate_namespaces("plans")
@@ -0,0 +1,103 @@
+# tasks.py - Celery tasks for subscription lifecycle
+import time
+import logging
+from celery import shared_task
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from .models import Subscription, SubscriptionHistory
+from .entitlements import invalidate_entitlements
+
+logger = logging.getLogger(__name__)
+
+HISTORY_FIELDS = ["start_date", "end_date", "original_price", "discount_amount", "final_price"]
+
+
+def history_values(row: dict, status: str) -> dict:
+    """Same shape as the values Subscription.save() logs"""
+    return {
+        "status": status,
+        "start_date": row["start_date"].isoformat(),
+        "end_date": row["end_date"].isoformat(),
+        "original_price": str(row["original_price"]),
+        "discount_amount": str(row["discount_amount"]),
+        "final_price": str(row["final_price"]),
+    }
+
+
+def sweep_expired_subscriptions(chunk_size: int = 1000, now=None) -> dict:
+    """
+    Expire every overdue ACTIVE subscription in chunks.
+
+    Each chunk walks the (status, end_date) index, flips the rows with one
+    UPDATE, writes their STATUS_CHANGED history with one bulk insert and
+    drops the owners' cached entitlements - one short transaction per chunk.
+    """
+    now = now or timezone.now()
+    started = time.perf_counter()
+    expired = history_rows = chunks = 0
+
+    while True:
+        with transaction.atomic():
+            rows = list(
+                Subscription.objects
+                .select_for_update(skip_locked=True)
+                .filter(status="ACTIVE", end_date__lt=now)
+                .order_by("end_date")
+                .values("id", "user_id", "subscription_source", *HISTORY_FIELDS)[:chunk_size]
+            )
+            if not rows:
+                break
+
+            updated = Subscription.objects.filter(
+                id__in=[row["id"] for row in rows], status="ACTIVE"
+            ).update(status="EXPIRED", updated_at=now)
+
+            history = SubscriptionHistory.objects.bulk_create([
+                SubscriptionHistory(
+                    subscription_id=row["id"],
+                    user_id=row["user_id"],
+                    event_type="STATUS_CHANGED",
+                    previous_values=history_values(row, "ACTIVE"),
+                    new_values={
+                        **history_values(row, "EXPIRED"),
+                        "subscription_source": row["subscription_source"],
+                    },
+                )
+                for row in rows
+            ], batch_size=chunk_size)
+
+            invalidate_entitlements(row["user_id"] for row in rows)
+
+        expired += updated
+        history_rows += len(history)
+        chunks += 1
+
+        if len(rows) < chunk_size:
+            break
+
+    return {
+        "expired": expired,
+        "history_rows": history_rows,
+        "chunks": chunks,
+        "chunk_size": chunk_size,
+        "duration_ms": round((time.perf_counter() - started) * 1000, 1),
+    }
+
+
+@shared_task(bind=True, max_retries=3)
+def expire_subscriptions(self):
+    """Mark ACTIVE subscriptions past their end date as EXPIRED"""
+    try:
+        chunk_size = getattr(settings, "SUBSCRIPTION_SETTINGS", {}).get("EXPIRY_CHUNK_SIZE", 1000)
+        result = sweep_expired_subscriptions(chunk_size=chunk_size)
+
+        logger.info(
+            f"Expired {result['expired']} subscriptions in {result['chunks']} chunks "
+            f"({result['history_rows']} history rows, {result['duration_ms']} ms)"
+        )
+        return result
+
+    except Exception as e:
+        logger.error(f"Error in expire_subscriptions task: {e}")
+        raise self.retry(exc=e, countdown=60)
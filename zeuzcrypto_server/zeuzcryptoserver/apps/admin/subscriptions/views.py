@@ -5,6 +5,7 @@ from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework.filters import SearchFilter, OrderingFilter
 from django.utils import timezone
 from django.db.models import Count, Q, F
+from apps.caching import cached_response
 from .models import Plan, Coupon, PlanCoupon, Subscription, SubscriptionHistory
 from .serializers import (
     PlanSerializer,
@@ -38,7 +39,12 @@ class PlanViewSet(viewsets.ModelViewSet):
             permission_classes = [permissions.IsAdminUser]
         return [permission() for permission in permission_classes]
 
+    @cached_response("plans")
+    def list(self, request, *args, **kwargs):
+        return super().list(request, *args, **kwargs)
+
     @action(detail=False, methods=["get"])
+    @cached_response("plans")
     def active(self, request):
         """Get only active plans, optionally filtered by user type"""
         active_plans = self.queryset.filter(is_active=True)
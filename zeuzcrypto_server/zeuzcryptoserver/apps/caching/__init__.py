@@ -0,0 +1,26 @@
+from .response_cache import (
+    cached_response,
+    invalidate_namespaces,
+    versioned_key,
+    bump_version,
+)
+from .throttling import (
+    rate_limiter,
+    SlidingWindowThrottle,
+    IPSlidingWindowThrottle,
+    UserSlidingWindowThrottle,
+)
+from .ranking import ranking, SortedSetRanking
+
+__all__ = [
+    "cached_response",
+    "invalidate_namespaces",
+    "versioned_key",
+    "bump_version",
+    "rate_limiter",
+    "SlidingWindowThrottle",
+    "IPSlidingWindowThrottle",
+    "UserSlidingWindowThrottle",
+    "ranking",
+    "SortedSetRanking",
+]
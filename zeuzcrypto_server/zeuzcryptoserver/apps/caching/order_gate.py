@@ -0,0 +1,196 @@
+# order_gate.py
+import time
+import uuid
+import logging
+import threading
+from contextlib import contextmanager
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.redis import RedisCache
+from rest_framework.exceptions import Throttled
+
+logger = logging.getLogger(__name__)
+
+# Delete the lock only if we still own it (it may have expired and been re-taken)
+RELEASE_LOCK_LUA = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+
+class OrderGateRejected(Throttled):
+    """429 with Retry-After, raised when the gate turns an order away"""
+    default_detail = 'Too many orders in flight, retry shortly.'
+    default_code = 'order_gate'
+
+
+class OrderGate:
+    """
+    Per-user admission control for order endpoints, shared by every worker.
+
+    * At most ``ORDER_GATE_MAX_INFLIGHT`` orders of one user are admitted at
+      a time (running or waiting); the rest are rejected immediately, so a
+      burst from one bot cannot pile up on worker threads or DB connections.
+    * Admitted orders then take a short lock on (user, symbol), waiting up to
+      ``ORDER_GATE_LOCK_WAIT`` seconds. Orders of a user on the same symbol
+      run one at a time without holding a DB transaction while queued.
+
+    The lock TTL bounds how long a crashed worker can block a symbol. Cache
+    errors fail open, like the rate limiter, and a lock that expires mid-order
+    lets the next one in: the gate is a throttle, not the correctness guard.
+    Code that must not run twice for the same trade or wallet (closes,
+    settlements) takes its own database row lock inside the guarded block.
+    """
+
+    def __init__(self, cache_alias: str = "default"):
+        self.cache_alias = cache_alias
+        self._release_script = None
+        self._stats_lock = threading.Lock()
+
+        # Counters
+        self.admitted = 0
+        self.queued = 0  # admitted orders that had to wait for the symbol lock
+        self.rejected_busy = 0
+        self.rejected_timeout = 0
+        self.errors = 0
+        self.waiting = 0
+        self.total_wait_ms = 0.0
+
+    @property
+    def cache(self):
+        return caches[self.cache_alias]
+
+    @staticmethod
+    def gate_settings() -> dict:
+        trading_settings = getattr(settings, 'TRADING_SETTINGS', {})
+        return {
+            'max_inflight': trading_settings.get('ORDER_GATE_MAX_INFLIGHT', 3),
+            'lock_ttl': trading_settings.get('ORDER_GATE_LOCK_TTL', 10),
+            'lock_wait': trading_settings.get('ORDER_GATE_LOCK_WAIT', 2.0),
+            'poll_interval': trading_settings.get('ORDER_GATE_POLL_INTERVAL', 0.05),
+        }
+
+    def _count(self, counter: str, amount=1):
+        with self._stats_lock:
+            setattr(self, counter, getattr(self, counter) + amount)
+
+    @contextmanager
+    def guard(self, user_id, symbol: str, scope: str = 'trading'):
+        """Run the enclosed block as an admitted order of ``user_id`` on ``symbol`` (best effort, see above)"""
+        config = self.gate_settings()
+        inflight_key = f"order_gate:inflight:{user_id}"
+        lock_key = f"order_gate:lock:{scope}:{user_id}:{symbol}"
+
+        try:
+            admitted = self._enter(inflight_key, config)
+        except Exception as e:
+            logger.error(f"❌ Order gate unavailable, admitting order: {e}")
+            self._count('errors')
+            admitted = None
+
+        if admitted is None:
+            yield
+            return
+
+        if not admitted:
+            self._count('rejected_busy')
+            logger.warning(f"🚦 Order rejected for user {user_id}: {config['max_inflight']} already in flight")
+            raise OrderGateRejected(wait=config['lock_wait'])
+
+        try:
+            try:
+                token = self._acquire(lock_key, config)
+            except Exception as e:
+                logger.error(f"❌ Order lock unavailable, admitting order: {e}")
+                self._count('errors')
+                token = False  # Admitted without the (user, symbol) lock
+
+            if token is None:
+                self._count('rejected_timeout')
+                logger.warning(f"🚦 Order rejected for user {user_id}: {symbol} busy for {config['lock_wait']}s")
+                raise OrderGateRejected(wait=config['lock_wait'])
+
+            self._count('admitted')
+            try:
+                yield
+            finally:
+                if token:
+                    self._release(lock_key, token)
+        finally:
+            self._leave(inflight_key)
+
+    # ---------------------------
+    # In-flight counter
+    # ---------------------------
+    def _enter(self, key: str, config: dict) -> bool:
+        cache = self.cache
+        cache.add(key, 0, config['lock_ttl'] * 3)
+        if cache.incr(key) > config['max_inflight']:
+            cache.decr(key)
+            return False
+        return True
+
+    def _leave(self, key: str):
+        try:
+            self.cache.decr(key)
+        except ValueError:
+            pass  # Counter expired while the order ran
+        except Exception as e:
+            logger.error(f"❌ Failed to release order gate slot {key}: {e}")
+
+    # ---------------------------
+    # (user, symbol) lock
+    # ---------------------------
+    def _acquire(self, key: str, config: dict):
+        token = uuid.uuid4().hex
+        cache = self.cache
+        if cache.add(key, token, config['lock_ttl']):
+            return token
+
+        started = time.monotonic()
+        deadline = started + config['lock_wait']
+        self._count('queued')
+        self._count('waiting')
+        try:
+            while time.monotonic() < deadline:
+                time.sleep(config['poll_interval'])
+                if cache.add(key, token, config['lock_ttl']):
+                    return token
+            return None
+        finally:
+            self._count('waiting', -1)
+            self._count('total_wait_ms', (time.monotonic() - started) * 1000)
+
+    def _release(self, key: str, token: str):
+        cache = self.cache
+        try:
+            if isinstance(cache, RedisCache):
+                full_key = cache.make_key(key)
+                client = cache._cache.get_client(full_key, write=True)
+                if self._release_script is None:
+                    self._release_script = client.register_script(RELEASE_LOCK_LUA)
+                # The cache pickles values; compare against the stored form
+                self._release_script(
+                    keys=[full_key], args=[cache._cache._serializer.dumps(token)], client=client
+                )
+            elif cache.get(key) == token:
+                cache.delete(key)
+        except Exception as e:
+            logger.error(f"❌ Failed to release order lock {key}: {e}")
+
+    def stats(self) -> dict:
+        with self._stats_lock:
+            return {
+                'admitted': self.admitted,
+                'queued': self.queued,
+                'waiting': self.waiting,
+                'rejected_busy': self.rejected_busy,
+                'rejected_timeout': self.rejected_timeout,
+                'errors': self.errors,
+                'avg_wait_ms': round(self.total_wait_ms / self.queued, 1) if self.queued else 0.0,
+            }
+
+
+order_gate = OrderGate()
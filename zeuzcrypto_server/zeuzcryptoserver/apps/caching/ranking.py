@@ -0,0 +1,189 @@
+# ranking.py
+import bisect
+import logging
+import threading
+from django.core.cache import caches
+from django.core.cache.backends.redis import RedisCache
+
+logger = logging.getLogger(__name__)
+
+# ZADD only into a set that is already loaded, so a score arriving after an
+# eviction cannot leave a partial set behind (the next read reloads it whole)
+ADD_IF_EXISTS_LUA = """
+if redis.call('EXISTS', KEYS[1]) == 1 then
+    return redis.call('ZADD', KEYS[1], ARGV[1], ARGV[2])
+end
+return -1
+"""
+
+
+class SortedSetRanking:
+    """
+    Sorted sets shared by every worker: O(log n) score updates, rank lookups
+    and range reads.
+
+    Members are ranked by score descending, ties by member descending (Redis
+    ``ZREVRANK``/``ZREVRANGE`` order). With the Redis cache backend every
+    call is one round trip on a real sorted set; any other backend
+    (``CACHE_URL=locmem://`` in tests) keeps a per-key bisect-sorted list
+    in-process. Callers load a set with ``replace`` and treat a missing set
+    as "not loaded"; errors propagate so they can fall back to the database.
+    """
+
+    def __init__(self, cache_alias: str = "default"):
+        self.cache_alias = cache_alias
+        self._add_script = None
+        self._lock = threading.Lock()
+        self._sets = {}  # key -> ({member: score}, sorted [(score, member)]) for the in-process fallback
+
+        # Counters
+        self.updates = 0
+        self.reloads = 0
+
+    @property
+    def cache(self):
+        return caches[self.cache_alias]
+
+    def _redis(self, key: str):
+        cache = self.cache
+        if not isinstance(cache, RedisCache):
+            return None, None
+        full_key = cache.make_key(key)
+        return cache._cache.get_client(full_key, write=True), full_key
+
+    @staticmethod
+    def _decode(member):
+        return member.decode() if isinstance(member, bytes) else member
+
+    # ---------------------------
+    # Writes
+    # ---------------------------
+    def replace(self, key: str, scores: dict, timeout: int = None):
+        """Load ``key`` with ``{member: score}`` in one step"""
+        self.reloads += 1
+        client, full_key = self._redis(key)
+        if client is None:
+            with self._lock:
+                if scores:
+                    self._sets[key] = (dict(scores), sorted((score, member) for member, score in scores.items()))
+                else:
+                    self._sets.pop(key, None)
+            return
+
+        pipe = client.pipeline(transaction=True)
+        pipe.delete(full_key)
+        if scores:
+            pipe.zadd(full_key, scores)
+            if timeout:
+                pipe.expire(full_key, timeout)
+        pipe.execute()
+
+    def add(self, key: str, member: str, score: float, only_if_loaded: bool = True) -> bool:
+        """Set ``member``'s score; False when ``only_if_loaded`` and the set is not loaded"""
+        client, full_key = self._redis(key)
+        if client is None:
+            with self._lock:
+                if key not in self._sets:
+                    if only_if_loaded:
+                        return False
+                    self._sets[key] = ({}, [])
+                members, ordered = self._sets[key]
+                if member in members:
+                    ordered.pop(bisect.bisect_left(ordered, (members[member], member)))
+                members[member] = score
+                bisect.insort(ordered, (score, member))
+                self.updates += 1
+            return True
+
+        if not only_if_loaded:
+            client.zadd(full_key, {member: score})
+            self.updates += 1
+            return True
+        if self._add_script is None:
+            self._add_script = client.register_script(ADD_IF_EXISTS_LUA)
+        applied = self._add_script(keys=[full_key], args=[score, member], client=client) != -1
+        if applied:
+            self.updates += 1
+        return applied
+
+    def remove(self, key: str, member: str):
+        client, full_key = self._redis(key)
+        if client is None:
+            with self._lock:
+                members, ordered = self._sets.get(key, ({}, []))
+                if member in members:
+                    ordered.pop(bisect.bisect_left(ordered, (members.pop(member), member)))
+            return
+        client.zrem(full_key, member)
+
+    def pop_lowest(self, key: str, count: int = 1) -> list:
+        """Remove and return up to ``count`` ``(member, score)`` pairs with the lowest scores"""
+        client, full_key = self._redis(key)
+        if client is None:
+            with self._lock:
+                members, ordered = self._sets.get(key, ({}, []))
+                popped = ordered[:count]
+                del ordered[:count]
+                for score, member in popped:
+                    members.pop(member, None)
+                return [(member, score) for score, member in popped]
+        return [(self._decode(member), score) for member, score in client.zpopmin(full_key, count)]
+
+    # ---------------------------
+    # Reads
+    # ---------------------------
+    def exists(self, key: str) -> bool:
+        client, full_key = self._redis(key)
+        if client is None:
+            return key in self._sets
+        return bool(client.exists(full_key))
+
+    def count(self, key: str) -> int:
+        client, full_key = self._redis(key)
+        if client is None:
+            return len(self._sets.get(key, ({}, []))[0])
+        return client.zcard(full_key)
+
+    def rank(self, key: str, member: str):
+        """0-based position of ``member`` (highest score first), None if absent"""
+        client, full_key = self._redis(key)
+        if client is None:
+            with self._lock:
+                members, ordered = self._sets.get(key, ({}, []))
+                if member not in members:
+                    return None
+                return len(ordered) - 1 - bisect.bisect_left(ordered, (members[member], member))
+        return client.zrevrank(full_key, member)
+
+    def score(self, key: str, member: str):
+        client, full_key = self._redis(key)
+        if client is None:
+            return self._sets.get(key, ({}, []))[0].get(member)
+        return client.zscore(full_key, member)
+
+    def range(self, key: str, start: int, stop: int) -> list:
+        """``(member, score)`` pairs from position ``start`` to ``stop`` inclusive (highest score first)"""
+        client, full_key = self._redis(key)
+        if client is None:
+            with self._lock:
+                ordered = self._sets.get(key, ({}, []))[1]
+                size = len(ordered)
+                stop = size - 1 if stop < 0 else min(stop, size - 1)
+                if start > stop:
+                    return []
+                window = ordered[size - 1 - stop:size - start]
+                return [(member, score) for score, member in reversed(window)]
+        return [
+            (self._decode(member), score)
+            for member, score in client.zrevrange(full_key, start, stop, withscores=True)
+        ]
+
+    def stats(self) -> dict:
+        return {
+            'updates': self.updates,
+            'reloads': self.reloads,
+            'local_sets': len(self._sets),
+        }
+
+
+ranking = SortedSetRanking()
@@ -0,0 +1,125 @@
+# response_cache.py
+import hashlib
+import logging
+from functools import wraps
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from rest_framework.response import Response
+
+logger = logging.getLogger(__name__)
+
+
+def response_cache_ttl() -> int:
+    return getattr(settings, "CACHE_SETTINGS", {}).get("RESPONSE_CACHE_TTL", 60)
+
+
+# ---------------------------
+# Versioned namespaces
+# ---------------------------
+def version_key(namespace: str) -> str:
+    return f"cache_version:{namespace}"
+
+
+def get_versions(namespaces) -> dict:
+    """Current version of each namespace (1 for namespaces never bumped)"""
+    keys = {namespace: version_key(namespace) for namespace in namespaces}
+    stored = cache.get_many(list(keys.values()))
+    return {namespace: stored.get(key, 1) for namespace, key in keys.items()}
+
+
+def versioned_key(namespaces, suffix: str) -> str:
+    """
+    Cache key that embeds the version of every namespace it depends on.
+
+    Bumping any of those versions makes the key unreachable, so a whole
+    namespace is invalidated with one INCR instead of a key scan; the old
+    entries simply age out with their TTL.
+    """
+    versions = get_versions(namespaces)
+    tag = ":".join(f"{namespace}@{versions[namespace]}" for namespace in sorted(versions))
+    return f"{tag}:{suffix}"
+
+
+def bump_version(namespace: str):
+    key = version_key(namespace)
+    try:
+        cache.incr(key)
+    except ValueError:
+        # Never bumped yet: readers assume 1, so start past it
+        if not cache.add(key, 2, None):
+            cache.incr(key)
+
+
+def invalidate_namespaces(*namespaces):
+    """Bump the given namespaces once the current transaction commits"""
+    namespaces = {namespace for namespace in namespaces if namespace}
+
+    def bump():
+        for namespace in namespaces:
+            try:
+                bump_version(namespace)
+            except Exception as e:
+                logger.error(f"❌ Failed to invalidate cache namespace {namespace}: {e}")
+
+    if namespaces:
+        transaction.on_commit(bump)
+
+
+# ---------------------------
+# Response cache
+# ---------------------------
+def request_fingerprint(request, per_user: bool = False) -> str:
+    query = sorted(request.query_params.lists())
+    raw = f"{request.path}?{query}"
+    if per_user:
+        raw += f"|user={request.user.pk}"
+    return hashlib.md5(raw.encode()).hexdigest()
+
+
+def cached_response(*namespaces, timeout: int = None, per_user: bool = False):
+    """
+    Read-through cache for GET endpoints of DRF views.
+
+    ``namespaces`` are strings or callables taking the request (e.g. to
+    scope a leaderboard by ``week_id``); writes invalidate them with
+    ``invalidate_namespaces``. Only 200 responses are stored, keyed on the
+    path and query string (and the user with ``per_user=True``). Cache
+    errors fall through to the view so an unavailable Redis degrades to
+    uncached reads.
+    """
+    def decorator(view_method):
+        @wraps(view_method)
+        def wrapper(self, request, *args, **kwargs):
+            if request.method != "GET":
+                return view_method(self, request, *args, **kwargs)
+
+            resolved = [ns(request) if callable(ns) else ns for ns in namespaces]
+            try:
+                key = versioned_key(resolved, f"response:{request_fingerprint(request, per_user)}")
+                cached = cache.get(key)
+            except Exception as e:
+                logger.warning(f"⚠️ Response cache unavailable: {e}")
+                return view_method(self, request, *args, **kwargs)
+
+            if cached is not None:
+                response = Response(cached["data"], status=cached["status"])
+                response["X-Cache"] = "HIT"
+                return response
+
+            response = view_method(self, request, *args, **kwargs)
+            if response.status_code == 200:
+                try:
+                    cache.set(
+                        key,
+                        {"data": response.data, "status": response.status_code},
+                        timeout if timeout is not None else response_cache_ttl(),
+                    )
+                except Exception as e:
+                    logger.warning(f"⚠️ Failed to store cached response: {e}")
+                response["X-Cache"] = "MISS"
+            return response
+
+        return wrapper
+
+    return decorator
@@ -0,0 +1,226 @@
+# throttling.py
+import math
+import time
+import logging
+import threading
+from django.core.cache import caches
+from django.core.cache.backends.redis import RedisCache
+from django.core.exceptions import ImproperlyConfigured
+from rest_framework.settings import api_settings
+from rest_framework.throttling import BaseThrottle
+
+logger = logging.getLogger(__name__)
+
+# Sliding-window counter: the hit count of the current fixed window plus the
+# previous window's count weighted by how much of it still overlaps the
+# sliding window. O(1) state per key (one hash) and one EVALSHA per check;
+# per-scope allowed/throttled counters are bumped in the same round trip.
+#
+# KEYS[1] counter hash, KEYS[2] scope metrics hash
+# ARGV    limit, window (ms), now (ms)
+# Returns {allowed (0/1), remaining, retry_after (ms)}
+SLIDING_WINDOW_LUA = """
+local limit = tonumber(ARGV[1])
+local window = tonumber(ARGV[2])
+local now = tonumber(ARGV[3])
+local start = now - (now % window)
+
+local state = redis.call('HMGET', KEYS[1], 'start', 'cur', 'prev')
+local cur_start = tonumber(state[1]) or start
+local cur = tonumber(state[2]) or 0
+local prev = tonumber(state[3]) or 0
+
+if cur_start ~= start then
+    if start - cur_start == window then prev = cur else prev = 0 end
+    cur = 0
+end
+
+local elapsed = now - start
+local estimated = prev * (window - elapsed) / window + cur
+
+if estimated + 1 > limit then
+    local wait = window - elapsed
+    if prev > 0 and cur + 1 <= limit then
+        wait = math.ceil(window * (1 - (limit - cur - 1) / prev) - elapsed)
+    end
+    redis.call('HSET', KEYS[1], 'start', start, 'cur', cur, 'prev', prev)
+    redis.call('PEXPIRE', KEYS[1], window * 2)
+    redis.call('HINCRBY', KEYS[2], 'throttled', 1)
+    return {0, 0, wait}
+end
+
+cur = cur + 1
+redis.call('HSET', KEYS[1], 'start', start, 'cur', cur, 'prev', prev)
+redis.call('PEXPIRE', KEYS[1], window * 2)
+redis.call('HINCRBY', KEYS[2], 'allowed', 1)
+return {1, math.floor(limit - estimated - 1), 0}
+"""
+
+
+class SlidingWindowRateLimiter:
+    """
+    Rate limiter shared by every worker.
+
+    With the Redis cache backend each check is a single atomic Lua call, so
+    concurrent workers can never both take the last slot. Any other backend
+    (``CACHE_URL=locmem://`` in tests) uses the same algorithm in-process.
+    Errors reaching Redis fail open: a request is never rejected because the
+    limiter is down.
+    """
+
+    def __init__(self, cache_alias: str = "default"):
+        self.cache_alias = cache_alias
+        self._script = None
+        self._lock = threading.Lock()
+        self._windows = {}  # key -> (start, cur, prev) for the in-process fallback
+        self._metrics = {}  # scope -> {'allowed': n, 'throttled': n} for the in-process fallback
+
+    @property
+    def cache(self):
+        return caches[self.cache_alias]
+
+    @staticmethod
+    def counter_key(scope: str, ident: str) -> str:
+        return f"throttle:{scope}:{ident}"
+
+    @staticmethod
+    def metrics_key(scope: str) -> str:
+        return f"throttle_metrics:{scope}"
+
+    def hit(self, scope: str, ident: str, limit: int, window: int) -> dict:
+        """Count one request of ``ident`` against ``limit`` per ``window`` seconds"""
+        now_ms = int(time.time() * 1000)
+        window_ms = window * 1000
+        try:
+            if isinstance(self.cache, RedisCache):
+                allowed, remaining, retry_after = self._hit_redis(scope, ident, limit, window_ms, now_ms)
+            else:
+                allowed, remaining, retry_after = self._hit_local(scope, ident, limit, window_ms, now_ms)
+        except Exception as e:
+            logger.error(f"❌ Rate limiter unavailable for {scope}, allowing request: {e}")
+            return {'allowed': True, 'remaining': None, 'retry_after': None}
+
+        return {
+            'allowed': bool(allowed),
+            'remaining': max(int(remaining), 0),
+            'retry_after': retry_after / 1000 if not allowed else None,
+        }
+
+    def _hit_redis(self, scope, ident, limit, window_ms, now_ms):
+        cache = self.cache
+        counter_key = cache.make_key(self.counter_key(scope, ident))
+        client = cache._cache.get_client(counter_key, write=True)
+        if self._script is None:
+            self._script = client.register_script(SLIDING_WINDOW_LUA)
+        return self._script(
+            keys=[counter_key, cache.make_key(self.metrics_key(scope))],
+            args=[limit, window_ms, now_ms],
+            client=client,
+        )
+
+    def _hit_local(self, scope, ident, limit, window_ms, now_ms):
+        start = now_ms - (now_ms % window_ms)
+        key = self.counter_key(scope, ident)
+        with self._lock:
+            cur_start, cur, prev = self._windows.get(key, (start, 0, 0))
+            if cur_start != start:
+                prev = cur if start - cur_start == window_ms else 0
+                cur = 0
+
+            elapsed = now_ms - start
+            estimated = prev * (window_ms - elapsed) / window_ms + cur
+            metrics = self._metrics.setdefault(scope, {'allowed': 0, 'throttled': 0})
+
+            if estimated + 1 > limit:
+                wait = window_ms - elapsed
+                if prev > 0 and cur + 1 <= limit:
+                    wait = math.ceil(window_ms * (1 - (limit - cur - 1) / prev) - elapsed)
+                self._windows[key] = (start, cur, prev)
+                metrics['throttled'] += 1
+                return 0, 0, wait
+
+            self._windows[key] = (start, cur + 1, prev)
+            metrics['allowed'] += 1
+            return 1, int(limit - estimated - 1), 0
+
+    def stats(self, scope: str) -> dict:
+        """Allowed / throttled request counts of a scope across all workers"""
+        if isinstance(self.cache, RedisCache):
+            cache = self.cache
+            key = cache.make_key(self.metrics_key(scope))
+            raw = cache._cache.get_client(key).hgetall(key)
+            counts = {field.decode(): int(value) for field, value in raw.items()}
+        else:
+            with self._lock:
+                counts = dict(self._metrics.get(scope, {}))
+
+        allowed = counts.get('allowed', 0)
+        throttled = counts.get('throttled', 0)
+        total = allowed + throttled
+        return {
+            'scope': scope,
+            'allowed': allowed,
+            'throttled': throttled,
+            'throttled_pct': round(throttled / total * 100, 2) if total else 0.0,
+        }
+
+
+rate_limiter = SlidingWindowRateLimiter()
+
+
+class SlidingWindowThrottle(BaseThrottle):
+    """
+    DRF throttle backed by ``rate_limiter``.
+
+    Rates come from ``REST_FRAMEWORK['DEFAULT_THROTTLE_RATES'][scope]`` in the
+    usual ``"<n>/<period>"`` form. Only the methods in ``methods`` count.
+    Subclasses set ``scope`` and may override ``get_ident``.
+    """
+
+    scope = None
+    rate = None
+    methods = ("POST",)
+
+    def __init__(self):
+        if not self.rate:
+            try:
+                self.rate = api_settings.DEFAULT_THROTTLE_RATES[self.scope]
+            except KeyError:
+                raise ImproperlyConfigured(f"No default throttle rate set for '{self.scope}' scope")
+        self.num_requests, self.duration = self.parse_rate(self.rate)
+        self.result = None
+
+    @staticmethod
+    def parse_rate(rate: str):
+        num, period = rate.split('/')
+        duration = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}[period[0]]
+        return int(num), duration
+
+    def allow_request(self, request, view):
+        if request.method not in self.methods:
+            return True
+
+        ident = self.get_ident(request)
+        if not ident:
+            return True
+
+        self.result = rate_limiter.hit(self.scope, ident, self.num_requests, self.duration)
+        if not self.result['allowed']:
+            logger.warning(f"[{self.scope}] Rate limit exceeded for ident: {ident}")
+        return self.result['allowed']
+
+    def wait(self):
+        return self.result['retry_after'] if self.result else None
+
+
+class IPSlidingWindowThrottle(SlidingWindowThrottle):
+    """Limits per client IP (anonymous endpoints such as login)"""
+
+
+class UserSlidingWindowThrottle(SlidingWindowThrottle):
+    """Limits per authenticated user, falling back to the client IP"""
+
+    def get_ident(self, request):
+        if request.user and request.user.is_authenticated:
+            return f"user:{request.user.pk}"
+        return super().get_ident(request)
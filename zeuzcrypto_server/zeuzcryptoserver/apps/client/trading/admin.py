@@ -1,6 +1,6 @@
 # admin.py - Django admin interface
 from django.contrib import admin
-from .models import Trade, FuturesDetails, OptionsDetails, TradeHistory, Portfolio
+from .models import Trade, FuturesDetails, OptionsDetails, TradeHistory, Portfolio, PendingOrder
 
 
 @admin.register(Trade)
@@ -38,6 +38,15 @@ class TradeHistoryAdmin(admin.ModelAdmin):
     readonly_fields = ['created_at']
 
 
+@admin.register(PendingOrder)
+class PendingOrderAdmin(admin.ModelAdmin):
+    list_display = ['user', 'asset_symbol', 'order_type', 'direction', 'status', 
+                    'quantity', 'limit_price', 'stop_price', 'fill_price', 'created_at']
+    list_filter = ['order_type', 'direction', 'status', 'trade_type', 'created_at']
+    search_fields = ['user__email', 'asset_symbol']
+    readonly_fields = ['id', 'created_at', 'updated_at', 'filled_at', 'triggered_at']
+
+
 @admin.register(Portfolio)
 class PortfolioAdmin(admin.ModelAdmin):
     list_display = ['user', 'total_value', 'total_return_percentage', 'active_trades_count', 
@@ -0,0 +1,102 @@
+# conflation.py
+import time
+import asyncio
+import logging
+from typing import Awaitable, Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class TickConflator:
+    """
+    Conflates exchange ticks between the feed and the database.
+
+    Every incoming ticker overwrites the previous one for its symbol and marks
+    the symbol dirty. A background task flushes the dirty set at a fixed
+    cadence, so intermediate ticks are dropped and DB write load depends on
+    the number of active symbols rather than on market volatility.
+    """
+
+    def __init__(self, flush_interval: float = 0.25):
+        self.flush_interval = flush_interval
+        self.latest: Dict[str, dict] = {}
+        self.dirty: set = set()
+        self.task: Optional[asyncio.Task] = None
+
+        # Counters
+        self.ticks_received = 0
+        self.ticks_applied = 0
+        self.flushes = 0
+        self.last_flush_at = None
+        self.last_flush_duration_ms = 0.0
+
+    def offer(self, symbol: str, ticker_data: dict):
+        """Record the latest ticker for a symbol (never touches the DB)"""
+        self.ticks_received += 1
+        self.latest[symbol] = ticker_data
+        self.dirty.add(symbol)
+
+    def drain(self) -> list:
+        """Take the latest ticker of every dirty symbol and reset the dirty set"""
+        symbols, self.dirty = self.dirty, set()
+        return [self.latest[symbol] for symbol in symbols]
+
+    async def flush(self, apply: Callable[[dict], Awaitable]):
+        """Apply the latest ticker of every dirty symbol"""
+        batch = self.drain()
+        if not batch:
+            return
+
+        started = time.perf_counter()
+        for ticker_data in batch:
+            try:
+                await apply(ticker_data)
+                self.ticks_applied += 1
+            except Exception as e:
+                logger.error(f"Error applying ticker for {ticker_data.get('symbol')}: {e}")
+
+        self.flushes += 1
+        self.last_flush_at = time.time()
+        self.last_flush_duration_ms = (time.perf_counter() - started) * 1000
+
+    async def run(self, apply: Callable[[dict], Awaitable]):
+        """Flush dirty symbols every `flush_interval` seconds until cancelled"""
+        loop = asyncio.get_running_loop()
+        while True:
+            started = loop.time()
+            await self.flush(apply)
+            elapsed = loop.time() - started
+            await asyncio.sleep(max(0.0, self.flush_interval - elapsed))
+
+    def start(self, apply: Callable[[dict], Awaitable]):
+        """Start the background flush task"""
+        if self.task is None or self.task.done():
+            self.task = asyncio.create_task(self.run(apply))
+        return self.task
+
+    async def stop(self, apply: Optional[Callable[[dict], Awaitable]] = None):
+        """Stop the flush task, optionally applying whatever is still pending"""
+        if self.task:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+            self.task = None
+
+        if apply:
+            await self.flush(apply)
+
+    def stats(self) -> dict:
+        """Counters for monitoring feed vs. DB throughput"""
+        pending = len(self.dirty)
+        return {
+            'flush_interval_ms': int(self.flush_interval * 1000),
+            'ticks_received': self.ticks_received,
+            'ticks_applied': self.ticks_applied,
+            'ticks_conflated': max(self.ticks_received - self.ticks_applied - pending, 0),
+            'pending_symbols': pending,
+            'flushes': self.flushes,
+            'last_flush_at': self.last_flush_at,
+            'last_flush_duration_ms': round(self.last_flush_duration_ms, 3),
+        }
@@ -0,0 +1,206 @@
+# consumers.py
+import json
+import logging
+from urllib.parse import parse_qs
+from asgiref.sync import sync_to_async
+from channels.db import database_sync_to_async
+from channels.generic.websocket import AsyncWebsocketConsumer
+from django.conf import settings
+from .models import Trade, PendingOrder
+from .serializers import ActivePositionSerializer
+from .tick_publisher import ticker_group
+from .position_stream import PositionDeltaEncoder, stream_settings
+
+logger = logging.getLogger(__name__)
+
+
+class TradingConsumer(AsyncWebsocketConsumer):
+    """
+    Per-user trading stream.
+
+    Joins ``user_<id>`` (position P&L updates, margin calls, liquidation
+    warnings, liquidations, order fills) and ``ticker_<symbol>`` for every symbol the user holds or
+    has resting orders on, plus any symbols the client asks for.
+
+    Positions are delta-encoded (see ``PositionDeltaEncoder``): one
+    ``snapshot`` then ``delta`` messages with changed fields only, each with a
+    ``seq``. Reconnect with ``?stream_id=<id>&last_seq=<n>`` to be replayed
+    what was missed instead of receiving a new snapshot.
+
+    Client -> server: ``{"action": "subscribe" | "unsubscribe", "symbols": [...]}``,
+    ``{"action": "snapshot"}`` and ``{"action": "ping"}``.
+    """
+
+    async def connect(self):
+        user = self.scope.get('user')
+        if user is None or not user.is_authenticated:
+            await self.close(code=4401)
+            return
+
+        self.user = user
+        self.user_group = f"user_{user.id}"
+        self.symbols = set()
+        self.max_symbols = getattr(settings, 'TRADING_SETTINGS', {}).get('WS_MAX_SYMBOLS', 50)
+
+        self.stream_settings = stream_settings()
+        self.stream = None
+
+        await self.channel_layer.group_add(self.user_group, self.channel_name)
+        await self.accept()
+
+        replay = await self.resume_stream()
+        snapshot = await self.get_snapshot()
+        await self.join_symbols(snapshot['symbols'])
+
+        if replay is None:
+            self.stream = PositionDeltaEncoder(user.id, buffer_size=self.stream_settings['buffer_size'])
+            await self.push(self.stream.snapshot(snapshot['positions']))
+        else:
+            for message in replay:
+                await self.send_json(message)
+            # Catch up on anything that changed while the client was away
+            await self.push(self.stream.diff(snapshot['positions'], complete=True))
+
+    async def disconnect(self, code):
+        if not hasattr(self, 'user_group'):
+            return
+        if self.stream is not None and self.stream.unsaved():
+            await sync_to_async(self.stream.save)(self.stream_settings['ttl'])
+        await self.channel_layer.group_discard(self.user_group, self.channel_name)
+        for symbol in self.symbols:
+            await self.channel_layer.group_discard(ticker_group(symbol), self.channel_name)
+
+    # ---------------------------
+    # Client messages
+    # ---------------------------
+    async def receive(self, text_data=None, bytes_data=None):
+        try:
+            data = json.loads(text_data or '{}')
+        except json.JSONDecodeError:
+            await self.send_json({'type': 'error', 'message': 'Invalid JSON'})
+            return
+
+        action = data.get('action')
+        if action == 'subscribe':
+            joined = await self.join_symbols(data.get('symbols', []))
+            await self.send_json({'type': 'subscribed', 'symbols': joined})
+        elif action == 'unsubscribe':
+            await self.leave_symbols(data.get('symbols', []))
+            await self.send_json({'type': 'unsubscribed', 'symbols': data.get('symbols', [])})
+        elif action == 'snapshot':
+            snapshot = await self.get_snapshot()
+            await self.join_symbols(snapshot['symbols'])
+            await self.push(self.stream.snapshot(snapshot['positions']))
+        elif action == 'ping':
+            await self.send_json({'type': 'pong'})
+        else:
+            await self.send_json({'type': 'error', 'message': f"Unknown action: {action}"})
+
+    # ---------------------------
+    # Position stream
+    # ---------------------------
+    async def resume_stream(self):
+        """Restore the stream named in the query string; None if a snapshot is needed"""
+        query = parse_qs(self.scope.get('query_string', b'').decode())
+        stream_id = query.get('stream_id', [None])[0]
+        try:
+            last_seq = int(query.get('last_seq', [''])[0])
+        except ValueError:
+            return None
+        if not stream_id:
+            return None
+
+        stream = await sync_to_async(PositionDeltaEncoder.load)(
+            self.user.id, stream_id, buffer_size=self.stream_settings['buffer_size']
+        )
+        if stream is None:
+            return None
+
+        replay = stream.replay(last_seq)
+        if replay is not None:
+            self.stream = stream
+        return replay
+
+    async def push(self, message):
+        """Send a stream message; the stream is persisted for resumes every save interval"""
+        if message is None:
+            return
+        await self.send_json(message)
+        if self.stream.save_due(self.stream_settings['save_interval']):
+            await sync_to_async(self.stream.save)(self.stream_settings['ttl'])
+
+    async def refresh_positions(self):
+        """Diff the full position set after positions were opened or closed"""
+        snapshot = await self.get_snapshot()
+        await self.join_symbols(snapshot['symbols'])
+        await self.push(self.stream.diff(snapshot['positions'], complete=True))
+
+    async def join_symbols(self, symbols) -> list:
+        joined = []
+        for symbol in symbols:
+            if not isinstance(symbol, str) or symbol in self.symbols:
+                continue
+            if len(self.symbols) >= self.max_symbols:
+                break
+            await self.channel_layer.group_add(ticker_group(symbol), self.channel_name)
+            self.symbols.add(symbol)
+            joined.append(symbol)
+        return joined
+
+    async def leave_symbols(self, symbols):
+        for symbol in symbols:
+            if symbol in self.symbols:
+                await self.channel_layer.group_discard(ticker_group(symbol), self.channel_name)
+                self.symbols.discard(symbol)
+
+    @database_sync_to_async
+    def get_snapshot(self) -> dict:
+        positions = Trade.objects.filter(
+            user=self.user,
+            status__in=['OPEN', 'PARTIALLY_CLOSED']
+        ).order_by('-opened_at')
+        order_symbols = PendingOrder.objects.filter(
+            user=self.user, status='PENDING'
+        ).values_list('asset_symbol', flat=True)
+
+        data = [dict(position) for position in ActivePositionSerializer(positions, many=True).data]
+        return {
+            'positions': data,
+            'symbols': sorted({p['asset_symbol'] for p in data} | set(order_symbols)),
+        }
+
+    # ---------------------------
+    # Channel layer events
+    # ---------------------------
+    async def ticker_update(self, event):
+        """Conflated price from the feed ingestor"""
+        await self.forward(event, 'price')
+
+    async def positions_update(self, event):
+        """Price and unrealized P&L of the user's positions after a tick"""
+        await self.push(self.stream.diff(event['positions']))
+
+    async def margin_call(self, event):
+        await self.forward(event, 'margin_call')
+
+    async def liquidation_warning(self, event):
+        await self.forward(event, 'liquidation_warning')
+
+    async def liquidation(self, event):
+        await self.forward(event, 'liquidation')
+        await self.refresh_positions()
+
+    async def order_filled(self, event):
+        await self.forward(event, 'order_filled')
+        # A fill may open a position on a symbol we are not streaming yet
+        await self.refresh_positions()
+
+    async def order_rejected(self, event):
+        await self.forward(event, 'order_rejected')
+
+    async def forward(self, event: dict, message_type: str):
+        payload = {key: value for key, value in event.items() if key != 'type'}
+        await self.send_json({'type': message_type, **payload})
+
+    async def send_json(self, content: dict):
+        await self.send(text_data=json.dumps(content, default=str))
@@ -0,0 +1,87 @@
+# events.py
+import logging
+import threading
+from collections import defaultdict
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+
+class TradeEventBus:
+    """
+    In-process event bus for trade side effects.
+
+    Hot-path mutations publish events here instead of relying on model
+    signals. Inside ``batch()`` events are queued per thread and every
+    handler is called once with the full list of its events when the
+    outermost batch exits; outside a batch each event is dispatched
+    immediately as a batch of one.
+    """
+
+    def __init__(self):
+        self.handlers = defaultdict(list)
+        self._local = threading.local()
+
+        # Counters
+        self.events_published = 0
+        self.dispatches = 0
+
+    def subscribe(self, event_type: str, handler=None):
+        """Register a handler called with a list of event payloads (usable as a decorator)"""
+        if handler is None:
+            return lambda func: self.subscribe(event_type, func)
+
+        self.handlers[event_type].append(handler)
+        return handler
+
+    def publish(self, event_type: str, **payload):
+        """Queue an event in the current batch, or dispatch it right away"""
+        self.events_published += 1
+
+        pending = getattr(self._local, 'pending', None)
+        if pending is None:
+            self.dispatch({event_type: [payload]})
+        else:
+            pending[event_type].append(payload)
+
+    @contextmanager
+    def batch(self):
+        """Collect events and dispatch them once per type when the outermost batch exits"""
+        if getattr(self._local, 'pending', None) is not None:
+            # Nested batch - the outermost one dispatches
+            yield
+            return
+
+        self._local.pending = defaultdict(list)
+        try:
+            yield
+        except Exception:
+            self._local.pending = None
+            raise
+
+        pending, self._local.pending = self._local.pending, None
+        self.dispatch(pending)
+
+    def dispatch(self, events_by_type: dict):
+        """Call every handler once with all queued events of its type"""
+        for event_type, events in events_by_type.items():
+            if not events:
+                continue
+
+            for handler in self.handlers.get(event_type, []):
+                try:
+                    handler(events)
+                except Exception as e:
+                    logger.error(f"Error in {event_type} handler {handler.__name__}: {e}")
+
+            self.dispatches += 1
+
+    def stats(self) -> dict:
+        return {
+            'events_published': self.events_published,
+            'dispatches': self.dispatches,
+            'handlers': {event_type: len(handlers) for event_type, handlers in self.handlers.items()},
+        }
+
+
+trade_events = TradeEventBus()
@@ -0,0 +1,334 @@
+# feed_shards.py
+import json
+import time
+import asyncio
+import bisect
+import hashlib
+import logging
+import websockets
+from typing import Awaitable, Callable, Dict
+
+logger = logging.getLogger(__name__)
+
+
+class ConsistentHashRing:
+    """
+    Maps symbols to shards with consistent hashing.
+
+    Each shard owns ``replicas`` points on the ring, so changing the shard
+    count only moves the symbols that hash next to the added/removed points.
+    """
+
+    def __init__(self, shard_ids: list, replicas: int = 64):
+        self.replicas = replicas
+        self.points = []
+        self.owners = []
+        for shard_id in shard_ids:
+            for replica in range(replicas):
+                point = self.hash(f"{shard_id}:{replica}")
+                index = bisect.bisect(self.points, point)
+                self.points.insert(index, point)
+                self.owners.insert(index, shard_id)
+
+    @staticmethod
+    def hash(key: str) -> int:
+        return int(hashlib.md5(key.encode()).hexdigest()[:16], 16)
+
+    def shard_for(self, symbol: str):
+        index = bisect.bisect(self.points, self.hash(symbol)) % len(self.points)
+        return self.owners[index]
+
+
+class FeedShard:
+    """
+    One exchange websocket carrying a subset of the subscribed symbols.
+
+    A reader task only receives frames and puts them on a bounded queue; a
+    worker task drains the queue into the message handler. When the handler
+    falls behind and the queue is full the oldest frame is dropped - ticks
+    are conflated downstream, so the newest price is the one that matters.
+    Connection state, backoff and resubscription are per shard.
+    """
+
+    def __init__(self, shard_id: int, url: str, handler: Callable[[str], Awaitable],
+                 queue_size: int = 1000, ping_interval: int = 30):
+        self.shard_id = shard_id
+        self.url = url
+        self.handler = handler
+        self.ping_interval = ping_interval
+        self.websocket = None
+        self.symbols: set = set()
+        self.queue: asyncio.Queue = None
+        self.queue_size = queue_size
+        self.tasks = []
+        self.running = False
+        self.reconnect_delay = 5
+        self.max_reconnect_delay = 60
+
+        # Counters
+        self.messages_received = 0
+        self.messages_handled = 0
+        self.messages_dropped = 0
+        self.reconnects = 0
+        self.last_message_at = None
+        self.last_lag_ms = 0.0
+        self.max_lag_ms = 0.0
+        self.message_rate = None
+        self._rate_window_started = time.monotonic()
+        self._rate_window_count = 0
+
+    # ---------------------------
+    # Connection
+    # ---------------------------
+    async def connect(self) -> bool:
+        try:
+            self.websocket = await websockets.connect(
+                self.url,
+                ping_interval=self.ping_interval,
+                ping_timeout=10
+            )
+            logger.info(f"✅ Feed shard {self.shard_id} connected ({len(self.symbols)} symbols)")
+            self.reconnect_delay = 5
+            if self.symbols:
+                await self.send('subscribe', sorted(self.symbols))
+            return True
+        except Exception as e:
+            logger.error(f"❌ Feed shard {self.shard_id} failed to connect: {e}")
+            self.websocket = None
+            return False
+
+    async def send(self, action: str, symbols: list) -> bool:
+        """Send a v2/ticker subscribe or unsubscribe frame"""
+        if not self.websocket:
+            return False
+
+        payload = {
+            "type": action,
+            "payload": {
+                "channels": [
+                    {
+                        "name": "v2/ticker",
+                        "symbols": symbols
+                    }
+                ]
+            }
+        }
+
+        try:
+            await self.websocket.send(json.dumps(payload))
+            return True
+        except Exception as e:
+            logger.error(f"Feed shard {self.shard_id} failed to {action} {symbols}: {e}")
+            return False
+
+    async def subscribe(self, symbols: list) -> bool:
+        """Own the symbols from now on; sent immediately or on the next connect"""
+        self.symbols.update(symbols)
+        return await self.send('subscribe', symbols) if self.websocket else True
+
+    async def unsubscribe(self, symbols: list) -> bool:
+        self.symbols.difference_update(symbols)
+        return await self.send('unsubscribe', symbols) if self.websocket else True
+
+    # ---------------------------
+    # Reader / worker
+    # ---------------------------
+    def enqueue(self, message: str):
+        """Queue a frame, dropping the oldest one when the worker is behind"""
+        self.messages_received += 1
+        self.last_message_at = time.time()
+        self._rate_window_count += 1
+
+        if self.queue.full():
+            self.queue.get_nowait()
+            self.queue.task_done()
+            self.messages_dropped += 1
+        self.queue.put_nowait((time.monotonic(), message))
+
+    async def read(self):
+        """Receive frames with reconnection logic"""
+        while self.running:
+            try:
+                if not self.websocket:
+                    if not await self.connect():
+                        await asyncio.sleep(self.reconnect_delay)
+                        self.reconnect_delay = min(self.reconnect_delay * 2, self.max_reconnect_delay)
+                        continue
+
+                message = await asyncio.wait_for(self.websocket.recv(), timeout=60)
+                self.enqueue(message)
+
+            except asyncio.TimeoutError:
+                logger.warning(f"Feed shard {self.shard_id}: no message in 60 seconds, checking connection...")
+                try:
+                    pong = await self.websocket.ping()
+                    await asyncio.wait_for(pong, timeout=10)
+                except Exception:
+                    logger.error(f"Feed shard {self.shard_id}: ping failed, reconnecting...")
+                    self.websocket = None
+                    self.reconnects += 1
+
+            except websockets.exceptions.ConnectionClosed:
+                logger.warning(f"Feed shard {self.shard_id} closed. Reconnecting...")
+                self.websocket = None
+                self.reconnects += 1
+                await asyncio.sleep(self.reconnect_delay)
+                self.reconnect_delay = min(self.reconnect_delay * 2, self.max_reconnect_delay)
+
+            except asyncio.CancelledError:
+                raise
+
+            except Exception as e:
+                logger.error(f"Error in feed shard {self.shard_id} read loop: {e}")
+                await asyncio.sleep(5)
+
+    async def work(self):
+        """Hand queued frames to the message handler"""
+        while True:
+            received_at, message = await self.queue.get()
+            try:
+                self.last_lag_ms = (time.monotonic() - received_at) * 1000
+                self.max_lag_ms = max(self.max_lag_ms, self.last_lag_ms)
+                await self.handler(message)
+                self.messages_handled += 1
+            except Exception as e:
+                logger.error(f"Error handling message on feed shard {self.shard_id}: {e}")
+            finally:
+                self.queue.task_done()
+
+    def start(self):
+        self.running = True
+        self.queue = asyncio.Queue(maxsize=self.queue_size)
+        self.tasks = [
+            asyncio.create_task(self.read()),
+            asyncio.create_task(self.work()),
+        ]
+        return self.tasks
+
+    async def stop(self):
+        self.running = False
+        for task in self.tasks:
+            task.cancel()
+        for task in self.tasks:
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        self.tasks = []
+
+        if self.websocket:
+            await self.websocket.close()
+            self.websocket = None
+
+    def stats(self) -> dict:
+        now = time.monotonic()
+        window = now - self._rate_window_started
+        if window >= 5:
+            self.message_rate = self._rate_window_count / window
+            self._rate_window_started = now
+            self._rate_window_count = 0
+        # Until the first window closes, report the partial one
+        message_rate = self.message_rate if self.message_rate is not None else (
+            self._rate_window_count / window if window > 0 else 0.0
+        )
+
+        return {
+            'shard_id': self.shard_id,
+            'connected': self.websocket is not None,
+            'symbols': sorted(self.symbols),
+            'queue_depth': self.queue.qsize() if self.queue else 0,
+            'queue_size': self.queue_size,
+            'messages_received': self.messages_received,
+            'messages_handled': self.messages_handled,
+            'messages_dropped': self.messages_dropped,
+            'messages_per_second': round(message_rate, 2),
+            'lag_ms': round(self.last_lag_ms, 3),
+            'max_lag_ms': round(self.max_lag_ms, 3),
+            'reconnects': self.reconnects,
+            'last_message_at': self.last_message_at,
+        }
+
+
+class FeedSupervisor:
+    """
+    Partitions subscribed symbols across ``shard_count`` feed connections.
+
+    Symbols are assigned with a consistent hash ring, so a symbol always
+    lands on the same shard and one slow or disconnected shard only
+    affects its own symbols.
+    """
+
+    def __init__(self, url: str, handler: Callable[[str], Awaitable], shard_count: int = 1,
+                 queue_size: int = 1000, ping_interval: int = 30):
+        self.shards: Dict[int, FeedShard] = {
+            shard_id: FeedShard(shard_id, url, handler, queue_size=queue_size, ping_interval=ping_interval)
+            for shard_id in range(max(shard_count, 1))
+        }
+        self.ring = ConsistentHashRing(list(self.shards))
+        self.running = False
+
+    def set_url(self, url: str):
+        """Point every shard at another exchange endpoint (applies on the next connect)"""
+        for shard in self.shards.values():
+            shard.url = url
+
+    def shard_for(self, symbol: str) -> FeedShard:
+        return self.shards[self.ring.shard_for(symbol)]
+
+    def partition(self, symbols: list) -> Dict[int, list]:
+        partitions = {}
+        for symbol in symbols:
+            partitions.setdefault(self.ring.shard_for(symbol), []).append(symbol)
+        return partitions
+
+    @property
+    def subscribed_symbols(self) -> set:
+        symbols = set()
+        for shard in self.shards.values():
+            symbols |= shard.symbols
+        return symbols
+
+    @property
+    def connected(self) -> bool:
+        return any(shard.websocket is not None for shard in self.shards.values())
+
+    async def subscribe(self, symbols: list) -> bool:
+        results = [
+            await self.shards[shard_id].subscribe(shard_symbols)
+            for shard_id, shard_symbols in self.partition(symbols).items()
+        ]
+        return all(results)
+
+    async def unsubscribe(self, symbols: list) -> bool:
+        results = [
+            await self.shards[shard_id].unsubscribe(shard_symbols)
+            for shard_id, shard_symbols in self.partition(symbols).items()
+        ]
+        return all(results)
+
+    def start(self):
+        self.running = True
+        for shard in self.shards.values():
+            shard.start()
+        logger.info(f"🔀 Feed supervisor started with {len(self.shards)} shards")
+
+    async def wait(self):
+        """Block until every shard has stopped"""
+        tasks = [task for shard in self.shards.values() for task in shard.tasks]
+        if tasks:
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def stop(self):
+        self.running = False
+        for shard in self.shards.values():
+            await shard.stop()
+
+    def stats(self) -> dict:
+        shards = [shard.stats() for shard in self.shards.values()]
+        return {
+            'shard_count': len(shards),
+            'connected_shards': sum(1 for shard in shards if shard['connected']),
+            'messages_per_second': round(sum(shard['messages_per_second'] for shard in shards), 2),
+            'max_lag_ms': max((shard['lag_ms'] for shard in shards), default=0),
+            'shards': shards,
+        }
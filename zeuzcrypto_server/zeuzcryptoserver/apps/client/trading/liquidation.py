@@ -0,0 +1,307 @@
+# liquidation.py
+import bisect
+import logging
+import threading
+from decimal import Decimal
+from django.conf import settings
+from django.db import transaction
+from .models import Trade
+from .position_index import position_index, OPEN_STATUSES, LEVEL_FIELDS
+
+logger = logging.getLogger(__name__)
+
+MARGIN_CALL_RATIO = Decimal('0.2')  # Margin call at 20% of initial margin
+
+
+class TriggerLevels:
+    """
+    Trigger prices of one symbol side, kept sorted for bisect lookups.
+
+    Longs trigger when the mark falls to or below their level, shorts when
+    it rises to or above it, so a tick only walks the crossed tail (or head)
+    of the list instead of every position.
+    """
+
+    def __init__(self, triggers_below: bool):
+        self.triggers_below = triggers_below
+        self.prices = []
+        self.trade_ids = []
+
+    def __len__(self):
+        return len(self.prices)
+
+    def insert(self, price: Decimal, trade_id):
+        index = bisect.bisect_right(self.prices, price)
+        self.prices.insert(index, price)
+        self.trade_ids.insert(index, trade_id)
+
+    def remove(self, price: Decimal, trade_id) -> bool:
+        index = bisect.bisect_left(self.prices, price)
+        while index < len(self.prices) and self.prices[index] == price:
+            if self.trade_ids[index] == trade_id:
+                del self.prices[index]
+                del self.trade_ids[index]
+                return True
+            index += 1
+        return False
+
+    def pop_crossed(self, mark_price: Decimal) -> list:
+        """Remove and return the ids whose level the mark price has crossed"""
+        if self.triggers_below:
+            index = bisect.bisect_left(self.prices, mark_price)
+            crossed = self.trade_ids[index:]
+            del self.prices[index:]
+            del self.trade_ids[index:]
+        else:
+            index = bisect.bisect_right(self.prices, mark_price)
+            crossed = self.trade_ids[:index]
+            del self.prices[:index]
+            del self.trade_ids[:index]
+        return crossed
+
+
+class LiquidationEngine:
+    """
+    Price-driven margin calls and liquidations for futures positions.
+
+    For every position the exact mark prices at which ``remaining_margin``
+    reaches the margin-call threshold and zero are precomputed and kept in
+    per-symbol sorted levels (long and short separately). A tick bisects
+    those levels and touches only the positions whose trigger was crossed.
+
+    Only positions whose level fields (size, price, margin) changed are
+    re-levelled: the ids ``position_index`` reports for the symbol, or,
+    without an index, the rows passed to ``check`` whose fields differ from
+    the ones their levels were computed from. A fired margin call is not repeated until
+    the position's levels change (size, price or margin); neither is a
+    liquidation warning while ``AUTO_LIQUIDATE`` is off. A liquidation that
+    fails puts the position's levels back so the next tick retries it.
+    """
+
+    def __init__(self):
+        self.books = {}  # symbol -> {(side, kind): TriggerLevels}
+        self.levels = {}  # trade_id -> (symbol, {(side, kind): price})
+        self.level_keys = {}  # symbol -> {trade_id: level fields its levels were computed from}
+        self.fired_calls = {}  # trade_id -> margin call level already notified
+        self.warned_liquidations = {}  # trade_id -> liquidation level already warned about (auto-liquidation off)
+        self.lock = threading.RLock()  # feed shards check their symbols from separate threads
+
+        # Counters
+        self.margin_calls = 0
+        self.liquidations = 0
+
+    @staticmethod
+    def compute_levels(position: dict) -> dict:
+        """Mark prices at which the position hits the margin call threshold and zero margin"""
+        margin_used = position['futures_details__margin_used']
+        margin_required = position['futures_details__margin_required']
+        quantity = position['remaining_quantity']
+        if margin_used is None or margin_required is None or not quantity or quantity <= 0:
+            return {}
+
+        average_price = position['average_price']
+        threshold = margin_required * MARGIN_CALL_RATIO
+
+        if position['direction'] == 'BUY':
+            # margin_used + (mark - avg) * qty <= level
+            return {
+                'margin_call': average_price + (max(threshold, Decimal('0')) - margin_used) / quantity,
+                'liquidation': average_price - margin_used / quantity,
+            }
+        # margin_used + (avg - mark) * qty <= level
+        return {
+            'margin_call': average_price + (margin_used - max(threshold, Decimal('0'))) / quantity,
+            'liquidation': average_price + margin_used / quantity,
+        }
+
+    def book(self, symbol: str) -> dict:
+        if symbol not in self.books:
+            self.books[symbol] = {
+                ('BUY', 'margin_call'): TriggerLevels(triggers_below=True),
+                ('BUY', 'liquidation'): TriggerLevels(triggers_below=True),
+                ('SELL', 'margin_call'): TriggerLevels(triggers_below=False),
+                ('SELL', 'liquidation'): TriggerLevels(triggers_below=False),
+            }
+        return self.books[symbol]
+
+    def add(self, position: dict):
+        """Insert the trigger levels of one position"""
+        if position['trade_type'] != 'FUTURES':
+            return
+
+        levels = self.compute_levels(position)
+        if not levels:
+            return
+
+        trade_id = position['id']
+        symbol = position['asset_symbol']
+        book = self.book(symbol)
+        placed = {}
+
+        if self.fired_calls.get(trade_id) != levels['margin_call']:
+            self.fired_calls.pop(trade_id, None)
+            book[(position['direction'], 'margin_call')].insert(levels['margin_call'], trade_id)
+            placed[(position['direction'], 'margin_call')] = levels['margin_call']
+
+        if self.warned_liquidations.get(trade_id) != levels['liquidation']:
+            self.warned_liquidations.pop(trade_id, None)
+            book[(position['direction'], 'liquidation')].insert(levels['liquidation'], trade_id)
+            placed[(position['direction'], 'liquidation')] = levels['liquidation']
+        self.levels[trade_id] = (symbol, placed)
+
+    def rearm(self, trade_id):
+        """Put back the levels of a still-open position (one query)"""
+        positions = position_index.load(id=trade_id)
+        with self.lock:
+            self.remove(trade_id)
+            for position in positions:
+                self.add(position)
+
+    def remove(self, trade_id):
+        """Drop every level of a position"""
+        entry = self.levels.pop(trade_id, None)
+        if entry is None:
+            return
+        symbol, placed = entry
+        book = self.book(symbol)
+        for key, price in placed.items():
+            book[key].remove(price, trade_id)
+
+    @staticmethod
+    def level_key(position: dict) -> tuple:
+        return tuple(position[field] for field in LEVEL_FIELDS)
+
+    def relevel(self, symbol: str, trade_id, position: dict = None):
+        """Replace the levels of one position (drop them when ``position`` is None)"""
+        self.remove(trade_id)
+        self.level_keys.get(symbol, {}).pop(trade_id, None)
+        if position is None:
+            self.fired_calls.pop(trade_id, None)
+            self.warned_liquidations.pop(trade_id, None)
+            return
+        self.level_keys.setdefault(position['asset_symbol'], {})[trade_id] = self.level_key(position)
+        self.add(position)
+
+    def sync(self, symbol: str, positions: list = None):
+        """Re-level the positions of a symbol that were added, removed or changed"""
+        with self.lock:
+            if position_index.warmed:
+                for trade_id in position_index.take_changes(symbol):
+                    self.relevel(symbol, trade_id, position_index.get_record(trade_id))
+            elif positions is not None:
+                # No index in this process - diff the rows just loaded against the levels
+                keys = self.level_keys.get(symbol, {})
+                current = {position['id']: position for position in positions}
+                for trade_id in [trade_id for trade_id in keys if trade_id not in current]:
+                    self.relevel(symbol, trade_id)
+                for trade_id, position in current.items():
+                    if keys.get(trade_id) != self.level_key(position):
+                        self.relevel(symbol, trade_id, position)
+
+    def check(self, symbol: str, mark_price: Decimal, positions: list = None) -> dict:
+        """Positions of a symbol whose margin call or liquidation level was crossed"""
+        with self.lock:
+            return self._check(symbol, mark_price, positions)
+
+    def _check(self, symbol: str, mark_price: Decimal, positions: list = None) -> dict:
+        self.sync(symbol, positions)
+        book = self.books.get(symbol)
+        if not book:
+            return {'margin_calls': [], 'liquidations': []}
+
+        if positions is not None:
+            get_position = {position['id']: position for position in positions}.get
+        else:
+            get_position = position_index.get_record
+
+        margin_calls = []
+        for side in ('BUY', 'SELL'):
+            for trade_id in book[(side, 'margin_call')].pop_crossed(mark_price):
+                _, placed = self.levels.get(trade_id, (symbol, {}))
+                self.fired_calls[trade_id] = placed.pop((side, 'margin_call'), None)
+
+                position = get_position(trade_id)
+                if position is None:
+                    continue
+
+                pnl = self.position_pnl(position, mark_price)
+                margin_calls.append({
+                    'trade_id': trade_id,
+                    'user_id': position['user_id'],
+                    'remaining_margin': position['futures_details__margin_used'] + pnl,
+                    'margin_threshold': position['futures_details__margin_required'] * MARGIN_CALL_RATIO,
+                    'pnl': pnl,
+                })
+
+        liquidations = []
+        auto_liquidate = auto_liquidate_enabled()
+        for side in ('BUY', 'SELL'):
+            for trade_id in book[(side, 'liquidation')].pop_crossed(mark_price):
+                _, placed = self.levels.get(trade_id, (symbol, {}))
+                level = placed.pop((side, 'liquidation'), None)
+                self.remove(trade_id)
+                position = get_position(trade_id)
+                if position is None:
+                    continue
+                if not auto_liquidate:
+                    # Nothing will close it: warn once per level and keep its margin call armed
+                    self.warned_liquidations[trade_id] = level
+                    self.add(position)
+                liquidations.append(position)
+
+        self.margin_calls += len(margin_calls)
+        return {'margin_calls': margin_calls, 'liquidations': liquidations}
+
+    @staticmethod
+    def position_pnl(position: dict, mark_price: Decimal) -> Decimal:
+        if position['direction'] == 'BUY':
+            return (mark_price - position['average_price']) * position['remaining_quantity']
+        return (position['average_price'] - mark_price) * position['remaining_quantity']
+
+    def liquidate(self, trade_id, mark_price: Decimal):
+        """Close a position whose margin is exhausted at the current mark price"""
+        from .views import CloseTradeView
+
+        try:
+            with transaction.atomic():
+                trade = Trade.objects.select_for_update().filter(
+                    pk=trade_id, status__in=OPEN_STATUSES
+                ).first()
+                if trade is None:
+                    return None
+
+                result = CloseTradeView()._close_trade(trade, {
+                    'price': mark_price,
+                    'order_type': 'MARKET',
+                })
+
+            self.liquidations += 1
+            logger.critical(
+                f"🚨 LIQUIDATED - Trade {trade_id} closed at {mark_price}. "
+                f"Symbol: {trade.asset_symbol}, Realized P&L: {result.get('realized_pnl')}"
+            )
+            return result
+
+        except Exception as e:
+            logger.error(f"Error liquidating trade {trade_id}: {e}", exc_info=True)
+            try:
+                self.rearm(trade_id)
+            except Exception as rearm_error:
+                logger.error(f"Error re-arming trade {trade_id} after failed liquidation: {rearm_error}")
+            return None
+
+    def stats(self) -> dict:
+        return {
+            'symbols': len(self.books),
+            'positions': len(self.levels),
+            'margin_calls': self.margin_calls,
+            'liquidations': self.liquidations,
+            'auto_liquidate': auto_liquidate_enabled(),
+        }
+
+
+def auto_liquidate_enabled() -> bool:
+    return getattr(settings, 'TRADING_SETTINGS', {}).get('AUTO_LIQUIDATE', True)
+
+
+liquidation_engine = LiquidationEngine()
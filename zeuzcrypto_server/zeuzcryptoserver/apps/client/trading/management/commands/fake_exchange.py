@@ -0,0 +1,111 @@
+# fake_exchange.py
+import json
+import random
+import asyncio
+import websockets
+from decimal import Decimal
+from django.core.management.base import BaseCommand
+
+
+class FakeExchange:
+    """
+    Local stand-in for the Delta Exchange socket.
+
+    Accepts v2/ticker subscribe/unsubscribe frames and streams random-walk
+    ticker frames in the same shape as the real feed to every client, for
+    the symbols that client subscribed to.
+    """
+
+    def __init__(self, interval: float, start_price: Decimal, volatility: float):
+        self.interval = interval
+        self.start_price = start_price
+        self.volatility = volatility
+        self.prices = {}
+
+    def next_price(self, symbol: str) -> Decimal:
+        price = self.prices.get(symbol, self.start_price)
+        move = Decimal(str(random.gauss(0, self.volatility)))
+        price = max(price * (1 + move), Decimal('0.01')).quantize(Decimal('0.01'))
+        self.prices[symbol] = price
+        return price
+
+    def ticker_frame(self, symbol: str) -> dict:
+        price = self.next_price(symbol)
+        spread = (price * Decimal('0.0005')).quantize(Decimal('0.01'))
+        return {
+            'type': 'v2/ticker',
+            'symbol': symbol,
+            'mark_price': str(price),
+            'close': str(price),
+            'high': str(price + spread),
+            'low': str(price - spread),
+            'open': str(self.start_price),
+            'volume': random.randint(1, 1000),
+            'turnover': float(price) * random.randint(1, 1000),
+            'funding_rate': '0.0001',
+            'oi_contracts': str(random.randint(1000, 100000)),
+            'spot_price': str(price),
+            'product_trading_status': 'operational',
+            'time': asyncio.get_running_loop().time(),
+            'quotes': {'best_bid': str(price - spread), 'best_ask': str(price + spread)},
+        }
+
+    async def handle(self, websocket):
+        symbols = set()
+
+        async def stream():
+            while True:
+                for symbol in list(symbols):
+                    await websocket.send(json.dumps(self.ticker_frame(symbol)))
+                await asyncio.sleep(self.interval)
+
+        streamer = asyncio.create_task(stream())
+        try:
+            async for message in websocket:
+                data = json.loads(message)
+                channels = data.get('payload', {}).get('channels', [])
+                requested = {symbol for channel in channels for symbol in channel.get('symbols', [])}
+
+                if data.get('type') == 'subscribe':
+                    symbols |= requested
+                elif data.get('type') == 'unsubscribe':
+                    symbols -= requested
+                else:
+                    await websocket.send(json.dumps({'type': 'error', 'message': f"Unknown type {data.get('type')}"}))
+                    continue
+
+                await websocket.send(json.dumps({
+                    'type': 'subscriptions',
+                    'channels': [{'name': 'v2/ticker', 'symbols': sorted(symbols)}],
+                }))
+        except websockets.exceptions.ConnectionClosed:
+            pass
+        finally:
+            streamer.cancel()
+
+
+class Command(BaseCommand):
+    help = "Run a local fake exchange websocket that streams random-walk v2/ticker frames"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--host', default='127.0.0.1')
+        parser.add_argument('--port', type=int, default=8765)
+        parser.add_argument('--interval', type=float, default=0.5, help='Seconds between ticks per symbol')
+        parser.add_argument('--start-price', default='100', help='Initial price of every symbol')
+        parser.add_argument('--volatility', type=float, default=0.002, help='Std-dev of each relative price move')
+
+    def handle(self, *args, **options):
+        exchange = FakeExchange(
+            interval=options['interval'],
+            start_price=Decimal(options['start_price']),
+            volatility=options['volatility'],
+        )
+        self.stdout.write(f"Fake exchange listening on ws://{options['host']}:{options['port']}")
+        try:
+            asyncio.run(self.serve(exchange, options['host'], options['port']))
+        except KeyboardInterrupt:
+            pass
+
+    async def serve(self, exchange: FakeExchange, host: str, port: int):
+        async with websockets.serve(exchange.handle, host, port):
+            await asyncio.Future()
@@ -0,0 +1,59 @@
+# rebuild_portfolios.py
+from django.core.management.base import BaseCommand, CommandError
+from apps.client.trading.models import Trade, Portfolio
+from apps.client.trading.portfolio_aggregates import PortfolioAggregator
+
+
+class Command(BaseCommand):
+    help = "Recompute Portfolio aggregates from trades and report drift from the incremental values"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', help='Only check the portfolio of this user id')
+        parser.add_argument(
+            '--verify',
+            action='store_true',
+            help='Report drift without writing; exits with an error if any portfolio drifted',
+        )
+
+    def handle(self, *args, **options):
+        user_ids = set(Portfolio.objects.values_list('user_id', flat=True))
+        user_ids |= set(Trade.objects.values_list('user_id', flat=True).distinct())
+        if options['user']:
+            user_ids = {user_id for user_id in user_ids if str(user_id) == options['user']}
+
+        existing = {p.user_id: p for p in Portfolio.objects.filter(user_id__in=user_ids)}
+        checked = drifted = created = 0
+
+        for user_id in sorted(user_ids):
+            portfolio = existing.get(user_id)
+            checked += 1
+
+            if portfolio is None:
+                drifted += 1
+                self.stdout.write(f"User {user_id}: portfolio missing")
+                if not options['verify']:
+                    PortfolioAggregator.rebuild(user_id)
+                    created += 1
+                continue
+
+            drift = PortfolioAggregator.verify(portfolio)
+            if not drift:
+                continue
+
+            drifted += 1
+            details = ', '.join(
+                f"{field} stored={values['stored']} expected={values['expected']}"
+                for field, values in drift.items()
+            )
+            self.stdout.write(f"User {user_id}: {details}")
+
+            if not options['verify']:
+                portfolio.update_portfolio_metrics()
+
+        summary = f"Checked {checked} portfolios, {drifted} drifted"
+        if options['verify']:
+            if drifted:
+                raise CommandError(summary)
+            self.stdout.write(self.style.SUCCESS(summary))
+        else:
+            self.stdout.write(self.style.SUCCESS(f"{summary}, rebuilt {drifted - created} and created {created}"))
@@ -0,0 +1,52 @@
+# run_feed_ingestor.py
+import signal
+import asyncio
+from django.core.management.base import BaseCommand
+from apps.client.trading.websocket_manager import ws_manager
+
+
+class Command(BaseCommand):
+    help = (
+        "Run the exchange feed ingestor: one long-lived process that owns the exchange "
+        "websockets, marks positions and publishes ticks to per-symbol channel layer groups"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', help='Exchange websocket URL (e.g. ws://127.0.0.1:8765 for fake_exchange)')
+        parser.add_argument('--shards', type=int, help='Override FEED_SHARD_COUNT')
+
+    def handle(self, *args, **options):
+        if options['shards']:
+            from apps.client.trading.feed_shards import FeedSupervisor
+            ws_manager.feed = FeedSupervisor(
+                ws_manager.ws_url,
+                ws_manager.handle_message,
+                shard_count=options['shards'],
+                queue_size=ws_manager.feed.shards[0].queue_size,
+                ping_interval=ws_manager.ping_interval,
+            )
+        if options['url']:
+            ws_manager.ws_url = options['url']
+            ws_manager.feed.set_url(options['url'])
+
+        self.stdout.write(
+            f"Feed ingestor connecting to {ws_manager.ws_url} "
+            f"with {len(ws_manager.feed.shards)} shards"
+        )
+        asyncio.run(self.run())
+        self.stdout.write(self.style.SUCCESS("Feed ingestor stopped"))
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        stopping = asyncio.Event()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(sig, stopping.set)
+
+        runner = asyncio.create_task(ws_manager.start())
+        waiter = asyncio.create_task(stopping.wait())
+        await asyncio.wait([runner, waiter], return_when=asyncio.FIRST_COMPLETED)
+
+        await ws_manager.stop()
+        for task in (runner, waiter):
+            task.cancel()
+        await asyncio.gather(runner, waiter, return_exceptions=True)
@@ -0,0 +1,237 @@
+# mark_to_market.py
+import time
+import logging
+from decimal import Decimal
+from django.db import connection, transaction
+from django.utils import timezone
+from .models import Trade, FuturesDetails
+from .events import trade_events
+from .position_index import position_index, OPEN_STATUSES, MARKED_TRADE_TYPES, POSITION_FIELDS
+from .liquidation import liquidation_engine
+
+logger = logging.getLogger(__name__)
+
+# Position fields stored on the trade row; the margin fields come from FuturesDetails
+TRADE_FIELDS = [field for field in POSITION_FIELDS if '__' not in field]
+MARGIN_FIELDS = ['futures_details__margin_used', 'futures_details__margin_required']
+
+
+def _converter(field):
+    """Turn a raw cursor value of ``field`` into what the ORM would return"""
+    col = field.cached_col
+    converters = connection.ops.get_db_converters(col) + col.get_db_converters(connection)
+
+    def convert(value):
+        for converter in converters:
+            value = converter(value, col, connection)
+        return value
+    return convert
+
+
+def mark_trades(trades, mark_price: Decimal, marked_at, pnl_types=None, touch: bool = False):
+    """
+    Write ``mark_price`` and the P&L it implies to the rows of ``trades``.
+
+    The P&L is a CASE expression in the UPDATE (linear, by direction) for
+    the trade types in ``pnl_types`` (all when None); other rows keep
+    theirs. ``touch`` also sets ``updated_at``. Returns ``(records,
+    previous_pnl)``: the written rows as position records
+    (``POSITION_FIELDS``) and ``{trade_id: unrealized_pnl before the write}``,
+    so callers diff against exactly what the UPDATE replaced.
+
+    On PostgreSQL this is one statement: a CTE locks the rows and captures
+    their previous P&L and margins, and the UPDATE joined to it returns both.
+    Other backends (RETURNING cannot reach joined tables there) read the rows
+    in the same transaction first. Call inside a transaction.
+    """
+    opts = Trade._meta
+    qn = connection.ops.quote_name
+    table = qn(opts.db_table)
+
+    def column(name):
+        return f"{table}.{qn(opts.get_field(name).column)}"
+
+    price = connection.ops.adapt_decimalfield_value(mark_price, 20, 8)
+    long_pnl = f"(%s - {column('average_price')}) * {column('remaining_quantity')}"
+    short_pnl = f"({column('average_price')} - %s) * {column('remaining_quantity')}"
+    if pnl_types is None:
+        pnl = f"CASE WHEN {column('direction')} = 'BUY' THEN {long_pnl} ELSE {short_pnl} END"
+        params = [price, price]
+    else:
+        marked_type = f"{column('trade_type')} IN ({', '.join(['%s'] * len(pnl_types))})"
+        pnl = (
+            f"CASE WHEN {marked_type} AND {column('direction')} = 'BUY' THEN {long_pnl} "
+            f"WHEN {marked_type} THEN {short_pnl} ELSE {column('unrealized_pnl')} END"
+        )
+        params = [*pnl_types, price, *pnl_types, price]
+
+    marked_at = connection.ops.adapt_datetimefield_value(marked_at)
+    assignments = [
+        f"{qn(opts.get_field('unrealized_pnl').column)} = {pnl}",
+        f"{qn(opts.get_field('current_price').column)} = %s",
+        f"{qn(opts.get_field('last_price_update').column)} = %s",
+    ]
+    params += [price, marked_at]
+    if touch:
+        assignments.append(f"{qn(opts.get_field('updated_at').column)} = %s")
+        params.append(marked_at)
+
+    current = trades.values_list('id', 'unrealized_pnl', *MARGIN_FIELDS)
+    returning = ', '.join(column(field) for field in TRADE_FIELDS)
+    if connection.vendor == 'postgresql':
+        locked_sql, locked_params = current.select_for_update(of=('self',)).query.sql_with_params()
+        sql = (
+            f"WITH marked (id, previous_pnl, margin_used, margin_required) AS ({locked_sql}) "
+            f"UPDATE {table} SET {', '.join(assignments)} FROM marked WHERE {column('id')} = marked.id "
+            f"RETURNING {returning}, marked.previous_pnl, marked.margin_used, marked.margin_required"
+        )
+        params = [*locked_params, *params]
+        extras = None
+    else:
+        extras = {row[0]: row[1:] for row in current}
+        if not extras:
+            return [], {}
+        ids = [opts.pk.get_db_prep_value(trade_id, connection) for trade_id in extras]
+        sql = (
+            f"UPDATE {table} SET {', '.join(assignments)} "
+            f"WHERE {column('id')} IN ({', '.join(['%s'] * len(ids))}) RETURNING {returning}"
+        )
+        params += ids
+
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        rows = cursor.fetchall()
+
+    fields = [opts.get_field(field) for field in TRADE_FIELDS]
+    extra_fields = [opts.get_field('unrealized_pnl')] + [
+        FuturesDetails._meta.get_field(field.split('__')[1]) for field in MARGIN_FIELDS
+    ]
+    converters = [_converter(field) for field in fields + extra_fields]
+
+    records = []
+    previous_pnl = {}
+    for row in rows:
+        values = [convert(value) for convert, value in zip(converters, row)]
+        record = dict(zip(TRADE_FIELDS, values))
+        previous, *margins = values[len(TRADE_FIELDS):] if extras is None else extras[record['id']]
+        record.update(zip(MARGIN_FIELDS, margins))
+        previous_pnl[record['id']] = previous
+        records.append(record)
+    return records, previous_pnl
+
+
+class MarkToMarketEngine:
+    """
+    Marks every open FUTURES/OPTIONS position of a symbol in one pass per tick.
+
+    The tick is one ``mark_trades`` statement: the UPDATE computes the P&L
+    with a CASE expression and returns each row with its previous P&L, so
+    portfolio deltas are exact even when another process closed or resized
+    a trade, and nothing is re-read. The returned rows replace the symbol's
+    entries in the in-process ``position_index``; margin triggers are looked
+    up in the ``liquidation_engine`` levels, which are recomputed only for
+    positions whose size, price or margin changed. No model signals are
+    fired on the hot path; instead a single ``positions_marked`` summary is
+    emitted per tick.
+    """
+
+    @staticmethod
+    def compute_pnl(direction: str, average_price: Decimal, quantity: Decimal, mark_price: Decimal) -> Decimal:
+        """Unrealized P&L of a linear (futures) position"""
+        if direction == 'BUY':
+            return (mark_price - average_price) * quantity
+        return (average_price - mark_price) * quantity
+
+    def compute(self, positions: list, previous_pnl: dict) -> dict:
+        """Totals and per-user deltas of the P&L just written, against what it replaced"""
+        total_unrealized = Decimal('0')
+        pnl_by_trade = {}
+        user_deltas = {}
+        futures_count = 0
+
+        for position in positions:
+            if position['trade_type'] != 'FUTURES':
+                continue
+
+            futures_count += 1
+            pnl = position['unrealized_pnl'] or Decimal('0')
+            total_unrealized += pnl
+            pnl_by_trade[position['id']] = pnl
+
+            delta = pnl - (previous_pnl.get(position['id']) or Decimal('0'))
+            if delta:
+                user_id = position['user_id']
+                user_deltas[user_id] = user_deltas.get(user_id, Decimal('0')) + delta
+
+        return {
+            'futures_count': futures_count,
+            'options_count': len(positions) - futures_count,
+            'total_unrealized_pnl': total_unrealized,
+            'user_deltas': user_deltas,
+            'pnl_by_trade': pnl_by_trade,
+        }
+
+    def write(self, symbol: str, mark_price: Decimal, marked_at):
+        """Persist the tick for every open position of the symbol; ``(records, previous_pnl)``"""
+        trades = Trade.objects.filter(
+            asset_symbol=symbol,
+            status__in=OPEN_STATUSES,
+            trade_type__in=MARKED_TRADE_TYPES,
+        )
+        return mark_trades(trades, mark_price, marked_at, pnl_types=['FUTURES'])
+
+    def mark_symbol(self, symbol: str, mark_price: Decimal, comparison: dict = None) -> dict:
+        """Mark all open positions of a symbol and emit one summary event"""
+        from .signals import positions_marked
+
+        started = time.perf_counter()
+        marked_at = timezone.now()
+
+        position_index.ensure_fresh()
+        if position_index.warmed and not position_index.has_positions(symbol):
+            positions = []
+        else:
+            with transaction.atomic():
+                positions, previous_pnl = self.write(symbol, mark_price, marked_at)
+                # Before commit, so a close committed after this tick refreshes the index after it
+                position_index.replace_symbol(symbol, positions)
+        if not positions:
+            return {
+                'symbol': symbol,
+                'mark_price': mark_price,
+                'positions_marked': 0,
+                'margin_calls': [],
+                'liquidations': [],
+            }
+
+        result = self.compute(positions, previous_pnl)
+        updated = len(positions)
+
+        # The bulk UPDATE bypasses post_save, so portfolio handlers are notified here
+        trade_events.publish('unrealized_changed', symbol=symbol, user_deltas=result['user_deltas'])
+
+        # Only positions whose trigger level was crossed are looked at
+        result.update(liquidation_engine.check(symbol, mark_price, None if position_index.warmed else positions))
+
+        summary = {
+            'symbol': symbol,
+            'mark_price': mark_price,
+            'direction': (comparison or {}).get('direction', 'NEUTRAL'),
+            'positions_marked': updated,
+            'marked_at': marked_at,
+            'duration_ms': (time.perf_counter() - started) * 1000,
+            **result,
+        }
+
+        logger.debug(
+            f"Marked {updated} positions for {symbol} @ {mark_price} "
+            f"(futures: {result['futures_count']}, options: {result['options_count']}, "
+            f"margin calls: {len(result['margin_calls'])}, liquidations: {len(result['liquidations'])}, "
+            f"{summary['duration_ms']:.1f} ms)"
+        )
+
+        positions_marked.send(sender=self.__class__, summary=summary)
+        return summary
+
+
+mark_to_market_engine = MarkToMarketEngine()
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.7 on 2026-10-18 11:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('trading', '0002_pricehistory'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='trade',
+            name='last_price_update',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.7 on 2026-10-18 11:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('trading', '0003_trade_last_price_update'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PriceBar',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('symbol', models.CharField(max_length=20)),
+                ('interval', models.CharField(choices=[('1m', '1 Minute'), ('5m', '5 Minutes'), ('1h', '1 Hour')], max_length=3)),
+                ('bucket_start', models.DateTimeField()),
+                ('open', models.DecimalField(decimal_places=8, max_digits=15)),
+                ('high', models.DecimalField(decimal_places=8, max_digits=15)),
+                ('low', models.DecimalField(decimal_places=8, max_digits=15)),
+                ('close', models.DecimalField(decimal_places=8, max_digits=15)),
+                ('volume', models.FloatField(default=0)),
+                ('tick_count', models.IntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'db_table': 'price_bars',
+                'unique_together': {('symbol', 'interval', 'bucket_start')},
+            },
+        ),
+    ]
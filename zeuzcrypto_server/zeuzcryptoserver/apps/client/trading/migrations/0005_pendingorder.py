@@ -0,0 +1,44 @@
+# Generated by Django 5.2.7 on 2026-10-18 11:48
+
+import django.db.models.deletion
+import uuid
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('trading', '0004_pricebar'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PendingOrder',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('asset_symbol', models.CharField(max_length=20)),
+                ('trade_type', models.CharField(choices=[('SPOT', 'Spot'), ('FUTURES', 'Futures'), ('OPTIONS', 'Options'), ('CFD', 'Contract for Difference')], max_length=10)),
+                ('direction', models.CharField(choices=[('BUY', 'Buy'), ('SELL', 'Sell')], max_length=4)),
+                ('order_type', models.CharField(choices=[('LIMIT', 'Limit'), ('STOP', 'Stop Loss'), ('STOP_LIMIT', 'Stop Limit')], max_length=15)),
+                ('status', models.CharField(choices=[('PENDING', 'Pending'), ('FILLED', 'Filled'), ('CANCELLED', 'Cancelled'), ('REJECTED', 'Rejected')], default='PENDING', max_length=10)),
+                ('quantity', models.DecimalField(decimal_places=8, max_digits=20)),
+                ('limit_price', models.DecimalField(blank=True, decimal_places=8, max_digits=20, null=True)),
+                ('stop_price', models.DecimalField(blank=True, decimal_places=8, max_digits=20, null=True)),
+                ('triggered_at', models.DateTimeField(blank=True, null=True)),
+                ('order_data', models.JSONField(default=dict)),
+                ('fill_price', models.DecimalField(blank=True, decimal_places=8, max_digits=20, null=True)),
+                ('failure_reason', models.TextField(blank=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('filled_at', models.DateTimeField(blank=True, null=True)),
+                ('trade', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='pending_orders', to='trading.trade')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='pending_orders', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'db_table': 'pending_orders',
+                'indexes': [models.Index(fields=['asset_symbol', 'status'], name='pending_ord_asset_s_549a3c_idx'), models.Index(fields=['user', 'status'], name='pending_ord_user_id_538cec_idx'), models.Index(fields=['status', 'updated_at'], name='pending_ord_status_f172ef_idx')],
+            },
+        ),
+    ]
@@ -1,6 +1,7 @@
 import uuid
 from decimal import Decimal
 from django.db import models
+from django.db.models import Q, Sum, Count
 from django.utils import timezone
 from django.core.validators import MinValueValidator
 from django.core.exceptions import ValidationError
@@ -60,6 +61,7 @@ class Trade(models.Model):
     
     # Add current_price field (referenced in calculate_unrealized_pnl method)
     current_price = models.DecimalField(max_digits=20, decimal_places=8, null=True, blank=True)
+    last_price_update = models.DateTimeField(null=True, blank=True)  # Last mark-to-market tick
 
     # Timestamps
     opened_at = models.DateTimeField(auto_now_add=True)
@@ -163,6 +165,42 @@ class PriceHistory(models.Model):
     class Meta:
         db_table = 'price_history'
 
+
+class PriceBar(models.Model):
+    """Time-bucketed OHLCV bars rolled up from the live feed"""
+    INTERVALS = [
+        ('1m', '1 Minute'),
+        ('5m', '5 Minutes'),
+        ('1h', '1 Hour'),
+    ]
+
+    INTERVAL_SECONDS = {
+        '1m': 60,
+        '5m': 300,
+        '1h': 3600,
+    }
+
+    symbol = models.CharField(max_length=20)
+    interval = models.CharField(max_length=3, choices=INTERVALS)
+    bucket_start = models.DateTimeField()
+
+    open = models.DecimalField(max_digits=15, decimal_places=8)
+    high = models.DecimalField(max_digits=15, decimal_places=8)
+    low = models.DecimalField(max_digits=15, decimal_places=8)
+    close = models.DecimalField(max_digits=15, decimal_places=8)
+    volume = models.FloatField(default=0)  # Change in the exchange's rolling volume within the bucket
+    tick_count = models.IntegerField(default=0)
+
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = 'price_bars'
+        # Also serves as the (symbol, interval, bucket_start) lookup index
+        unique_together = [['symbol', 'interval', 'bucket_start']]
+
+    def __str__(self):
+        return f"{self.symbol} {self.interval} {self.bucket_start}"
+
 class TradeHistory(models.Model):
     """History of all trade actions (buy/sell orders)"""
     ORDER_TYPES = [
@@ -203,6 +241,59 @@ class TradeHistory(models.Model):
         ]
 
 
+class PendingOrder(models.Model):
+    """Resting LIMIT / STOP / STOP_LIMIT order, filled by the price feed"""
+    ORDER_TYPES = [
+        ('LIMIT', 'Limit'),
+        ('STOP', 'Stop Loss'),
+        ('STOP_LIMIT', 'Stop Limit'),
+    ]
+    
+    STATUSES = [
+        ('PENDING', 'Pending'),
+        ('FILLED', 'Filled'),
+        ('CANCELLED', 'Cancelled'),
+        ('REJECTED', 'Rejected'),
+    ]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='pending_orders')
+    
+    asset_symbol = models.CharField(max_length=20)
+    trade_type = models.CharField(max_length=10, choices=Trade.TRADE_TYPES)
+    direction = models.CharField(max_length=4, choices=Trade.DIRECTIONS)
+    order_type = models.CharField(max_length=15, choices=ORDER_TYPES)
+    status = models.CharField(max_length=10, choices=STATUSES, default='PENDING')
+    
+    quantity = models.DecimalField(max_digits=20, decimal_places=8)
+    limit_price = models.DecimalField(max_digits=20, decimal_places=8, null=True, blank=True)
+    stop_price = models.DecimalField(max_digits=20, decimal_places=8, null=True, blank=True)
+    triggered_at = models.DateTimeField(null=True, blank=True)  # STOP_LIMIT: stop hit, now resting as a limit
+    
+    # Original order payload, re-validated with PlaceOrderSerializer at fill time
+    order_data = models.JSONField(default=dict)
+    
+    # Fill result
+    trade = models.ForeignKey(Trade, on_delete=models.SET_NULL, null=True, blank=True, related_name='pending_orders')
+    fill_price = models.DecimalField(max_digits=20, decimal_places=8, null=True, blank=True)
+    failure_reason = models.TextField(blank=True)
+    
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    filled_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        db_table = 'pending_orders'
+        indexes = [
+            models.Index(fields=['asset_symbol', 'status']),
+            models.Index(fields=['user', 'status']),
+            models.Index(fields=['status', 'updated_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.user.email} - {self.order_type} {self.direction} {self.quantity} {self.asset_symbol}"
+
+
 class Portfolio(models.Model):
     """Enhanced user portfolio summary"""
 
@@ -235,30 +326,36 @@ class Portfolio(models.Model):
     class Meta:
         db_table = 'user_portfolios'
 
-    def update_portfolio_metrics(self):
-        """Update portfolio metrics from active trades"""
-        active_trades = self.user.trades.filter(status__in=['OPEN', 'PARTIALLY_CLOSED'])
-        all_trades = self.user.trades.all()
+    def compute_metrics(self):
+        """Compute trade aggregates from scratch in a single query"""
+        active = Q(status__in=['OPEN', 'PARTIALLY_CLOSED'])
+        closed = Q(status='CLOSED')
         
-        self.active_trades_count = active_trades.count()
-        self.total_trades_count = all_trades.count()
+        metrics = Trade.objects.filter(user_id=self.user_id).aggregate(
+            active_trades_count=Count('id', filter=active),
+            total_trades_count=Count('id'),
+            total_invested=Sum('total_invested', filter=active),
+            total_unrealized_pnl=Sum('unrealized_pnl', filter=active),
+            total_realized_pnl=Sum('realized_pnl'),
+            winning_trades_count=Count('id', filter=closed & Q(realized_pnl__gt=0)),
+            losing_trades_count=Count('id', filter=closed & Q(realized_pnl__lt=0)),
+        )
+        for field in ('total_invested', 'total_unrealized_pnl', 'total_realized_pnl'):
+            metrics[field] = metrics[field] or Decimal('0')
         
-        # Calculate totals
-        self.total_invested = sum([trade.total_invested for trade in active_trades])
-        self.total_unrealized_pnl = sum([trade.unrealized_pnl for trade in active_trades])
-        self.total_realized_pnl = sum([trade.realized_pnl for trade in all_trades])
+        metrics['total_value'] = metrics['total_invested'] + metrics['total_unrealized_pnl']
         
-        self.total_value = self.total_invested + self.total_unrealized_pnl
+        # Return percentage is left untouched while nothing is invested
+        if metrics['total_invested'] > 0:
+            total_pnl = metrics['total_realized_pnl'] + metrics['total_unrealized_pnl']
+            metrics['total_return_percentage'] = (total_pnl / metrics['total_invested']) * 100
         
-        # Calculate win/loss counts
-        closed_trades = all_trades.filter(status='CLOSED')
-        self.winning_trades_count = closed_trades.filter(realized_pnl__gt=0).count()
-        self.losing_trades_count = closed_trades.filter(realized_pnl__lt=0).count()
-        
-        # Calculate return percentage
-        if self.total_invested > 0:
-            total_pnl = self.total_realized_pnl + self.total_unrealized_pnl
-            self.total_return_percentage = (total_pnl / self.total_invested) * 100
+        return metrics
+
+    def update_portfolio_metrics(self):
+        """Full recompute of portfolio metrics from the user's trades"""
+        for field, value in self.compute_metrics().items():
+            setattr(self, field, value)
         
         self.save()
 
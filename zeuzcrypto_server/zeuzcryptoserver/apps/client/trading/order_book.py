@@ -0,0 +1,293 @@
+# order_book.py
+import heapq
+import logging
+import itertools
+import threading
+from datetime import timedelta
+from decimal import Decimal
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.utils import timezone
+from .models import PendingOrder
+
+logger = logging.getLogger(__name__)
+
+
+class SymbolOrderBook:
+    """
+    Resting orders of one symbol, kept in heaps keyed by trigger price.
+
+    - bids: LIMIT BUY, highest limit first, fill when mark <= limit
+    - asks: LIMIT SELL, lowest limit first, fill when mark >= limit
+    - stop_buys: lowest stop first, trigger when mark >= stop
+    - stop_sells: highest stop first, trigger when mark <= stop
+
+    Cancelled or replaced orders are removed lazily: a heap entry is only
+    honoured while its sequence number matches the live order record.
+    """
+
+    def __init__(self, sequence):
+        self.sequence = sequence
+        self.bids = []
+        self.asks = []
+        self.stop_buys = []
+        self.stop_sells = []
+        self.orders = {}  # order_id -> live record
+
+    def __len__(self):
+        return len(self.orders)
+
+    def add(self, record: dict):
+        """Place (or replace) an order in the heap matching its current phase"""
+        record['seq'] = next(self.sequence)
+        self.orders[record['id']] = record
+        entry_id = (record['seq'], record['id'])
+
+        resting_as_limit = record['order_type'] == 'LIMIT' or (
+            record['order_type'] == 'STOP_LIMIT' and record['triggered']
+        )
+        if resting_as_limit:
+            if record['direction'] == 'BUY':
+                heapq.heappush(self.bids, (-record['limit_price'], *entry_id))
+            else:
+                heapq.heappush(self.asks, (record['limit_price'], *entry_id))
+        elif record['direction'] == 'BUY':
+            heapq.heappush(self.stop_buys, (record['stop_price'], *entry_id))
+        else:
+            heapq.heappush(self.stop_sells, (-record['stop_price'], *entry_id))
+
+    def remove(self, order_id):
+        return self.orders.pop(order_id, None)
+
+    def _pop_crossed(self, heap: list, crossed) -> list:
+        """Pop live records from the top of a heap while `crossed(key)` holds"""
+        records = []
+        while heap and crossed(heap[0][0]):
+            _, seq, order_id = heapq.heappop(heap)
+            record = self.orders.get(order_id)
+            if record is not None and record['seq'] == seq:
+                records.append(record)
+        return records
+
+    def match(self, mark_price: Decimal):
+        """Orders to fill at this mark price, and STOP_LIMIT orders that just triggered"""
+        fills = []
+        triggered = []
+
+        stops = (
+            self._pop_crossed(self.stop_buys, lambda stop: stop <= mark_price)
+            + self._pop_crossed(self.stop_sells, lambda neg_stop: -neg_stop >= mark_price)
+        )
+        for record in stops:
+            if record['order_type'] == 'STOP':
+                fills.append(record)
+            else:
+                # Stop hit - rest as a limit order from now on
+                record['triggered'] = True
+                triggered.append(record)
+                self.add(record)
+
+        fills += self._pop_crossed(self.bids, lambda neg_limit: -neg_limit >= mark_price)
+        fills += self._pop_crossed(self.asks, lambda limit: limit <= mark_price)
+
+        for record in fills:
+            self.orders.pop(record['id'], None)
+        return fills, triggered
+
+
+class OrderBookManager:
+    """
+    Per-symbol books of resting orders, evaluated against every mark price.
+
+    The feed process warms the books from PENDING orders at start-up. New,
+    cancelled and filled orders are picked up from in-process ``post_save``
+    events and, for orders placed by other processes, by re-reading orders
+    changed since the last sync every ``resync_interval`` seconds.
+    Fills go through ``PlaceOrderView._process_order`` so resting orders
+    settle exactly like market orders.
+    """
+
+    def __init__(self, resync_interval: float = 2.0):
+        self.resync_interval = resync_interval
+        self.books = {}  # symbol -> SymbolOrderBook
+        self.symbol_by_order = {}
+        self.sequence = itertools.count()
+        self.warmed = False
+        self.synced_at = None
+        self.lock = threading.RLock()
+
+        # Counters
+        self.filled = 0
+        self.rejected = 0
+        self.triggered = 0
+
+    @staticmethod
+    def to_record(order: PendingOrder) -> dict:
+        return {
+            'id': order.id,
+            'user_id': order.user_id,
+            'asset_symbol': order.asset_symbol,
+            'direction': order.direction,
+            'order_type': order.order_type,
+            'limit_price': order.limit_price,
+            'stop_price': order.stop_price,
+            'triggered': order.triggered_at is not None,
+        }
+
+    # ---------------------------
+    # Book maintenance
+    # ---------------------------
+    def warm(self) -> int:
+        """Load every PENDING order"""
+        synced_at = timezone.now()
+        orders = list(PendingOrder.objects.filter(status='PENDING').order_by('created_at'))
+        with self.lock:
+            self.books = {}
+            self.symbol_by_order = {}
+            for order in orders:
+                self._add(self.to_record(order))
+            self.warmed = True
+            self.synced_at = synced_at
+
+        logger.info(f"📒 Order books warmed: {len(orders)} resting orders, {len(self.books)} symbols")
+        return len(orders)
+
+    def track(self, order: PendingOrder):
+        """Add, replace or drop an order after it was saved"""
+        if not self.warmed:
+            return
+        with self.lock:
+            self._remove(order.id)
+            if order.status == 'PENDING':
+                self._add(self.to_record(order))
+
+    def resync_due(self) -> bool:
+        return self.warmed and timezone.now() - self.synced_at >= timedelta(seconds=self.resync_interval)
+
+    def refresh_changed(self) -> int:
+        """Re-read orders changed since the last sync (placed, cancelled or filled elsewhere)"""
+        if not self.warmed:
+            return 0
+
+        synced_at = timezone.now()
+        # Small overlap so rows committed during the previous read are not missed
+        changed = list(
+            PendingOrder.objects.filter(
+                updated_at__gte=self.synced_at - timedelta(seconds=1)
+            ).order_by('created_at')
+        )
+        for order in changed:
+            with self.lock:
+                live = self.get_record(order.id)
+                if live is not None and order.status == 'PENDING' and live['triggered'] == (order.triggered_at is not None):
+                    continue  # Unchanged - keep its queue position
+            self.track(order)
+
+        self.synced_at = synced_at
+        return len(changed)
+
+    def get_record(self, order_id):
+        symbol = self.symbol_by_order.get(order_id)
+        if symbol is None:
+            return None
+        return self.books[symbol].orders.get(order_id)
+
+    def symbols(self) -> list:
+        with self.lock:
+            return [symbol for symbol, book in self.books.items() if len(book)]
+
+    def _add(self, record: dict):
+        symbol = record['asset_symbol']
+        if symbol not in self.books:
+            self.books[symbol] = SymbolOrderBook(self.sequence)
+        self.books[symbol].add(record)
+        self.symbol_by_order[record['id']] = symbol
+
+    def _remove(self, order_id):
+        symbol = self.symbol_by_order.pop(order_id, None)
+        if symbol is not None:
+            self.books[symbol].remove(order_id)
+
+    # ---------------------------
+    # Matching
+    # ---------------------------
+    def match(self, symbol: str, mark_price: Decimal):
+        """Pop the orders a mark price fills or triggers (memory only)"""
+        with self.lock:
+            book = self.books.get(symbol)
+            if book is None or not len(book):
+                return [], []
+
+            fills, triggered = book.match(mark_price)
+            for record in fills:
+                self.symbol_by_order.pop(record['id'], None)
+
+        self.triggered += len(triggered)
+        return fills, triggered
+
+    def mark_triggered(self, records: list):
+        """Persist that STOP_LIMIT orders are now resting as limits"""
+        PendingOrder.objects.filter(
+            id__in=[record['id'] for record in records], status='PENDING'
+        ).update(triggered_at=timezone.now(), updated_at=timezone.now())
+
+    def fill(self, record: dict, mark_price: Decimal):
+        """Execute a matched order through the regular order handlers"""
+        from .serializers import PlaceOrderSerializer
+        from .views import PlaceOrderView
+
+        with transaction.atomic():
+            order = PendingOrder.objects.select_for_update().select_related('user').filter(
+                pk=record['id'], status='PENDING'
+            ).first()
+            if order is None:
+                return None  # Cancelled or filled in the meantime
+
+            serializer = PlaceOrderSerializer(data={
+                **order.order_data,
+                'price': str(mark_price),
+                'order_type': order.order_type,
+            })
+
+            try:
+                if not serializer.is_valid():
+                    raise ValidationError(str(serializer.errors))
+                with transaction.atomic():
+                    result = PlaceOrderView()._process_order(order.user, serializer.validated_data)
+            except Exception as e:
+                order.status = 'REJECTED'
+                order.failure_reason = str(e)
+                order.save(update_fields=['status', 'failure_reason', 'updated_at'])
+                self.rejected += 1
+                logger.warning(f"Pending order {order.id} rejected at {mark_price}: {e}")
+                return {'order': order, 'result': None}
+
+            order.status = 'FILLED'
+            order.fill_price = mark_price
+            order.filled_at = timezone.now()
+            order.trade_id = result.get('trade_id')
+            order.save(update_fields=['status', 'fill_price', 'filled_at', 'trade', 'updated_at'])
+
+        self.filled += 1
+        logger.info(
+            f"✅ {order.order_type} {order.direction} {order.quantity} {order.asset_symbol} "
+            f"filled at {mark_price} (order {order.id})"
+        )
+        return {'order': order, 'result': result}
+
+    def stats(self) -> dict:
+        with self.lock:
+            return {
+                'warmed': self.warmed,
+                'resting_orders': len(self.symbol_by_order),
+                'symbols': len(self.symbols()),
+                'filled': self.filled,
+                'rejected': self.rejected,
+                'stop_limits_triggered': self.triggered,
+            }
+
+
+order_books = OrderBookManager(
+    resync_interval=getattr(settings, 'TRADING_SETTINGS', {}).get('ORDER_BOOK_RESYNC_INTERVAL', 2)
+)
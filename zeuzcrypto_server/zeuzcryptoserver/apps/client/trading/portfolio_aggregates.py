@@ -0,0 +1,188 @@
+# portfolio_aggregates.py
+import logging
+from decimal import Decimal
+from django.conf import settings
+from django.db.models import Case, When, F, Value, DecimalField, FloatField
+from django.db.models.functions import Cast
+from .models import Portfolio
+
+logger = logging.getLogger(__name__)
+
+ACTIVE_STATUSES = ['OPEN', 'PARTIALLY_CLOSED']
+AMOUNT_FIELDS = ['total_invested', 'total_unrealized_pnl', 'total_realized_pnl']
+COUNT_FIELDS = ['active_trades_count', 'total_trades_count', 'winning_trades_count', 'losing_trades_count']
+VERIFIED_FIELDS = AMOUNT_FIELDS + COUNT_FIELDS + ['total_value', 'total_return_percentage']
+
+AMOUNT = DecimalField(max_digits=30, decimal_places=8)
+PERCENTAGE = DecimalField(max_digits=10, decimal_places=4)
+
+
+def return_percentage(pnl, invested):
+    """SQL for pnl / invested * 100, in floating point so SQLite does not truncate it"""
+    return Cast(pnl, FloatField()) * Value(100.0) / Cast(invested, FloatField())
+
+
+def incremental_portfolios_enabled() -> bool:
+    """Whether Portfolio rows are maintained by deltas instead of full recomputes"""
+    return getattr(settings, 'TRADING_SETTINGS', {}).get('PORTFOLIO_INCREMENTAL', True)
+
+
+class PortfolioAggregator:
+    """
+    Keeps Portfolio aggregates in step with trade changes in O(1) per event.
+
+    Each trade contributes a fixed set of amounts and counters to its user's
+    portfolio. On every change the difference between the old and the new
+    contribution is applied with a single F-expression UPDATE, so concurrent
+    writers never overwrite each other. ``rebuild`` recomputes a portfolio
+    from scratch and ``verify`` reports any drift between the two.
+    """
+
+    @staticmethod
+    def contribution(trade) -> dict:
+        """What a single trade adds to its user's portfolio"""
+        if trade is None:
+            return {}
+
+        active = trade.status in ACTIVE_STATUSES
+        closed = trade.status == 'CLOSED'
+        realized = trade.realized_pnl or Decimal('0')
+
+        return {
+            'total_invested': (trade.total_invested or Decimal('0')) if active else Decimal('0'),
+            'total_unrealized_pnl': (trade.unrealized_pnl or Decimal('0')) if active else Decimal('0'),
+            'total_realized_pnl': realized,
+            'active_trades_count': int(active),
+            'total_trades_count': 1,
+            'winning_trades_count': int(closed and realized > 0),
+            'losing_trades_count': int(closed and realized < 0),
+        }
+
+    @staticmethod
+    def diff(old: dict, new: dict) -> dict:
+        """Non-zero differences between two contributions"""
+        delta = {}
+        for field in AMOUNT_FIELDS + COUNT_FIELDS:
+            change = new.get(field, 0) - old.get(field, 0)
+            if change:
+                delta[field] = change
+        return delta
+
+    @staticmethod
+    def apply_delta(user_id, delta: dict, create_missing: bool = True) -> bool:
+        """Apply a contribution delta to the user's portfolio in one UPDATE"""
+        if not delta:
+            return True
+
+        updates = {field: F(field) + change for field, change in delta.items()}
+
+        invested_delta = delta.get('total_invested', Decimal('0'))
+        unrealized_delta = delta.get('total_unrealized_pnl', Decimal('0'))
+        realized_delta = delta.get('total_realized_pnl', Decimal('0'))
+
+        if invested_delta or unrealized_delta:
+            updates['total_value'] = F('total_value') + (invested_delta + unrealized_delta)
+
+        if invested_delta or unrealized_delta or realized_delta:
+            # Right-hand F() values are read before the row is written
+            new_invested = F('total_invested') + Value(invested_delta, output_field=AMOUNT)
+            new_pnl = (
+                F('total_realized_pnl') + Value(realized_delta, output_field=AMOUNT)
+                + F('total_unrealized_pnl') + Value(unrealized_delta, output_field=AMOUNT)
+            )
+            updates['total_return_percentage'] = Case(
+                When(
+                    total_invested__gt=-invested_delta,
+                    then=return_percentage(new_pnl, new_invested),
+                ),
+                default=F('total_return_percentage'),
+                output_field=PERCENTAGE,
+            )
+
+        updated = Portfolio.objects.filter(user_id=user_id).update(**updates)
+        if not updated and create_missing:
+            # First trade of this user - build the row from scratch
+            logger.debug(f"No portfolio for user {user_id}, rebuilding from trades")
+            PortfolioAggregator.rebuild(user_id)
+        return bool(updated)
+
+    @staticmethod
+    def apply_trade_change(user_id, old: dict, new: dict, create_missing: bool = True) -> dict:
+        """Apply the change between an old and a new trade contribution"""
+        delta = PortfolioAggregator.diff(old, new)
+        PortfolioAggregator.apply_delta(user_id, delta, create_missing)
+        return delta
+
+    @staticmethod
+    def apply_unrealized_deltas(user_deltas: dict) -> int:
+        """Apply per-user unrealized P&L deltas of a price tick in one UPDATE"""
+        if not user_deltas:
+            return 0
+
+        pnl_delta = Case(
+            *[
+                When(user_id=user_id, then=Value(delta, output_field=AMOUNT))
+                for user_id, delta in user_deltas.items()
+            ],
+            default=Value(Decimal('0'), output_field=AMOUNT),
+            output_field=AMOUNT,
+        )
+
+        return Portfolio.objects.filter(user_id__in=list(user_deltas)).update(
+            total_unrealized_pnl=F('total_unrealized_pnl') + pnl_delta,
+            total_value=F('total_value') + pnl_delta,
+            total_return_percentage=Case(
+                When(
+                    total_invested__gt=0,
+                    then=return_percentage(
+                        F('total_realized_pnl') + F('total_unrealized_pnl') + pnl_delta,
+                        F('total_invested'),
+                    ),
+                ),
+                default=F('total_return_percentage'),
+                output_field=PERCENTAGE,
+            ),
+        )
+
+    @staticmethod
+    def rebuild(user_id) -> Portfolio:
+        """Recompute a portfolio from the user's trades"""
+        portfolio, _ = Portfolio.objects.get_or_create(user_id=user_id)
+        portfolio.update_portfolio_metrics()
+        return portfolio
+
+    @staticmethod
+    def verify(portfolio: Portfolio) -> dict:
+        """Differences between stored aggregates and a full recompute"""
+        expected = portfolio.compute_metrics()
+        drift = {}
+
+        for field in VERIFIED_FIELDS:
+            if field not in expected:
+                continue
+
+            stored = getattr(portfolio, field)
+            value = expected[field]
+            decimal_places = getattr(Portfolio._meta.get_field(field), 'decimal_places', None)
+            if decimal_places is not None:
+                quantum = Decimal(1).scaleb(-decimal_places)
+                stored = Decimal(stored).quantize(quantum)
+                value = Decimal(value).quantize(quantum)
+
+            if stored != value:
+                drift[field] = {'stored': stored, 'expected': value}
+
+        return drift
+
+
+def get_portfolio(user) -> Portfolio:
+    """Current portfolio of a user, recomputed only when deltas are disabled"""
+    if not incremental_portfolios_enabled():
+        portfolio, _ = Portfolio.objects.get_or_create(user=user)
+        portfolio.update_portfolio_metrics()
+        return portfolio
+
+    portfolio = Portfolio.objects.filter(user=user).first()
+    if portfolio is None:
+        portfolio = PortfolioAggregator.rebuild(user.id)
+    return portfolio
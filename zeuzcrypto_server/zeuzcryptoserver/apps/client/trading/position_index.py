@@ -0,0 +1,284 @@
+# position_index.py
+import time
+import logging
+import threading
+from collections import defaultdict
+from typing import Dict, Optional
+from django.conf import settings
+from .models import Trade
+
+logger = logging.getLogger(__name__)
+
+OPEN_STATUSES = ['OPEN', 'PARTIALLY_CLOSED']
+MARKED_TRADE_TYPES = ['FUTURES', 'OPTIONS']
+
+# Compact record kept per open position (same keys as the values() rows)
+POSITION_FIELDS = [
+    'id',
+    'user_id',
+    'asset_symbol',
+    'trade_type',
+    'direction',
+    'remaining_quantity',
+    'average_price',
+    'unrealized_pnl',
+    'current_price',
+    'futures_details__margin_used',
+    'futures_details__margin_required',
+]
+
+# Fields the liquidation levels of a position are computed from
+LEVEL_FIELDS = [
+    'asset_symbol',
+    'trade_type',
+    'direction',
+    'remaining_quantity',
+    'average_price',
+    'futures_details__margin_used',
+    'futures_details__margin_required',
+]
+
+
+class OpenPositionIndex:
+    """
+    Long-lived in-process index of open FUTURES/OPTIONS positions by symbol.
+
+    The feed process warms it once at start-up and keeps it current from
+    trade open/close events, so each tick is marked against memory instead
+    of re-querying the symbol's trades. Writes from other processes are
+    picked up by ``resync`` (called from ``sync_active_symbols``) and by a
+    full reload once the index is older than ``max_age`` seconds.
+
+    Until ``warm`` has been called the index is inactive: tracking calls are
+    no-ops and readers fall back to the database.
+
+    Ids of positions that were added, removed or changed in a
+    ``LEVEL_FIELDS`` field are collected per symbol for ``take_changes``, so
+    the liquidation levels are recomputed for those positions only; P&L and
+    price updates are not changes.
+    """
+
+    def __init__(self, max_age: float = 60.0):
+        self.max_age = max_age
+        self.positions: Dict[str, Dict] = {}  # symbol -> {trade_id: record}
+        self.symbol_by_trade: Dict = {}  # trade_id -> symbol
+        self.changes = defaultdict(set)  # symbol -> trade ids whose level fields changed since take_changes
+        self.warmed = False
+        self.synced_at: Optional[float] = None
+        self.lock = threading.RLock()
+
+        # Counters
+        self.resyncs = 0
+        self.last_resync_changes = 0
+
+    # ---------------------------
+    # Loading
+    # ---------------------------
+    def load(self, **filters) -> list:
+        """Fetch position records from the database"""
+        return list(
+            Trade.objects.filter(
+                status__in=OPEN_STATUSES,
+                trade_type__in=MARKED_TRADE_TYPES,
+                **filters
+            ).values(*POSITION_FIELDS)
+        )
+
+    def warm(self) -> int:
+        """Load every open position and activate the index"""
+        records = self.load()
+        with self.lock:
+            self.positions = {}
+            self.symbol_by_trade = {}
+            for record in records:
+                self._put(record)
+            self.warmed = True
+            self.synced_at = time.monotonic()
+
+        logger.info(f"📇 Position index warmed: {len(records)} positions, {len(self.positions)} symbols")
+        return len(records)
+
+    def resync(self, symbols=None) -> dict:
+        """Reload positions from the database (all, or only the given symbols)"""
+        if not self.warmed:
+            return {'added': 0, 'removed': 0, 'changed': 0}
+
+        filters = {'asset_symbol__in': list(symbols)} if symbols is not None else {}
+        records = {record['id']: record for record in self.load(**filters)}
+
+        with self.lock:
+            if symbols is None:
+                current = dict(self.symbol_by_trade)
+            else:
+                current = {
+                    trade_id: symbol for trade_id, symbol in self.symbol_by_trade.items()
+                    if symbol in symbols
+                }
+
+            removed = [trade_id for trade_id in current if trade_id not in records]
+            added = changed = 0
+            for trade_id, record in records.items():
+                existing = self.get_record(trade_id)
+                if existing is None:
+                    added += 1
+                elif existing != record:
+                    changed += 1
+                self._put(record)
+
+            for trade_id in removed:
+                self._pop(trade_id)
+
+            if symbols is None:
+                self.synced_at = time.monotonic()
+            self.resyncs += 1
+            self.last_resync_changes = added + changed + len(removed)
+
+        if self.last_resync_changes:
+            logger.info(
+                f"📇 Position index resynced: +{added} -{len(removed)} ~{changed}"
+            )
+        return {'added': added, 'removed': len(removed), 'changed': changed}
+
+    def ensure_fresh(self):
+        """Reload everything when the index has not been synced for max_age seconds"""
+        if self.warmed and (time.monotonic() - self.synced_at) >= self.max_age:
+            self.resync()
+
+    # ---------------------------
+    # Reads
+    # ---------------------------
+    def get(self, symbol: str) -> list:
+        """Open position records of a symbol"""
+        with self.lock:
+            return list(self.positions.get(symbol, {}).values())
+
+    def has_positions(self, symbol: str) -> bool:
+        return bool(self.positions.get(symbol))
+
+    def get_record(self, trade_id) -> Optional[dict]:
+        symbol = self.symbol_by_trade.get(trade_id)
+        if symbol is None:
+            return None
+        return self.positions.get(symbol, {}).get(trade_id)
+
+    def symbols(self) -> list:
+        with self.lock:
+            return [symbol for symbol, records in self.positions.items() if records]
+
+    def take_changes(self, symbol: str) -> set:
+        """Ids of the symbol's positions added, removed or re-levelled since the last call"""
+        with self.lock:
+            return self.changes.pop(symbol, set())
+
+    # ---------------------------
+    # Event-driven updates
+    # ---------------------------
+    def track(self, trade: Trade):
+        """Add, update or drop a trade after it was saved"""
+        if not self.warmed:
+            return
+
+        if trade.status not in OPEN_STATUSES or trade.trade_type not in MARKED_TRADE_TYPES:
+            self.discard(trade.pk)
+            return
+
+        with self.lock:
+            existing = self.get_record(trade.pk)
+
+        if existing is None or (
+            existing['trade_type'] == 'FUTURES' and existing['futures_details__margin_used'] is None
+        ):
+            # Margin fields live on FuturesDetails, so new positions are loaded once
+            self.refresh([trade.pk])
+            return
+
+        with self.lock:
+            self._put({
+                **existing,
+                'asset_symbol': trade.asset_symbol,
+                'direction': trade.direction,
+                'remaining_quantity': trade.remaining_quantity,
+                'average_price': trade.average_price,
+                'unrealized_pnl': trade.unrealized_pnl,
+                'current_price': trade.current_price,
+            })
+
+    def refresh(self, trade_ids) -> int:
+        """Reload specific trades from the database"""
+        if not self.warmed or not trade_ids:
+            return 0
+
+        records = self.load(id__in=list(trade_ids))
+        self.replace_records(trade_ids, records)
+        return len(records)
+
+    def replace_records(self, trade_ids, records: list):
+        """Store freshly loaded records for ``trade_ids``; ids missing from them are no longer open"""
+        if not self.warmed:
+            return
+        records = {record['id']: record for record in records}
+        with self.lock:
+            for trade_id in trade_ids:
+                if trade_id in records:
+                    self._put(records[trade_id])
+                else:
+                    self._pop(trade_id)
+
+    def replace_symbol(self, symbol: str, records: list):
+        """Store the current open positions of a symbol; indexed ones missing from ``records`` are closed"""
+        if not self.warmed:
+            return
+        with self.lock:
+            found = {record['id'] for record in records}
+            for record in records:
+                self._put(record)
+            for trade_id in [trade_id for trade_id in self.positions.get(symbol, {}) if trade_id not in found]:
+                self._pop(trade_id)
+
+    def discard(self, trade_id):
+        """Drop a closed or deleted trade"""
+        if not self.warmed:
+            return
+        with self.lock:
+            self._pop(trade_id)
+
+    # ---------------------------
+    # Internals
+    # ---------------------------
+    def _put(self, record: dict):
+        trade_id = record['id']
+        symbol = record['asset_symbol']
+        previous = self.get_record(trade_id)
+        if previous is not None and previous['asset_symbol'] != symbol:
+            self.positions.get(previous['asset_symbol'], {}).pop(trade_id, None)
+            self.changes[previous['asset_symbol']].add(trade_id)
+
+        self.positions.setdefault(symbol, {})[trade_id] = record
+        self.symbol_by_trade[trade_id] = symbol
+        if previous is None or any(previous[field] != record[field] for field in LEVEL_FIELDS):
+            self.changes[symbol].add(trade_id)
+
+    def _pop(self, trade_id):
+        symbol = self.symbol_by_trade.pop(trade_id, None)
+        if symbol is not None:
+            self.changes[symbol].add(trade_id)
+            records = self.positions.get(symbol, {})
+            records.pop(trade_id, None)
+            if not records:
+                self.positions.pop(symbol, None)
+
+    def stats(self) -> dict:
+        with self.lock:
+            return {
+                'warmed': self.warmed,
+                'positions': len(self.symbol_by_trade),
+                'symbols': len(self.positions),
+                'age_seconds': round(time.monotonic() - self.synced_at, 1) if self.synced_at else None,
+                'resyncs': self.resyncs,
+                'last_resync_changes': self.last_resync_changes,
+            }
+
+
+position_index = OpenPositionIndex(
+    max_age=getattr(settings, 'TRADING_SETTINGS', {}).get('POSITION_INDEX_MAX_AGE', 60)
+)
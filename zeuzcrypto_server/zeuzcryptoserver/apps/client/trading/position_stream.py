@@ -0,0 +1,150 @@
+# position_stream.py
+import time
+import uuid
+import logging
+from collections import deque
+from decimal import Decimal
+from typing import Optional
+from django.conf import settings
+from django.core.cache import cache
+
+logger = logging.getLogger(__name__)
+
+PRICE_QUANTUM = Decimal('0.00000001')  # Same 8 places as the model/serializer decimals
+
+
+def stream_settings() -> dict:
+    trading_settings = getattr(settings, 'TRADING_SETTINGS', {})
+    return {
+        'buffer_size': trading_settings.get('POSITION_STREAM_BUFFER_SIZE', 100),
+        'ttl': trading_settings.get('POSITION_STREAM_TTL', 300),
+        'save_interval': trading_settings.get('POSITION_STREAM_SAVE_INTERVAL', 5),
+    }
+
+
+def format_decimal(value) -> str:
+    """Render a decimal the way ActivePositionSerializer does, so pushes diff cleanly against snapshots"""
+    return str(Decimal(str(value)).quantize(PRICE_QUANTUM))
+
+
+class PositionDeltaEncoder:
+    """
+    Delta-encoded position stream for one client connection.
+
+    The first message is a full ``snapshot``; afterwards only the fields that
+    changed per position are sent as ``delta`` messages (plus ``removed`` ids).
+    Every message carries a monotonically increasing ``seq``. The last
+    ``buffer_size`` messages are kept so a client reconnecting with its last
+    seen ``seq`` can be replayed the gap instead of receiving a new snapshot.
+
+    The stream is persisted at most every ``save_interval`` seconds and on
+    disconnect, not per message; a client whose last seq is newer than the
+    persisted state (worker crash) simply gets a new snapshot.
+    """
+
+    def __init__(self, user_id, stream_id: str = None, buffer_size: int = 100):
+        self.user_id = str(user_id)
+        self.stream_id = stream_id or uuid.uuid4().hex
+        self.seq = 0
+        self.positions = {}  # position id -> {field: value} last sent to the client
+        self.buffer = deque(maxlen=buffer_size)
+        self.saved_seq = None
+        self.saved_at = 0.0
+
+    def _emit(self, message: dict) -> dict:
+        self.seq += 1
+        message = {'seq': self.seq, 'stream_id': self.stream_id, **message}
+        self.buffer.append(message)
+        return message
+
+    def snapshot(self, positions: list) -> dict:
+        """Full state; resets what the client is assumed to hold"""
+        self.positions = {str(position['id']): dict(position) for position in positions}
+        return self._emit({'type': 'snapshot', 'positions': list(self.positions.values())})
+
+    def diff(self, positions: list, complete: bool = False) -> Optional[dict]:
+        """
+        Changed fields of the given positions.
+
+        With ``complete=True`` the list is the user's full position set and any
+        position missing from it is reported as removed.
+        """
+        changes = []
+        seen = set()
+        for position in positions:
+            position_id = str(position['id'])
+            seen.add(position_id)
+            previous = self.positions.get(position_id)
+
+            if previous is None:
+                changes.append(dict(position))
+                self.positions[position_id] = dict(position)
+                continue
+
+            changed = {
+                field: value for field, value in position.items()
+                if previous.get(field) != value
+            }
+            if changed:
+                changes.append({'id': position['id'], **changed})
+                previous.update(changed)
+
+        removed = []
+        if complete:
+            removed = [position_id for position_id in self.positions if position_id not in seen]
+            for position_id in removed:
+                del self.positions[position_id]
+
+        if not changes and not removed:
+            return None
+
+        message = {'type': 'delta', 'changes': changes}
+        if removed:
+            message['removed'] = removed
+        return self._emit(message)
+
+    def replay(self, last_seq: int) -> Optional[list]:
+        """Messages after ``last_seq``, or None when the gap is no longer buffered"""
+        if last_seq == self.seq:
+            return []
+        if not self.buffer or last_seq > self.seq or last_seq < self.buffer[0]['seq'] - 1:
+            return None
+        return [message for message in self.buffer if message['seq'] > last_seq]
+
+    # ---------------------------
+    # Persistence
+    # ---------------------------
+    @staticmethod
+    def cache_key(stream_id: str) -> str:
+        return f"position_stream:{stream_id}"
+
+    def save(self, ttl: int):
+        cache.set(self.cache_key(self.stream_id), {
+            'user_id': self.user_id,
+            'seq': self.seq,
+            'positions': self.positions,
+            'buffer': list(self.buffer),
+        }, ttl)
+        self.saved_seq = self.seq
+        self.saved_at = time.monotonic()
+
+    def unsaved(self) -> bool:
+        return self.seq != self.saved_seq
+
+    def save_due(self, interval: float) -> bool:
+        """Unsaved messages and the last save is at least ``interval`` seconds old"""
+        return self.unsaved() and time.monotonic() - self.saved_at >= interval
+
+    @classmethod
+    def load(cls, user_id, stream_id: str, buffer_size: int = 100) -> Optional['PositionDeltaEncoder']:
+        """Restore a stream of this user, if it is still cached"""
+        state = cache.get(cls.cache_key(stream_id))
+        if not state or state['user_id'] != str(user_id):
+            return None
+
+        encoder = cls(user_id, stream_id=stream_id, buffer_size=buffer_size)
+        encoder.seq = state['seq']
+        encoder.positions = state['positions']
+        encoder.buffer.extend(state['buffer'])
+        encoder.saved_seq = encoder.seq
+        return encoder
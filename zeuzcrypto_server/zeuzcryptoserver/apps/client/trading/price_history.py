@@ -0,0 +1,180 @@
+# price_history.py
+import time
+import logging
+from datetime import datetime, timezone as dt_timezone
+from decimal import Decimal
+from django.db import transaction
+from django.utils import timezone
+from .models import PriceHistory, PriceBar
+
+logger = logging.getLogger(__name__)
+
+
+def bucket_start_for(moment: datetime, interval: str) -> datetime:
+    """Floor a timestamp to the start of its bar bucket"""
+    seconds = PriceBar.INTERVAL_SECONDS[interval]
+    epoch = int(moment.timestamp())
+    return datetime.fromtimestamp(epoch - epoch % seconds, tz=dt_timezone.utc)
+
+
+class OHLCVRollup:
+    """
+    In-memory OHLCV bars per (symbol, interval), updated on every tick.
+
+    Bars touched since the last drain are marked dirty; closed bars are
+    evicted once drained so memory stays bounded by symbols x intervals.
+    The in-process bar is authoritative for its bucket, so only one feed
+    process should run the rollup for a symbol.
+    """
+
+    def __init__(self, intervals=None):
+        self.intervals = intervals or [code for code, _ in PriceBar.INTERVALS]
+        self.bars = {}  # (symbol, interval) -> current bar dict
+        self.dirty: set = set()
+        self.closed = []  # Bars whose bucket ended and still need a final write
+
+    def update(self, symbol: str, price: Decimal, volume: float, at: datetime):
+        """Fold one tick into the current bar of every interval"""
+        for interval in self.intervals:
+            key = (symbol, interval)
+            bucket_start = bucket_start_for(at, interval)
+            bar = self.bars.get(key)
+
+            if bar and bar['bucket_start'] != bucket_start:
+                if key in self.dirty:
+                    self.closed.append(bar)
+                    self.dirty.discard(key)
+                bar = None
+
+            if bar is None:
+                self.bars[key] = {
+                    'symbol': symbol,
+                    'interval': interval,
+                    'bucket_start': bucket_start,
+                    'open': price,
+                    'high': price,
+                    'low': price,
+                    'close': price,
+                    'first_volume': volume,
+                    'last_volume': volume,
+                    'tick_count': 1,
+                }
+            else:
+                bar['high'] = max(bar['high'], price)
+                bar['low'] = min(bar['low'], price)
+                bar['close'] = price
+                bar['last_volume'] = volume
+                bar['tick_count'] += 1
+
+            self.dirty.add(key)
+
+    def drain(self) -> list:
+        """Snapshot every bar changed since the last drain"""
+        bars = self.closed + [dict(self.bars[key]) for key in self.dirty]
+        self.closed = []
+        self.dirty = set()
+        return bars
+
+
+class PriceHistoryBuffer:
+    """
+    Collects ticks in memory and persists them in bulk.
+
+    Raw ``PriceHistory`` rows are written with one ``bulk_create`` once
+    ``max_size`` rows are pending or ``max_age`` seconds have passed since
+    the last flush; OHLCV bars are upserted in the same flush.
+    """
+
+    def __init__(self, max_size: int = 500, max_age: float = 5.0, intervals=None):
+        self.max_size = max_size
+        self.max_age = max_age
+        self.rows = []
+        self.rollup = OHLCVRollup(intervals)
+        self.last_flush = time.monotonic()
+
+        # Counters
+        self.rows_written = 0
+        self.bars_written = 0
+        self.flushes = 0
+
+    def record_tick(self, ticker_data: dict):
+        """Fold a raw feed tick into the OHLCV bars (memory only)"""
+        self.rollup.update(
+            ticker_data['symbol'],
+            ticker_data['mark_price'],
+            ticker_data.get('volume') or 0,
+            timezone.now(),
+        )
+
+    def add(self, ticker_data: dict):
+        """Queue a PriceHistory row for the next bulk insert"""
+        self.rows.append(
+            PriceHistory(
+                symbol=ticker_data['symbol'],
+                mark_price=ticker_data['mark_price'],
+                ltp=ticker_data['ltp'],
+                high=ticker_data['high'],
+                low=ticker_data['low'],
+                volume=ticker_data['volume'],
+            )
+        )
+
+    def should_flush(self) -> bool:
+        return (
+            len(self.rows) >= self.max_size
+            or (time.monotonic() - self.last_flush) >= self.max_age
+        )
+
+    def drain(self):
+        """Take pending rows and dirty bars; the write can then run off the event loop"""
+        rows, self.rows = self.rows, []
+        self.last_flush = time.monotonic()
+        return rows, self.rollup.drain()
+
+    def write(self, rows: list, bars: list):
+        """Persist drained rows and bars"""
+        try:
+            with transaction.atomic():
+                if rows:
+                    PriceHistory.objects.bulk_create(rows, batch_size=self.max_size)
+
+                if bars:
+                    PriceBar.objects.bulk_create(
+                        [
+                            PriceBar(
+                                symbol=bar['symbol'],
+                                interval=bar['interval'],
+                                bucket_start=bar['bucket_start'],
+                                open=bar['open'],
+                                high=bar['high'],
+                                low=bar['low'],
+                                close=bar['close'],
+                                volume=max(bar['last_volume'] - bar['first_volume'], 0),
+                                tick_count=bar['tick_count'],
+                            )
+                            for bar in bars
+                        ],
+                        update_conflicts=True,
+                        unique_fields=['symbol', 'interval', 'bucket_start'],
+                        update_fields=['open', 'high', 'low', 'close', 'volume', 'tick_count', 'updated_at'],
+                    )
+
+            self.rows_written += len(rows)
+            self.bars_written += len(bars)
+            self.flushes += 1
+
+        except Exception as e:
+            logger.error(f"Error storing price history ({len(rows)} ticks, {len(bars)} bars): {e}")
+
+    def flush(self):
+        """Drain and write in one call (sync callers)"""
+        rows, bars = self.drain()
+        self.write(rows, bars)
+
+    def stats(self) -> dict:
+        return {
+            'pending_rows': len(self.rows),
+            'rows_written': self.rows_written,
+            'bars_written': self.bars_written,
+            'flushes': self.flushes,
+        }
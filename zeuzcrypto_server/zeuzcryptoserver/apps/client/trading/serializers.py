@@ -1,7 +1,7 @@
 # serializers.py
 from rest_framework import serializers
 from decimal import Decimal
-from .models import Trade, FuturesDetails, OptionsDetails, TradeHistory, Portfolio
+from .models import Trade, FuturesDetails, OptionsDetails, TradeHistory, Portfolio, PendingOrder
 
 
 class FuturesDetailsSerializer(serializers.ModelSerializer):
@@ -56,6 +56,7 @@ class PlaceOrderSerializer(serializers.Serializer):
     quantity = serializers.DecimalField(max_digits=20, decimal_places=8, min_value=Decimal('0'))
     price = serializers.DecimalField(max_digits=20, decimal_places=8, min_value=Decimal('0'))
     order_type = serializers.ChoiceField(choices=TradeHistory.ORDER_TYPES, default='MARKET')
+    stop_price = serializers.DecimalField(max_digits=20, decimal_places=8, min_value=Decimal('0'), required=False)
     
     # Futures specific fields
     leverage = serializers.DecimalField(max_digits=5, decimal_places=2, required=False, default=Decimal('1'))
@@ -90,6 +91,10 @@ class PlaceOrderSerializer(serializers.Serializer):
         if trade_type == 'SPOT' and data.get('holding_type') == 'LONGTERM' and data.get('direction') != 'BUY':
             raise serializers.ValidationError("Long-term spot trades can only be BUY orders")
         
+        # Resting orders: price is the limit price, stop_price the trigger
+        if data.get('order_type') in ('STOP', 'STOP_LIMIT') and not data.get('stop_price'):
+            raise serializers.ValidationError(f"stop_price is required for {data['order_type']} orders")
+        
         return data
 
 
@@ -110,6 +115,15 @@ class CloseTradeSerializer(serializers.Serializer):
     order_type = serializers.ChoiceField(choices=TradeHistory.ORDER_TYPES, default='MARKET')
 
 
+class PendingOrderSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = PendingOrder
+        fields = ['id', 'asset_symbol', 'trade_type', 'direction', 'order_type', 'status',
+                 'quantity', 'limit_price', 'stop_price', 'triggered_at', 'trade', 'fill_price',
+                 'failure_reason', 'created_at', 'updated_at', 'filled_at']
+        read_only_fields = fields
+
+
 class PortfolioSerializer(serializers.ModelSerializer):
     win_rate = serializers.ReadOnlyField()
     
@@ -128,7 +142,7 @@ class ActivePositionSerializer(serializers.ModelSerializer):
     class Meta:
         model = Trade
         fields = ['id', 'asset_symbol', 'asset_name', 'trade_type', 'direction', 'status',
-                 'remaining_quantity', 'average_price', 'unrealized_pnl', 'total_pnl', 
+                 'remaining_quantity', 'average_price', 'current_price', 'unrealized_pnl', 'total_pnl', 
                  'pnl_percentage', 'opened_at']
 
 
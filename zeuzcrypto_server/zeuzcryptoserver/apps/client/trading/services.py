@@ -3,6 +3,8 @@ from decimal import Decimal
 from django.db import transaction
 from django.utils import timezone
 from .models import Trade, TradeHistory, Portfolio
+from .portfolio_aggregates import get_portfolio
+from .trade_mutations import TradeMutations
 import logging
 
 logger = logging.getLogger(__name__)
@@ -107,8 +109,7 @@ class PortfolioService:
     @staticmethod
     def get_portfolio_summary(user):
         """Get comprehensive portfolio summary"""
-        portfolio, _ = Portfolio.objects.get_or_create(user=user)
-        portfolio.update_portfolio_metrics()
+        portfolio = get_portfolio(user)
         
         # Get active positions grouped by asset
         active_trades = Trade.objects.filter(
@@ -227,28 +228,7 @@ class MarketDataService:
     @staticmethod
     def update_trade_prices(user, price_updates):
         """Update unrealized P&L for trades based on current prices"""
-        updated_trades = []
-        
-        for symbol, current_price in price_updates.items():
-            trades = Trade.objects.filter(
-                user=user,
-                asset_symbol=symbol,
-                status__in=['OPEN', 'PARTIALLY_CLOSED']
-            )
-            
-            for trade in trades:
-                old_pnl = trade.unrealized_pnl
-                new_pnl = trade.calculate_unrealized_pnl(current_price)
-                
-                updated_trades.append({
-                    'trade_id': trade.id,
-                    'symbol': symbol,
-                    'old_pnl': old_pnl,
-                    'new_pnl': new_pnl,
-                    'price_change': new_pnl - old_pnl
-                })
-        
-        return updated_trades
+        return TradeMutations.apply_prices(price_updates, user=user)
     
     @staticmethod
     def get_current_price(asset_symbol):
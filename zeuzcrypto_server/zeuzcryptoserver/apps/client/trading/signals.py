@@ -1,14 +1,28 @@
 # signals.py
+from django.db import transaction
 from django.db.models.signals import post_save, pre_save, post_delete
-from django.dispatch import receiver
+from django.dispatch import receiver, Signal
 from decimal import Decimal
 import asyncio
 import logging
 
-from .models import Trade, FuturesDetails, OptionsDetails, TradeHistory, Portfolio
+from .models import Trade, FuturesDetails, OptionsDetails, TradeHistory, Portfolio, PendingOrder
+from .portfolio_aggregates import PortfolioAggregator, incremental_portfolios_enabled
+from .events import trade_events
+from .position_index import position_index, MARKED_TRADE_TYPES
+from .order_book import order_books
 
 logger = logging.getLogger(__name__)
 
+# ---------------------------
+# Custom Signals
+# ---------------------------
+# Sent once per price tick by the mark-to-market engine with a `summary` dict
+# (symbol, mark_price, positions_marked, total_unrealized_pnl, user_deltas,
+# margin_calls, duration_ms, ...)
+positions_marked = Signal()
+
+
 # ---------------------------
 # Helper Functions
 # ---------------------------
@@ -27,6 +41,55 @@ def run_async_task(coro):
         loop.run_until_complete(coro)
 
 
+def request_position_refresh(trade_ids):
+    """Once committed, have the feed ingestor reload these trades (its index is not warm here)"""
+    trade_ids = [str(trade_id) for trade_id in trade_ids]
+    if not trade_ids:
+        return
+    
+    def send():
+        from .websocket_manager import refresh_positions
+        
+        try:
+            run_async_task(refresh_positions(trade_ids))
+        except Exception as e:
+            logger.error(f"Error requesting position refresh for {trade_ids}: {e}")
+    
+    transaction.on_commit(send)
+
+
+def unsubscribe_idle_symbols(symbols, exclude_trade_ids=()):
+    """Unsubscribe from symbols that no longer have open trades"""
+    symbols = set(symbols)
+    if not symbols:
+        return
+    
+    still_active = set(
+        Trade.objects.filter(
+            asset_symbol__in=symbols,
+            status__in=['OPEN', 'PARTIALLY_CLOSED']
+        ).exclude(pk__in=list(exclude_trade_ids)).values_list('asset_symbol', flat=True).distinct()
+    )
+    # Resting orders still need the price feed
+    still_active |= set(
+        PendingOrder.objects.filter(
+            asset_symbol__in=symbols,
+            status='PENDING'
+        ).values_list('asset_symbol', flat=True).distinct()
+    )
+    idle_symbols = symbols - still_active
+    
+    if idle_symbols:
+        # No other trades for these symbols, unsubscribe
+        from .websocket_manager import unsubscribe_from_symbols
+        
+        try:
+            run_async_task(unsubscribe_from_symbols(list(idle_symbols)))
+            logger.info(f"Unsubscribed from {', '.join(sorted(idle_symbols))} - no more active trades")
+        except Exception as e:
+            logger.error(f"Error unsubscribing from {idle_symbols}: {e}")
+
+
 # ---------------------------
 # Futures & Options Signals
 # ---------------------------
@@ -41,6 +104,8 @@ def handle_futures_trade_created(sender, instance, created, **kwargs):
         instance.margin_required = position_value / instance.leverage
         instance.margin_used = instance.margin_required
         instance.save(update_fields=['margin_required', 'margin_used'])
+        position_index.refresh([trade.pk])
+        request_position_refresh([trade.pk])
         
         # Subscribe to price updates
         from .websocket_manager import subscribe_to_symbol
@@ -82,27 +147,17 @@ def handle_options_trade_created(sender, instance, created, **kwargs):
 @receiver(pre_save, sender=Trade)
 def handle_trade_status_change(sender, instance, **kwargs):
     """Handle trade status changes"""
-    if instance.pk:  # Only for existing trades
+    # UUID primary keys are set before the first save, so check the state instead
+    if not instance._state.adding:  # Only for existing trades
         try:
             old_trade = Trade.objects.get(pk=instance.pk)
             
+            # Remember what the trade contributed to the portfolio before this save
+            instance._portfolio_contribution = PortfolioAggregator.contribution(old_trade)
+            
             # If trade is being closed, check if we need to unsubscribe
             if old_trade.status != 'CLOSED' and instance.status == 'CLOSED':
-                # Check if there are other open trades for this symbol
-                other_trades = Trade.objects.filter(
-                    asset_symbol=instance.asset_symbol,
-                    status__in=['OPEN', 'PARTIALLY_CLOSED']
-                ).exclude(pk=instance.pk).exists()
-                
-                if not other_trades:
-                    # No other trades for this symbol, unsubscribe
-                    from .websocket_manager import ws_manager
-                    
-                    try:
-                        run_async_task(ws_manager.unsubscribe_symbols([instance.asset_symbol]))
-                        logger.info(f"Unsubscribed from {instance.asset_symbol} - no more active trades")
-                    except Exception as e:
-                        logger.error(f"Error unsubscribing from {instance.asset_symbol}: {e}")
+                unsubscribe_idle_symbols([instance.asset_symbol], exclude_trade_ids=[instance.pk])
                     
         except Trade.DoesNotExist:
             pass
@@ -115,10 +170,96 @@ def handle_trade_status_change(sender, instance, **kwargs):
 def update_portfolio_on_trade_change(sender, instance, **kwargs):
     """Update portfolio when trade is modified"""
     try:
-        portfolio, _ = Portfolio.objects.get_or_create(user=instance.user)
-        portfolio.update_portfolio_metrics()
+        if incremental_portfolios_enabled():
+            PortfolioAggregator.apply_trade_change(
+                instance.user_id,
+                getattr(instance, '_portfolio_contribution', {}),
+                PortfolioAggregator.contribution(instance),
+            )
+        else:
+            portfolio, _ = Portfolio.objects.get_or_create(user=instance.user)
+            portfolio.update_portfolio_metrics()
+    except Exception as e:
+        logger.error(f"Error updating portfolio for user {instance.user_id}: {str(e)}")
+    
+    # Keep the feed's open-position index current: in place inside the feed process,
+    # through a position.refresh command from any other process
+    position_index.track(instance)
+    if instance.trade_type in MARKED_TRADE_TYPES:
+        request_position_refresh([instance.pk])
+
+
+@receiver(post_delete, sender=Trade)
+def update_portfolio_on_trade_delete(sender, instance, **kwargs):
+    """Remove a deleted trade's contribution from the portfolio"""
+    try:
+        if incremental_portfolios_enabled():
+            PortfolioAggregator.apply_trade_change(
+                instance.user_id,
+                PortfolioAggregator.contribution(instance),
+                {},
+                create_missing=False,
+            )
+        else:
+            portfolio = Portfolio.objects.filter(user_id=instance.user_id).first()
+            if portfolio:
+                portfolio.update_portfolio_metrics()
     except Exception as e:
-        logger.error(f"Error updating portfolio for user {instance.user.id}: {str(e)}")
+        logger.error(f"Error updating portfolio for user {instance.user_id}: {str(e)}")
+    
+    position_index.discard(instance.pk)
+    if instance.trade_type in MARKED_TRADE_TYPES:
+        request_position_refresh([instance.pk])
+
+
+# ---------------------------
+# Trade Event Bus Handlers
+# ---------------------------
+# Hot-path writes (mark-to-market, TradeMutations) bypass the model signals
+# above and publish to `trade_events`; each handler runs once per batch.
+@trade_events.subscribe('unrealized_changed')
+def apply_unrealized_changes(events):
+    """Carry the P&L change of a batch of price updates to portfolios"""
+    user_deltas = {}
+    for event in events:
+        for user_id, delta in event['user_deltas'].items():
+            user_deltas[user_id] = user_deltas.get(user_id, Decimal('0')) + delta
+    
+    if incremental_portfolios_enabled():
+        PortfolioAggregator.apply_unrealized_deltas(user_deltas)
+    else:
+        for user_id in user_deltas:
+            PortfolioAggregator.rebuild(user_id)
+
+
+@trade_events.subscribe('trade_changed')
+def apply_trade_changes(events):
+    """Apply the portfolio deltas of a batch of trade mutations, once per user"""
+    user_deltas = {}
+    for event in events:
+        delta = PortfolioAggregator.diff(event['old'], event['new'])
+        totals = user_deltas.setdefault(event['user_id'], {})
+        for field, change in delta.items():
+            totals[field] = totals.get(field, 0) + change
+    
+    for user_id, delta in user_deltas.items():
+        if incremental_portfolios_enabled():
+            PortfolioAggregator.apply_delta(user_id, {k: v for k, v in delta.items() if v})
+        else:
+            PortfolioAggregator.rebuild(user_id)
+    
+    position_index.refresh([event['trade_id'] for event in events])
+    request_position_refresh([event['trade_id'] for event in events])
+
+
+@trade_events.subscribe('status_changed')
+def handle_status_changes(events):
+    """Unsubscribe from symbols whose last open trade was closed in this batch"""
+    closed_symbols = {
+        event['symbol'] for event in events
+        if event['new_status'] == 'CLOSED' and event['old_status'] != 'CLOSED'
+    }
+    unsubscribe_idle_symbols(closed_symbols)
 
 
 @receiver(post_save, sender=TradeHistory)
@@ -132,6 +273,29 @@ def log_trade_action(sender, instance, created, **kwargs):
         )
 
 
+# ---------------------------
+# Pending Order Signals
+# ---------------------------
+@receiver(post_save, sender=PendingOrder)
+def handle_pending_order_saved(sender, instance, created, **kwargs):
+    """Keep the in-process order book current and make sure the symbol is streamed"""
+    order_books.track(instance)
+    
+    if created:
+        from .websocket_manager import subscribe_to_symbol
+        
+        try:
+            run_async_task(subscribe_to_symbol(instance.asset_symbol))
+            logger.info(
+                f"📒 {instance.order_type} {instance.direction} order {instance.id} resting - "
+                f"Symbol: {instance.asset_symbol}, Limit: {instance.limit_price}, Stop: {instance.stop_price}"
+            )
+        except Exception as e:
+            logger.error(f"Error subscribing to symbol {instance.asset_symbol}: {e}")
+    elif instance.status in ('CANCELLED', 'REJECTED'):
+        unsubscribe_idle_symbols([instance.asset_symbol])
+
+
 
 # from django.db.models.signals import post_save, post_delete
 # from django.dispatch import receiver
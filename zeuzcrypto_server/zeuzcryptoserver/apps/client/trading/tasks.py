@@ -1,8 +1,14 @@
 # tasks.py - Celery tasks for periodic checks
+import time
+from datetime import timedelta
 from asyncio.log import logger
+from asgiref.sync import async_to_sync
 from celery import shared_task
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Exists, OuterRef
 from django.utils import timezone
-from .models import Trade, FuturesDetails, OptionsDetails
+from .models import Trade, FuturesDetails, OptionsDetails, PendingOrder
 from decimal import Decimal
 
 
@@ -27,21 +33,32 @@ def check_expired_options(self):
             current_price = trade.current_price or option.strike_price
             
             try:
-                # Use the websocket manager's method to handle expiry
-                from .websocket_manager import ws_manager
-                
-                # Determine if option should be exercised
-                is_profitable = False
+                from .views import CloseTradeView
                 
+                # Cash-settle at intrinsic value: exercised LONG options pay
+                # out, everything else expires worthless
                 if option.option_type == 'CALL':
-                    is_profitable = current_price > option.strike_price
+                    intrinsic = current_price - option.strike_price
                 else:  # PUT
-                    is_profitable = current_price < option.strike_price
+                    intrinsic = option.strike_price - current_price
+                
+                settle_price = intrinsic if intrinsic > 0 and option.position == 'LONG' else Decimal('0')
+                
+                with transaction.atomic():
+                    locked = Trade.objects.select_for_update().filter(
+                        pk=trade.pk, status__in=['OPEN', 'PARTIALLY_CLOSED']
+                    ).first()
+                    if locked is None:
+                        continue
+                    result = CloseTradeView()._close_trade(locked, {
+                        'price': settle_price,
+                        'order_type': 'MARKET',
+                    })
                 
-                if is_profitable and option.position == 'LONG':
-                    ws_manager.exercise_option(trade, current_price)
-                else:
-                    ws_manager.expire_option(trade, current_price)
+                logger.info(
+                    f"Option {trade.id} {'exercised' if settle_price > 0 else 'expired worthless'} "
+                    f"at {settle_price}. Realized P&L: {result.get('realized_pnl')}"
+                )
                     
             except Exception as e:
                 logger.error(f"Error processing expired option {trade.id}: {e}")
@@ -55,45 +72,24 @@ def check_expired_options(self):
 
 @shared_task(bind=True, max_retries=3)
 def sync_active_symbols(self):
-    """Periodically sync subscribed symbols with active trades"""
+    """Periodically ask the feed ingestor to sync its symbols with active trades"""
     try:
-        from .websocket_manager import ws_manager
+        from .websocket_manager import send_feed_command
         
-        # Get active symbols
-        active_symbols = set()
-        trades = Trade.objects.filter(
-            status__in=['OPEN', 'PARTIALLY_CLOSED'],
-            trade_type__in=['FUTURES', 'OPTIONS']
-        ).values_list('asset_symbol', flat=True)
-        
-        active_symbols.update(trades)
-        
-        # Compare with currently subscribed
-        to_subscribe = active_symbols - ws_manager.subscribed_symbols
-        to_unsubscribe = ws_manager.subscribed_symbols - active_symbols
-        
-        if to_subscribe or to_unsubscribe:
-            try:
-                loop = asyncio.new_event_loop()
-                asyncio.set_event_loop(loop)
-                
-                if to_subscribe:
-                    loop.run_until_complete(ws_manager.subscribe_symbols(list(to_subscribe)))
-                    logger.info(f"Subscribed to new symbols: {to_subscribe}")
-                
-                if to_unsubscribe:
-                    loop.run_until_complete(ws_manager.unsubscribe_symbols(list(to_unsubscribe)))
-                    logger.info(f"Unsubscribed from inactive symbols: {to_unsubscribe}")
-                    
-                loop.close()
-                
-            except Exception as e:
-                logger.error(f"Error syncing symbols: {e}")
+        # The ingestor process owns the exchange connections; it resyncs its
+        # position index and reconciles subscriptions on this command
+        async_to_sync(send_feed_command)('feed.sync')
         
-        logger.info(
-            f"Symbol sync complete. Active: {len(active_symbols)}, "
-            f"Subscribed: {len(ws_manager.subscribed_symbols)}"
+        active_symbols = set(
+            Trade.objects.filter(
+                status__in=['OPEN', 'PARTIALLY_CLOSED'],
+                trade_type__in=['FUTURES', 'OPTIONS']
+            ).values_list('asset_symbol', flat=True)
         )
+        active_symbols.update(
+            PendingOrder.objects.filter(status='PENDING').values_list('asset_symbol', flat=True)
+        )
+        logger.info(f"Symbol sync requested. Active: {len(active_symbols)}")
         
     except Exception as e:
         logger.error(f"Error in sync_active_symbols task: {e}")
@@ -104,47 +100,73 @@ def sync_active_symbols(self):
 def monitor_all_margins(self):
     """Periodic check of all futures positions for margin calls"""
     try:
-        futures_trades = Trade.objects.filter(
-            status__in=['OPEN', 'PARTIALLY_CLOSED'],
-            trade_type='FUTURES'
-        ).select_related('futures_details')
+        from .websocket_manager import ws_manager
+        from .position_index import position_index
+        from .mark_to_market import MarkToMarketEngine
+        from .liquidation import MARGIN_CALL_RATIO
+        
+        # Positions come from memory when this process runs the feed
+        if position_index.warmed:
+            position_index.ensure_fresh()
+            positions = [
+                position
+                for symbol in position_index.symbols()
+                for position in position_index.get(symbol)
+                if position['trade_type'] == 'FUTURES'
+            ]
+        else:
+            positions = position_index.load(trade_type='FUTURES')
         
         count = 0
         margin_calls = 0
+        calls_by_symbol = {}
         
-        for trade in futures_trades:
+        for position in positions:
             count += 1
             
-            if not hasattr(trade, 'futures_details'):
+            margin_used = position['futures_details__margin_used']
+            margin_required = position['futures_details__margin_required']
+            if margin_used is None or margin_required is None:
                 continue
             
-            futures_details = trade.futures_details
-            current_price = trade.current_price or trade.average_price
+            current_price = position['current_price'] or position['average_price']
             
             # Calculate current P&L
-            if trade.direction == 'BUY':
-                pnl = (current_price - trade.average_price) * trade.remaining_quantity
-            else:
-                pnl = (trade.average_price - current_price) * trade.remaining_quantity
+            pnl = MarkToMarketEngine.compute_pnl(
+                position['direction'],
+                position['average_price'],
+                position['remaining_quantity'],
+                current_price,
+            )
             
             # Calculate remaining margin
-            remaining_margin = futures_details.margin_used + pnl
-            margin_call_threshold = futures_details.margin_required * Decimal('0.2')
+            remaining_margin = margin_used + pnl
+            margin_call_threshold = margin_required * MARGIN_CALL_RATIO
             
             # Log critical positions
             if remaining_margin <= margin_call_threshold * Decimal('2'):
                 logger.warning(
-                    f"⚠️ Low margin alert - Trade {trade.id}: "
-                    f"Symbol: {trade.asset_symbol}, Remaining: {remaining_margin}, "
+                    f"⚠️ Low margin alert - Trade {position['id']}: "
+                    f"Symbol: {position['asset_symbol']}, Remaining: {remaining_margin}, "
                     f"Threshold: {margin_call_threshold}"
                 )
             
             # Check for margin call
             if remaining_margin <= margin_call_threshold or remaining_margin <= 0:
-                from .websocket_manager import ws_manager
-                ws_manager.check_margin_call(trade, current_price)
+                calls_by_symbol.setdefault(position['asset_symbol'], []).append((current_price, {
+                    'trade_id': position['id'],
+                    'user_id': position['user_id'],
+                    'remaining_margin': remaining_margin,
+                    'margin_threshold': margin_call_threshold,
+                    'pnl': pnl,
+                }))
                 margin_calls += 1
         
+        for symbol, calls in calls_by_symbol.items():
+            async_to_sync(ws_manager.dispatch_margin_calls)(
+                symbol, calls[0][0], [margin_call for _, margin_call in calls]
+            )
+        
         logger.info(
             f"Margin check complete. Checked: {count}, Margin calls: {margin_calls}"
         )
@@ -154,6 +176,126 @@ def monitor_all_margins(self):
         raise self.retry(exc=e, countdown=60)
 
 
+def reconcile_wallets(chunk_size=1000, lag=60, now=None, sync_balances=None):
+    """
+    Verify every wallet against its ledger and checkpoint it, in chunks.
+
+    Wallets are walked in primary-key order (keyset, one short range per
+    chunk) and one query per chunk derives their ledger balances as of
+    ``now - lag``; the lag keeps entries of still-open transactions out of
+    the checkpoint. A wallet is flagged when the derived balance differs
+    from its newest entry's ``balance_after`` or, when it had no entries
+    since the cutoff, from ``UserWallet.balance``. Healthy wallets with new
+    entries get a checkpoint.
+
+    ``sync_balances`` (default: ledger mode) copies the derived balance into
+    ``UserWallet.balance`` instead of checking it; with ``lag=0`` and order
+    flow paused, that rebuilds the stored balances before ledger mode is
+    switched off again.
+    """
+    from apps.accounts.models import UserWallet, WalletTransaction, WalletCheckpoint
+    from .wallet_services import WalletService
+
+    now = now or timezone.now()
+    upto = now - timedelta(seconds=lag)
+    if sync_balances is None:
+        sync_balances = WalletService.ledger_mode()
+    started = time.perf_counter()
+    wallets = checkpoints = synced = chunks = 0
+    mismatches = []
+    last_pk = None
+
+    newer_entries = WalletTransaction.objects.filter(user=OuterRef('user'), created_at__gt=upto)
+
+    while True:
+        queryset = UserWallet.objects.order_by('pk')
+        if last_pk is not None:
+            queryset = queryset.filter(pk__gt=last_pk)
+        rows = list(
+            WalletService.annotate_ledger(queryset, upto)
+            .annotate(ledger_pending=Exists(newer_entries))
+            .values(
+                'pk', 'user_id', 'balance', 'ledger_balance', 'ledger_checkpoint',
+                'ledger_entries', 'ledger_last_after', 'ledger_pending',
+            )[:chunk_size]
+        )
+        if not rows:
+            break
+        last_pk = rows[-1]['pk']
+
+        new_checkpoints = []
+        refreshed = []
+        for row in rows:
+            expected = Decimal(str(row['ledger_balance'])).quantize(Decimal('0.01'))
+            if row['ledger_entries'] and row['ledger_last_after'] != expected:
+                found = row['ledger_last_after']
+            elif not sync_balances and not row['ledger_pending'] and row['balance'] != expected:
+                found = row['balance']
+            else:
+                found = None
+
+            if found is not None:
+                mismatches.append({'user_id': str(row['user_id']), 'ledger': str(expected), 'found': str(found)})
+                continue
+            if row['ledger_entries'] or row['ledger_checkpoint'] is None:
+                new_checkpoints.append(WalletCheckpoint(
+                    user_id=row['user_id'], balance=expected, as_of=upto, entries=row['ledger_entries']
+                ))
+            if sync_balances and row['balance'] != expected:
+                refreshed.append(UserWallet(pk=row['pk'], balance=expected))
+
+        with transaction.atomic():
+            WalletCheckpoint.objects.bulk_create(new_checkpoints, batch_size=chunk_size)
+            UserWallet.objects.bulk_update(refreshed, ['balance'], batch_size=chunk_size)
+
+        wallets += len(rows)
+        checkpoints += len(new_checkpoints)
+        synced += len(refreshed)
+        chunks += 1
+
+        if len(rows) < chunk_size:
+            break
+
+    for mismatch in mismatches[:20]:
+        logger.error(
+            f"Wallet of user {mismatch['user_id']} off its ledger: "
+            f"ledger {mismatch['ledger']}, found {mismatch['found']}"
+        )
+
+    return {
+        'wallets': wallets,
+        'checkpoints': checkpoints,
+        'synced': synced,
+        'mismatched': len(mismatches),
+        'mismatches': mismatches[:100],
+        'as_of': upto.isoformat(),
+        'chunks': chunks,
+        'duration_ms': round((time.perf_counter() - started) * 1000, 1),
+    }
+
+
+@shared_task(bind=True, max_retries=3)
+def checkpoint_wallets(self):
+    """Reconcile every wallet with its transaction ledger and checkpoint the balances"""
+    try:
+        trading_settings = getattr(settings, 'TRADING_SETTINGS', {})
+        result = reconcile_wallets(
+            chunk_size=trading_settings.get('WALLET_CHECKPOINT_CHUNK_SIZE', 1000),
+            lag=trading_settings.get('WALLET_CHECKPOINT_LAG', 60),
+        )
+
+        logger.info(
+            f"Wallet reconciliation complete. Wallets: {result['wallets']}, "
+            f"checkpoints: {result['checkpoints']}, mismatched: {result['mismatched']} "
+            f"({result['chunks']} chunks, {result['duration_ms']} ms)"
+        )
+        return result
+
+    except Exception as e:
+        logger.error(f"Error in checkpoint_wallets task: {e}")
+        raise self.retry(exc=e, countdown=60)
+
+
 
 
 # # tasks.py - Celery tasks for background processing
@@ -1,3 +1,319 @@
-from django.test import TestCase
+import itertools
+from datetime import timedelta
+from decimal import Decimal
 
-# Create your tests here.
+from asgiref.testing import ApplicationCommunicator
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+
+from apps.accounts.models import User, UserWallet, WalletTransaction, WalletCheckpoint
+from .liquidation import LiquidationEngine, TriggerLevels
+from .order_book import SymbolOrderBook
+from .tasks import reconcile_wallets
+from .wallet_services import WalletService
+from .ws_auth import BearerOriginValidator
+
+
+def ledger_mode(enabled=True):
+    return override_settings(TRADING_SETTINGS={**settings.TRADING_SETTINGS, 'WALLET_LEDGER_MODE': enabled})
+
+
+def auto_liquidate(enabled=True):
+    return override_settings(TRADING_SETTINGS={**settings.TRADING_SETTINGS, 'AUTO_LIQUIDATE': enabled})
+
+
+def futures_position(trade_id, direction, quantity='1', average_price='100', margin='20'):
+    """Position record as the index keeps it: margin call at 20% of ``margin``, liquidation at zero"""
+    return {
+        'id': trade_id,
+        'user_id': 1,
+        'asset_symbol': 'BTCUSD',
+        'trade_type': 'FUTURES',
+        'direction': direction,
+        'remaining_quantity': Decimal(quantity),
+        'average_price': Decimal(average_price),
+        'unrealized_pnl': Decimal('0'),
+        'current_price': Decimal(average_price),
+        'futures_details__margin_used': Decimal(margin),
+        'futures_details__margin_required': Decimal(margin),
+    }
+
+
+class WalletSettleTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(email='trader@example.com', mobile='9000000001', password='pw12345678')
+        UserWallet.objects.filter(user=self.user).update(balance=Decimal('100.00'))
+
+    def entries(self):
+        return list(
+            WalletTransaction.objects.filter(user=self.user).order_by('created_at')
+            .values_list('transaction_type', 'amount', 'balance_before', 'balance_after')
+        )
+
+    def test_settle_applies_net_and_chains_entries(self):
+        result = WalletService.settle(self.user, [
+            WalletService.leg('UNBLOCK', 40, 'release margin'),
+            WalletService.leg('DEBIT', 25, 'realized loss'),
+        ])
+
+        self.assertEqual(result['balance'], Decimal('115.00'))
+        self.assertEqual(result['net'], Decimal('15.00'))
+        self.assertEqual(UserWallet.objects.get(user=self.user).balance, Decimal('115.00'))
+        self.assertEqual(self.entries(), [
+            ('UNBLOCK', Decimal('40.00'), Decimal('100.00'), Decimal('140.00')),
+            ('DEBIT', Decimal('25.00'), Decimal('140.00'), Decimal('115.00')),
+        ])
+
+    def test_uncapped_debit_beyond_balance_is_rejected(self):
+        with self.assertRaises(ValidationError):
+            WalletService.settle(self.user, [WalletService.leg('BLOCK', 150, 'margin')])
+
+        self.assertEqual(UserWallet.objects.get(user=self.user).balance, Decimal('100.00'))
+        self.assertEqual(self.entries(), [])
+
+    def test_capped_loss_stops_at_zero(self):
+        result = WalletService.settle(self.user, [
+            WalletService.leg('UNBLOCK', 20, 'release margin'),
+            WalletService.leg('DEBIT', 200, 'futures loss', cap_at_balance=True),
+        ])
+
+        self.assertEqual(result['balance'], Decimal('0.00'))
+        self.assertEqual(result['shortfall'], Decimal('80.00'))
+        self.assertEqual(self.entries()[-1][:2], ('DEBIT', Decimal('120.00')))
+
+    def test_ledger_mode_leaves_wallet_row_untouched(self):
+        with ledger_mode():
+            WalletService.settle(self.user, [WalletService.leg('BLOCK', 30, 'margin')])
+            result = WalletService.settle(self.user, [
+                WalletService.leg('UNBLOCK', 30, 'release margin'),
+                WalletService.leg('DEBIT', 500, 'futures loss', cap_at_balance=True),
+            ])
+
+            self.assertEqual(result['balance'], Decimal('0.00'))
+            self.assertEqual(result['shortfall'], Decimal('400.00'))
+            self.assertEqual(WalletService.get_balance(self.user), Decimal('0.00'))
+            with self.assertRaises(ValidationError):
+                WalletService.settle(self.user, [WalletService.leg('DEBIT', 1, 'fee')])
+
+        self.assertEqual(UserWallet.objects.get(user=self.user).balance, Decimal('100.00'))
+        self.assertEqual(self.entries()[-1][3], Decimal('0.00'))
+
+
+class ReconcileWalletsTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(email='ledger@example.com', mobile='9000000002', password='pw12345678')
+        UserWallet.objects.filter(user=self.user).update(balance=Decimal('100.00'))
+
+    def test_checkpoints_healthy_wallets(self):
+        WalletService.settle(self.user, [WalletService.leg('CREDIT', 50, 'deposit')])
+
+        result = reconcile_wallets(lag=0, now=timezone.now() + timedelta(seconds=1))
+
+        self.assertEqual(result['mismatched'], 0)
+        self.assertEqual(result['checkpoints'], 1)
+        checkpoint = WalletCheckpoint.objects.get(user=self.user)
+        self.assertEqual((checkpoint.balance, checkpoint.entries), (Decimal('150.00'), 1))
+
+        # Nothing new since the checkpoint: verified again but not re-checkpointed
+        result = reconcile_wallets(lag=0, now=timezone.now() + timedelta(seconds=2))
+        self.assertEqual((result['mismatched'], result['checkpoints']), (0, 0))
+
+    def test_flags_wallet_off_its_ledger(self):
+        WalletService.settle(self.user, [WalletService.leg('DEBIT', 30, 'buy')])
+        UserWallet.objects.filter(user=self.user).update(balance=Decimal('999.00'))
+
+        result = reconcile_wallets(lag=0, now=timezone.now() + timedelta(seconds=1))
+
+        self.assertEqual(result['mismatched'], 1)
+        self.assertEqual(result['mismatches'][0]['ledger'], '70.00')
+        self.assertEqual(result['mismatches'][0]['found'], '999.00')
+        self.assertFalse(WalletCheckpoint.objects.filter(user=self.user).exists())
+
+    def test_ledger_mode_syncs_stored_balance(self):
+        with ledger_mode():
+            WalletService.settle(self.user, [WalletService.leg('DEBIT', 30, 'buy')])
+            self.assertEqual(UserWallet.objects.get(user=self.user).balance, Decimal('100.00'))
+
+            result = reconcile_wallets(lag=0, now=timezone.now() + timedelta(seconds=1))
+
+        self.assertEqual((result['mismatched'], result['synced']), (0, 1))
+        self.assertEqual(UserWallet.objects.get(user=self.user).balance, Decimal('70.00'))
+
+
+class TriggerLevelsTests(SimpleTestCase):
+    def test_long_levels_pop_at_or_above_the_mark(self):
+        levels = TriggerLevels(triggers_below=True)
+        for price, trade_id in [('90', 'a'), ('80', 'b'), ('85', 'c')]:
+            levels.insert(Decimal(price), trade_id)
+
+        self.assertEqual(levels.pop_crossed(Decimal('86')), ['a'])
+        self.assertEqual(levels.pop_crossed(Decimal('85')), ['c'])
+        self.assertEqual(levels.pop_crossed(Decimal('85')), [])
+        self.assertEqual(levels.prices, [Decimal('80')])
+
+    def test_short_levels_pop_at_or_below_the_mark(self):
+        levels = TriggerLevels(triggers_below=False)
+        for price, trade_id in [('120', 'x'), ('110', 'y'), ('115', 'z')]:
+            levels.insert(Decimal(price), trade_id)
+        self.assertTrue(levels.remove(Decimal('115'), 'z'))
+        self.assertFalse(levels.remove(Decimal('115'), 'z'))
+
+        self.assertEqual(levels.pop_crossed(Decimal('118')), ['y'])
+        self.assertEqual(levels.pop_crossed(Decimal('130')), ['x'])
+        self.assertEqual(len(levels), 0)
+
+
+class LiquidationEngineTests(SimpleTestCase):
+    def setUp(self):
+        self.engine = LiquidationEngine()
+
+    def check(self, mark_price, *positions):
+        result = self.engine.check('BTCUSD', Decimal(mark_price), list(positions))
+        return (
+            [call['trade_id'] for call in result['margin_calls']],
+            [position['id'] for position in result['liquidations']],
+        )
+
+    def test_compute_levels(self):
+        self.assertEqual(
+            LiquidationEngine.compute_levels(futures_position('long', 'BUY', quantity='2')),
+            {'margin_call': Decimal('92'), 'liquidation': Decimal('90')},
+        )
+        self.assertEqual(
+            LiquidationEngine.compute_levels(futures_position('short', 'SELL')),
+            {'margin_call': Decimal('116'), 'liquidation': Decimal('120')},
+        )
+        self.assertEqual(LiquidationEngine.compute_levels(futures_position('flat', 'BUY', quantity='0')), {})
+
+    def test_levels_are_crossed_once(self):
+        long, short = futures_position('long', 'BUY'), futures_position('short', 'SELL')
+
+        with auto_liquidate():
+            self.assertEqual(self.check('100', long, short), ([], []))
+            self.assertEqual(self.check('84', long, short), (['long'], []))
+            self.assertEqual(self.check('83', long, short), ([], []))
+            self.assertEqual(self.check('80', long, short), ([], ['long']))
+            self.assertEqual(self.check('79', long, short), ([], []))
+            # A gap through both levels fires both at once
+            self.assertEqual(self.check('125', long, short), (['short'], ['short']))
+            self.assertEqual(self.check('125', long, short), ([], []))
+
+    def test_fired_levels_rearm_when_the_position_changes(self):
+        long = futures_position('long', 'BUY')
+
+        with auto_liquidate(False):
+            self.assertEqual(self.check('79', long), (['long'], ['long']))
+            # Nothing closes it: the warning is not repeated while the position stays the same
+            self.assertEqual(self.check('78', long), ([], []))
+            self.assertEqual(self.check('100', long), ([], []))
+            self.assertEqual(self.check('79', long), ([], []))
+
+            topped_up = futures_position('long', 'BUY', margin='40')  # call at 68, liquidation at 60
+            self.assertEqual(self.check('79', topped_up), ([], []))
+            self.assertEqual(self.check('68', topped_up), (['long'], []))
+            self.assertEqual(self.check('60', topped_up), ([], ['long']))
+
+    def test_closed_positions_drop_their_levels(self):
+        long = futures_position('long', 'BUY')
+        self.check('100', long)
+
+        self.assertEqual(self.check('79'), ([], []))
+        self.assertEqual(self.engine.stats()['positions'], 0)
+
+
+def resting_order(order_id, order_type, direction, limit_price=None, stop_price=None):
+    return {
+        'id': order_id,
+        'user_id': 1,
+        'asset_symbol': 'BTCUSD',
+        'direction': direction,
+        'order_type': order_type,
+        'limit_price': Decimal(limit_price) if limit_price else None,
+        'stop_price': Decimal(stop_price) if stop_price else None,
+        'triggered': False,
+    }
+
+
+class SymbolOrderBookTests(SimpleTestCase):
+    def setUp(self):
+        self.book = SymbolOrderBook(itertools.count())
+
+    def match(self, mark_price):
+        fills, triggered = self.book.match(Decimal(mark_price))
+        return [record['id'] for record in fills], [record['id'] for record in triggered]
+
+    def test_limit_orders_fill_at_or_through_their_price(self):
+        self.book.add(resting_order('bid', 'LIMIT', 'BUY', limit_price='95'))
+        self.book.add(resting_order('ask', 'LIMIT', 'SELL', limit_price='105'))
+
+        self.assertEqual(self.match('100'), ([], []))
+        self.assertEqual(self.match('95'), (['bid'], []))
+        self.assertEqual(self.match('106'), (['ask'], []))
+        self.assertEqual(len(self.book), 0)
+
+    def test_stop_orders_fill_once_the_stop_is_hit(self):
+        self.book.add(resting_order('stop-buy', 'STOP', 'BUY', stop_price='110'))
+        self.book.add(resting_order('stop-sell', 'STOP', 'SELL', stop_price='90'))
+
+        self.assertEqual(self.match('100'), ([], []))
+        self.assertEqual(self.match('110'), (['stop-buy'], []))
+        self.assertEqual(self.match('89'), (['stop-sell'], []))
+
+    def test_stop_limit_orders_rest_as_limits_once_triggered(self):
+        self.book.add(resting_order('buy', 'STOP_LIMIT', 'BUY', limit_price='108', stop_price='110'))
+        self.book.add(resting_order('sell', 'STOP_LIMIT', 'SELL', limit_price='92', stop_price='90'))
+
+        self.assertEqual(self.match('111'), ([], ['buy']))
+        self.assertTrue(self.book.orders['buy']['triggered'])
+        self.assertEqual(self.match('111'), ([], []))
+        self.assertEqual(self.match('108'), (['buy'], []))
+
+        self.assertEqual(self.match('89'), ([], ['sell']))
+        self.assertEqual(self.match('92'), (['sell'], []))
+
+    def test_stop_limit_fills_on_the_triggering_tick_inside_its_limit(self):
+        self.book.add(resting_order('buy', 'STOP_LIMIT', 'BUY', limit_price='112', stop_price='110'))
+
+        self.assertEqual(self.match('111'), (['buy'], ['buy']))
+
+    def test_replaced_and_removed_orders_are_skipped(self):
+        self.book.add(resting_order('moved', 'LIMIT', 'BUY', limit_price='99'))
+        self.book.add(resting_order('moved', 'LIMIT', 'BUY', limit_price='90'))
+        self.book.add(resting_order('cancelled', 'LIMIT', 'BUY', limit_price='99'))
+        self.book.remove('cancelled')
+
+        self.assertEqual(self.match('95'), ([], []))
+        self.assertEqual(self.match('90'), (['moved'], []))
+
+
+async def accept_websocket(scope, receive, send):
+    await receive()
+    await send({'type': 'websocket.accept'})
+
+
+@override_settings(CHANNEL_LAYERS={'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'}})
+class BearerOriginValidatorTests(SimpleTestCase):
+    application = BearerOriginValidator(accept_websocket, ['https://app.example.com'])
+
+    async def connects(self, headers):
+        communicator = ApplicationCommunicator(self.application, {
+            'type': 'websocket', 'path': '/ws/trading/', 'query_string': b'', 'headers': headers,
+        })
+        await communicator.send_input({'type': 'websocket.connect'})
+        response = await communicator.receive_output()
+        await communicator.send_input({'type': 'websocket.disconnect', 'code': 1000})
+        await communicator.wait()
+        return response['type'] == 'websocket.accept'
+
+    async def test_browser_handshakes_need_an_allowed_origin(self):
+        self.assertTrue(await self.connects([(b'origin', b'https://app.example.com')]))
+        self.assertFalse(await self.connects([(b'origin', b'https://evil.example.com')]))
+        self.assertFalse(await self.connects([
+            (b'origin', b'https://evil.example.com'), (b'authorization', b'Bearer token'),
+        ]))
+
+    async def test_bearer_clients_connect_without_an_origin(self):
+        self.assertTrue(await self.connects([(b'authorization', b'Bearer token')]))
+        self.assertFalse(await self.connects([]))
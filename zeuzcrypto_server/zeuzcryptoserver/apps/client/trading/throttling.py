@@ -0,0 +1,7 @@
+# throttling.py
+from apps.caching import UserSlidingWindowThrottle
+
+
+class OrderRateThrottle(UserSlidingWindowThrottle):
+    """Order placements per user"""
+    scope = "orders"
@@ -0,0 +1,72 @@
+# tick_publisher.py
+import re
+import time
+import logging
+from decimal import Decimal
+from channels.layers import get_channel_layer
+
+logger = logging.getLogger(__name__)
+
+TICKER_GROUP_PREFIX = 'ticker_'
+FEED_CONTROL_GROUP = 'feed_control'
+
+
+def ticker_group(symbol: str) -> str:
+    """Channel layer group carrying the ticks of one symbol"""
+    # Group names may only contain ASCII alphanumerics, hyphens, underscores and periods
+    return TICKER_GROUP_PREFIX + re.sub(r'[^A-Za-z0-9_.-]', '_', symbol)[:90]
+
+
+def normalize_ticker(ticker_data: dict) -> dict:
+    """JSON-safe ticker frame (Decimals as strings)"""
+    return {
+        field: str(value) if isinstance(value, Decimal) else value
+        for field, value in ticker_data.items()
+    }
+
+
+class TickPublisher:
+    """
+    Publishes normalized ticker frames to per-symbol channel layer groups.
+
+    Web workers, Celery workers and websocket consumers join
+    ``ticker_group(symbol)`` and receive ``{"type": "ticker.update", ...}``
+    messages instead of opening their own exchange connections. Frames are
+    published at the conflation cadence, so each group sees at most one
+    message per symbol per flush.
+    """
+
+    def __init__(self):
+        self.channel_layer = None
+
+        # Counters
+        self.published = 0
+        self.errors = 0
+        self.last_published_at = None
+
+    async def publish(self, ticker_data: dict):
+        if self.channel_layer is None:
+            self.channel_layer = get_channel_layer()
+            if self.channel_layer is None:
+                return
+
+        try:
+            await self.channel_layer.group_send(
+                ticker_group(ticker_data['symbol']),
+                {
+                    'type': 'ticker.update',
+                    **normalize_ticker(ticker_data),
+                }
+            )
+            self.published += 1
+            self.last_published_at = time.time()
+        except Exception as e:
+            self.errors += 1
+            logger.error(f"Error publishing ticker for {ticker_data.get('symbol')}: {e}")
+
+    def stats(self) -> dict:
+        return {
+            'published': self.published,
+            'errors': self.errors,
+            'last_published_at': self.last_published_at,
+        }
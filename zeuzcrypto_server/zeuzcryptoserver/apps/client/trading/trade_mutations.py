@@ -0,0 +1,102 @@
+# trade_mutations.py
+import logging
+from decimal import Decimal
+from django.db import transaction
+from django.utils import timezone
+from .models import Trade
+from .events import trade_events
+from .mark_to_market import mark_trades
+from .position_index import position_index, OPEN_STATUSES, MARKED_TRADE_TYPES
+from .portfolio_aggregates import PortfolioAggregator
+
+logger = logging.getLogger(__name__)
+
+
+class TradeMutations:
+    """
+    Explicit write API for Trade rows on hot paths.
+
+    Rows are written with single UPDATE statements, so no model signals fire
+    and nothing is re-read from the database. Closes, partial closes and
+    futures position changes go through ``update_trade``; price marks through
+    ``apply_prices``. Portfolio and subscription side effects are published
+    to ``trade_events`` and handled once per batch:
+
+    - ``unrealized_changed``: symbol, user_deltas
+    - ``trade_changed``: trade_id, user_id, old, new (portfolio contributions)
+    - ``status_changed``: trade_id, user_id, symbol, old_status, new_status
+    """
+
+    @staticmethod
+    def apply_prices(prices: dict, user=None) -> list:
+        """Re-mark every open trade of the given symbols (one locked UPDATE ... RETURNING per symbol)"""
+        updated_trades = []
+
+        with trade_events.batch():
+            for symbol, price in prices.items():
+                price = Decimal(str(price))
+                trades = Trade.objects.filter(asset_symbol=symbol, status__in=OPEN_STATUSES)
+                if user is not None:
+                    trades = trades.filter(user=user)
+
+                # Deltas come from the P&L each row held when the UPDATE replaced it
+                with transaction.atomic():
+                    positions, previous_pnl = mark_trades(trades, price, timezone.now(), touch=True)
+                if not positions:
+                    continue
+
+                user_deltas = {}
+                for position in positions:
+                    old_pnl = previous_pnl[position['id']] or Decimal('0')
+                    new_pnl = position['unrealized_pnl']
+                    if new_pnl != old_pnl:
+                        user_id = position['user_id']
+                        user_deltas[user_id] = user_deltas.get(user_id, Decimal('0')) + (new_pnl - old_pnl)
+
+                    updated_trades.append({
+                        'trade_id': position['id'],
+                        'symbol': symbol,
+                        'price': price,
+                        'old_pnl': old_pnl,
+                        'new_pnl': new_pnl,
+                        'price_change': new_pnl - old_pnl,
+                    })
+
+                trade_events.publish('unrealized_changed', symbol=symbol, user_deltas=user_deltas)
+                position_index.replace_records(
+                    [position['id'] for position in positions],
+                    [position for position in positions if position['trade_type'] in MARKED_TRADE_TYPES],
+                )
+
+        return updated_trades
+
+    @staticmethod
+    def update_trade(trade: Trade, **changes) -> Trade:
+        """Write changed fields of a loaded trade and publish its side effects"""
+        old_contribution = PortfolioAggregator.contribution(trade)
+        old_status = trade.status
+
+        changes['updated_at'] = timezone.now()
+        for field, value in changes.items():
+            setattr(trade, field, value)
+
+        Trade.objects.filter(pk=trade.pk).update(**changes)
+
+        trade_events.publish(
+            'trade_changed',
+            trade_id=trade.pk,
+            user_id=trade.user_id,
+            old=old_contribution,
+            new=PortfolioAggregator.contribution(trade),
+        )
+        if old_status != trade.status:
+            trade_events.publish(
+                'status_changed',
+                trade_id=trade.pk,
+                user_id=trade.user_id,
+                symbol=trade.asset_symbol,
+                old_status=old_status,
+                new_status=trade.status,
+            )
+
+        return trade
@@ -8,6 +8,7 @@ from .views import (
     PortfolioViewSet,
     GetOpenTradeBySymbol,
     PlaceOrderView,
+    PendingOrderViewSet,
     CloseTradeView,
     PartialCloseView,
     PortfolioSummaryView,
@@ -27,6 +28,7 @@ from .viewss.signal_views import (
 router = DefaultRouter()
 router.register(r"trades", TradeViewSet, basename="trades")
 router.register(r"portfolio", PortfolioViewSet, basename="portfolio")
+router.register(r"orders", PendingOrderViewSet, basename="orders")
 
 urlpatterns = [
     path("api/trading/", include(router.urls)),
@@ -11,14 +11,14 @@ from django.db.models import Q, Sum
 from django.utils import timezone
 from django.core.exceptions import ValidationError
 from decimal import Decimal
-from datetime import datetime, timedelta
+from datetime import date, datetime, timedelta
 import uuid
 import logging
 
 # Initialize logger
 logger = logging.getLogger(__name__)
 
-from .models import Trade, FuturesDetails, OptionsDetails, TradeHistory, Portfolio
+from .models import Trade, FuturesDetails, OptionsDetails, TradeHistory, Portfolio, PendingOrder
 from .serializers import (
     TradeSerializer,
     PlaceOrderSerializer,
@@ -30,8 +30,14 @@ from .serializers import (
     RiskCheckSerializer,
     UpdatePricesSerializer,
     TradeHistorySerializer,
+    PendingOrderSerializer,
 )
 from .wallet_services import WalletService
+from .portfolio_aggregates import get_portfolio
+from .position_index import OPEN_STATUSES
+from .trade_mutations import TradeMutations
+from .throttling import OrderRateThrottle
+from apps.caching.order_gate import order_gate
 from apps.permission.permissions import   HasActiveSubscription
 
 # class TradeViewSet(viewsets.ModelViewSet):
@@ -69,26 +75,84 @@ class TradeViewSet(viewsets.ModelViewSet):
         return Response({"error": "Current price is required"}, status=400)
 
 
+class PendingOrderViewSet(viewsets.ReadOnlyModelViewSet):
+    serializer_class = PendingOrderSerializer
+    permission_classes = [IsAuthenticated, HasActiveSubscription]
+
+    def get_queryset(self):
+        orders = PendingOrder.objects.filter(user=self.request.user).order_by("-created_at")
+        order_status = self.request.query_params.get("status")
+        if order_status:
+            orders = orders.filter(status=order_status.upper())
+        return orders
+
+    @action(detail=True, methods=["post"])
+    def cancel(self, request, pk=None):
+        with transaction.atomic():
+            order = PendingOrder.objects.select_for_update().filter(
+                pk=pk, user=request.user
+            ).first()
+            if order is None:
+                return Response({"error": "Order not found"}, status=status.HTTP_404_NOT_FOUND)
+            if order.status != "PENDING":
+                return Response(
+                    {"error": f"Order is already {order.status.lower()}"},
+                    status=status.HTTP_400_BAD_REQUEST,
+                )
+
+            order.status = "CANCELLED"
+            order.save(update_fields=["status", "updated_at"])
+
+        return Response(PendingOrderSerializer(order).data)
+
+
 class PlaceOrderView(APIView):
     permission_classes = [IsAuthenticated, HasActiveSubscription]
+    throttle_classes = [OrderRateThrottle]
 
     def post(self, request):
         serializer = PlaceOrderSerializer(data=request.data)
         if serializer.is_valid():
-            try:
-                with transaction.atomic():
-                    result = self._process_order(
-                        request.user, serializer.validated_data
-                    )
-                    return Response(result, status=status.HTTP_201_CREATED)
-            except ValidationError as e:
-                logger.error(f"Validation error: {str(e)}")
-                return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
-            except Exception as e:
-                logger.error(f"Error processing order: {str(e)}", exc_info=True)
-                return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+            if serializer.validated_data["order_type"] != "MARKET":
+                order = self._rest_order(request.user, serializer.validated_data)
+                return Response(
+                    PendingOrderSerializer(order).data, status=status.HTTP_201_CREATED
+                )
+            with order_gate.guard(request.user.pk, serializer.validated_data["asset_symbol"]):
+                try:
+                    with transaction.atomic():
+                        result = self._process_order(
+                            request.user, serializer.validated_data
+                        )
+                        return Response(result, status=status.HTTP_201_CREATED)
+                except ValidationError as e:
+                    logger.error(f"Validation error: {str(e)}")
+                    return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+                except Exception as e:
+                    logger.error(f"Error processing order: {str(e)}", exc_info=True)
+                    return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
+    def _rest_order(self, user, data):
+        """Queue a LIMIT / STOP / STOP_LIMIT order; the price feed fills it"""
+        order_type = data["order_type"]
+        order_data = {
+            field: str(value) if isinstance(value, (Decimal, datetime, date)) else value
+            for field, value in data.items()
+        }
+
+        return PendingOrder.objects.create(
+            user=user,
+            asset_symbol=data["asset_symbol"],
+            trade_type=data["trade_type"],
+            direction=data["direction"],
+            order_type=order_type,
+            quantity=data["quantity"],
+            limit_price=data["price"] if order_type in ("LIMIT", "STOP_LIMIT") else None,
+            stop_price=data.get("stop_price") if order_type in ("STOP", "STOP_LIMIT") else None,
+            order_data=order_data,
+        )
+
     def _process_order(self, user, data):
         """Main order processing logic"""
         trade_type = data["trade_type"]
@@ -114,8 +178,9 @@ class PlaceOrderView(APIView):
         price = data["price"]
         holding_type = data["holding_type"]
 
-        # FIND EXISTING POSITIONS (only same holding_type and same direction)
-        existing_trade = Trade.objects.filter(
+        # FIND EXISTING POSITIONS (only same holding_type and same direction),
+        # locked so a concurrent close cannot race the averaging or covering
+        existing_trade = Trade.objects.select_for_update(of=("self",)).filter(
             user=user,
             asset_symbol=asset_symbol,
             trade_type="SPOT",
@@ -425,7 +490,7 @@ class PlaceOrderView(APIView):
         """Handle futures trading logic"""
         asset_symbol = data["asset_symbol"]
 
-        existing_trade = Trade.objects.filter(
+        existing_trade = Trade.objects.select_for_update(of=("self",)).filter(
             user=user,
             asset_symbol=asset_symbol,
             trade_type="FUTURES",
@@ -448,29 +513,32 @@ class PlaceOrderView(APIView):
             new_value = quantity * price
             total_quantity = existing_trade.remaining_quantity + quantity
 
-            existing_trade.average_price = (old_value + new_value) / total_quantity
-            existing_trade.remaining_quantity = total_quantity
-            existing_trade.total_quantity += quantity
-            existing_trade.save()
-
+            changes = {
+                "average_price": (old_value + new_value) / total_quantity,
+                "remaining_quantity": total_quantity,
+                "total_quantity": existing_trade.total_quantity + quantity,
+            }
             action = "INCREASE_POSITION"
         else:
             if quantity > existing_trade.remaining_quantity:
-                remaining_qty = quantity - existing_trade.remaining_quantity
-                existing_trade.remaining_quantity = remaining_qty
-                existing_trade.direction = direction
-                existing_trade.average_price = price
+                changes = {
+                    "remaining_quantity": quantity - existing_trade.remaining_quantity,
+                    "direction": direction,
+                    "average_price": price,
+                }
                 action = "FLIP_POSITION"
             elif quantity == existing_trade.remaining_quantity:
-                existing_trade.remaining_quantity = Decimal("0")
-                existing_trade.status = "CLOSED"
-                existing_trade.closed_at = timezone.now()
+                changes = {
+                    "remaining_quantity": Decimal("0"),
+                    "status": "CLOSED",
+                    "closed_at": timezone.now(),
+                }
                 action = "CLOSE_POSITION"
             else:
-                existing_trade.remaining_quantity -= quantity
+                changes = {"remaining_quantity": existing_trade.remaining_quantity - quantity}
                 action = "REDUCE_POSITION"
 
-            existing_trade.save()
+        TradeMutations.update_trade(existing_trade, **changes)
 
         TradeHistory.objects.create(
             trade=existing_trade,
@@ -589,7 +657,7 @@ class PlaceOrderView(APIView):
         expiry_date = data["expiry_date"]
         direction = data["direction"]
 
-        existing_trade = Trade.objects.filter(
+        existing_trade = Trade.objects.select_for_update(of=("self",)).filter(
             user=user,
             asset_symbol=asset_symbol,
             trade_type="OPTIONS",
@@ -734,8 +802,7 @@ class PlaceOrderView(APIView):
 
     def _update_portfolio(self, user):
         """Update user portfolio metrics"""
-        portfolio, created = Portfolio.objects.get_or_create(user=user)
-        portfolio.update_portfolio_metrics()
+        get_portfolio(user)
 
 
 # =====================================================================
@@ -745,26 +812,40 @@ class PlaceOrderView(APIView):
 
 class PartialCloseView(APIView):
     permission_classes = [IsAuthenticated, HasActiveSubscription]
+    throttle_classes = [OrderRateThrottle]
 
     def post(self, request, trade_id):
+        symbol = Trade.objects.filter(id=trade_id, user=request.user).values_list(
+            "asset_symbol", flat=True
+        ).first()
+        if symbol is None:
+            return Response({"error": "Trade not found"}, status=404)
+
+        # The gate only throttles; _post locks the trade row itself
+        with order_gate.guard(request.user.pk, symbol):
+            return self._post(request, trade_id)
+
+    def _post(self, request, trade_id):
         try:
-            trade = Trade.objects.get(id=trade_id, user=request.user)
+            with transaction.atomic():
+                # Lock the row: a concurrent close, liquidation or expiry waits here
+                trade = Trade.objects.select_for_update().get(id=trade_id, user=request.user)
+                if trade.status not in OPEN_STATUSES or trade.remaining_quantity <= 0:
+                    return Response({"error": "Trade is already fully closed."}, status=400)
+
+                serializer = PartialCloseSerializer(data=request.data, context={"trade": trade})
+                if not serializer.is_valid():
+                    return Response(serializer.errors, status=400)
+                result = self._partial_close_trade(trade, serializer.validated_data)
+                return Response(result)
         except Trade.DoesNotExist:
             return Response({"error": "Trade not found"}, status=404)
-
-        serializer = PartialCloseSerializer(data=request.data, context={"trade": trade})
-        if serializer.is_valid():
-            try:
-                with transaction.atomic():
-                    result = self._partial_close_trade(trade, serializer.validated_data)
-                    return Response(result)
-            except ValidationError as e:
-                logger.error(f"Validation error: {str(e)}")
-                return Response({"error": str(e)}, status=400)
-            except Exception as e:
-                logger.error(f"Error partial closing trade: {str(e)}", exc_info=True)
-                return Response({"error": str(e)}, status=400)
-        return Response(serializer.errors, status=400)
+        except ValidationError as e:
+            logger.error(f"Validation error: {str(e)}")
+            return Response({"error": str(e)}, status=400)
+        except Exception as e:
+            logger.error(f"Error partial closing trade: {str(e)}", exc_info=True)
+            return Response({"error": str(e)}, status=400)
 
     def _partial_close_trade(self, trade, data):
         """Handle partial closing of trades - FULLY CORRECTED"""
@@ -788,11 +869,11 @@ class PartialCloseView(APIView):
                 realized_pnl = (trade.average_price - price) * quantity
 
             sell_value = price * quantity
-            WalletService.credit_coins(
-                user=trade.user,
-                amount=sell_value,
-                description=f"Partial close SPOT: {quantity} {trade.asset_symbol}",
-            )
+            legs = [
+                WalletService.leg(
+                    "CREDIT", sell_value, f"Partial close SPOT: {quantity} {trade.asset_symbol}"
+                )
+            ]
 
         elif trade.trade_type == "FUTURES":
             # FUTURES PARTIAL CLOSE - CORRECTED
@@ -809,39 +890,29 @@ class PartialCloseView(APIView):
             )
 
             # STEP 1: ALWAYS unblock margin
-            WalletService.unblock_coins(
-                user=trade.user,
-                amount=margin_to_release,
-                description=f"FUTURES PARTIAL: Release margin for {quantity} {trade.asset_symbol}",
-            )
+            legs = [
+                WalletService.leg(
+                    "UNBLOCK",
+                    margin_to_release,
+                    f"FUTURES PARTIAL: Release margin for {quantity} {trade.asset_symbol}",
+                )
+            ]
 
-            # STEP 2: Handle P&L
+            # STEP 2: Handle P&L (a loss beyond the balance is capped at it)
             if realized_pnl > 0:
-                WalletService.credit_coins(
-                    user=trade.user,
-                    amount=realized_pnl,
-                    description=f"FUTURES PARTIAL PROFIT: {quantity} {trade.asset_symbol} (+{realized_pnl})",
-                )
+                legs.append(WalletService.leg(
+                    "CREDIT",
+                    realized_pnl,
+                    f"FUTURES PARTIAL PROFIT: {quantity} {trade.asset_symbol} (+{realized_pnl})",
+                ))
             elif realized_pnl < 0:
                 loss_amount = abs(realized_pnl)
-                current_balance = WalletService.get_balance(trade.user)
-
-                if current_balance >= loss_amount:
-                    WalletService.deduct_coins(
-                        user=trade.user,
-                        amount=loss_amount,
-                        description=f"FUTURES PARTIAL LOSS: {quantity} {trade.asset_symbol} (-{loss_amount})",
-                    )
-                else:
-                    if current_balance > 0:
-                        WalletService.deduct_coins(
-                            user=trade.user,
-                            amount=current_balance,
-                            description=f"FUTURES PARTIAL LOSS: {quantity} {trade.asset_symbol} (capped)",
-                        )
-                    logger.warning(
-                        f"Insufficient balance for full loss. Loss: {loss_amount}, Available: {current_balance}"
-                    )
+                legs.append(WalletService.leg(
+                    "DEBIT",
+                    loss_amount,
+                    f"FUTURES PARTIAL LOSS: {quantity} {trade.asset_symbol} (-{loss_amount})",
+                    cap_at_balance=True,
+                ))
 
         elif trade.trade_type == "OPTIONS":
             # OPTIONS PARTIAL CLOSE - CORRECTED
@@ -855,24 +926,27 @@ class PartialCloseView(APIView):
             )
 
             # Credit current value
-            if current_value > 0:
-                WalletService.credit_coins(
-                    user=trade.user,
-                    amount=current_value,
-                    description=f"OPTIONS PARTIAL CLOSE: {quantity} {trade.asset_symbol} @ {price}",
+            legs = [
+                WalletService.leg(
+                    "CREDIT",
+                    current_value,
+                    f"OPTIONS PARTIAL CLOSE: {quantity} {trade.asset_symbol} @ {price}",
                 )
+            ] if current_value > 0 else []
 
-        # Update trade
-        trade.remaining_quantity -= quantity
-        trade.realized_pnl += realized_pnl
+        # One wallet update and one ledger insert for all legs
+        settlement = WalletService.settle(trade.user, legs)
 
-        if trade.remaining_quantity == 0:
-            trade.status = "CLOSED"
-            trade.closed_at = timezone.now()
-        else:
-            trade.status = "PARTIALLY_CLOSED"
-
-        trade.save()
+        # Update trade
+        remaining_quantity = trade.remaining_quantity - quantity
+        changes = {
+            "remaining_quantity": remaining_quantity,
+            "realized_pnl": trade.realized_pnl + realized_pnl,
+            "status": "CLOSED" if remaining_quantity == 0 else "PARTIALLY_CLOSED",
+        }
+        if remaining_quantity == 0:
+            changes["closed_at"] = timezone.now()
+        TradeMutations.update_trade(trade, **changes)
 
         # Record history
         TradeHistory.objects.create(
@@ -887,10 +961,9 @@ class PartialCloseView(APIView):
         )
 
         # Update portfolio
-        portfolio, _ = Portfolio.objects.get_or_create(user=trade.user)
-        portfolio.update_portfolio_metrics()
+        get_portfolio(trade.user)
 
-        new_balance = WalletService.get_balance(trade.user)
+        new_balance = settlement["balance"]
 
         logger.info(
             f"PARTIAL CLOSED: id={trade.id}, pnl={realized_pnl}, "
@@ -916,29 +989,41 @@ class PartialCloseView(APIView):
 
 class CloseTradeView(APIView):
     permission_classes = [IsAuthenticated, HasActiveSubscription]
+    throttle_classes = [OrderRateThrottle]
 
     def post(self, request, trade_id):
-        try:
-            trade = Trade.objects.get(id=trade_id, user=request.user)
-        except Trade.DoesNotExist:
+        symbol = Trade.objects.filter(id=trade_id, user=request.user).values_list(
+            "asset_symbol", flat=True
+        ).first()
+        if symbol is None:
             return Response({"error": "Trade not found"}, status=404)
 
-        if trade.remaining_quantity == 0:
-            return Response({"error": "Trade is already fully closed."}, status=400)
+        # The gate only throttles; _post locks the trade row itself
+        with order_gate.guard(request.user.pk, symbol):
+            return self._post(request, trade_id)
 
+    def _post(self, request, trade_id):
         serializer = CloseTradeSerializer(data=request.data)
-        if serializer.is_valid():
-            try:
-                with transaction.atomic():
-                    result = self._close_trade(trade, serializer.validated_data)
-                    return Response(result)
-            except ValidationError as e:
-                logger.error(f"Validation error: {str(e)}")
-                return Response({"error": str(e)}, status=400)
-            except Exception as e:
-                logger.error(f"Error closing trade: {str(e)}", exc_info=True)
-                return Response({"error": str(e)}, status=400)
-        return Response(serializer.errors, status=400)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=400)
+
+        try:
+            with transaction.atomic():
+                # Lock the row: a concurrent close, liquidation or expiry waits here
+                trade = Trade.objects.select_for_update().get(id=trade_id, user=request.user)
+                if trade.status not in OPEN_STATUSES or trade.remaining_quantity <= 0:
+                    return Response({"error": "Trade is already fully closed."}, status=400)
+
+                result = self._close_trade(trade, serializer.validated_data)
+                return Response(result)
+        except Trade.DoesNotExist:
+            return Response({"error": "Trade not found"}, status=404)
+        except ValidationError as e:
+            logger.error(f"Validation error: {str(e)}")
+            return Response({"error": str(e)}, status=400)
+        except Exception as e:
+            logger.error(f"Error closing trade: {str(e)}", exc_info=True)
+            return Response({"error": str(e)}, status=400)
 
     def _close_trade(self, trade, data):
         """Handle complete closing of trades - FULLY CORRECTED"""
@@ -956,22 +1041,25 @@ class CloseTradeView(APIView):
             if trade.direction == "BUY":
                 realized_pnl = (price - trade.average_price) * quantity
                 sell_value = price * quantity
-                WalletService.credit_coins(
-                    user=trade.user,
-                    amount=sell_value,
-                    description=f"Close SPOT BUY: {quantity} {trade.asset_symbol} @ {price}",
-                )
+                legs = [
+                    WalletService.leg(
+                        "CREDIT",
+                        sell_value,
+                        f"Close SPOT BUY: {quantity} {trade.asset_symbol} @ {price}",
+                    )
+                ]
             else:
                 # SHORT
                 realized_pnl = (trade.average_price - price) * quantity
                 collateral = trade.total_invested
                 total_return = collateral + realized_pnl
-                if total_return > 0:
-                    WalletService.unblock_coins(
-                        user=trade.user,
-                        amount=total_return,
-                        description=f"Close SPOT SHORT: {quantity} {trade.asset_symbol}",
+                legs = [
+                    WalletService.leg(
+                        "UNBLOCK",
+                        total_return,
+                        f"Close SPOT SHORT: {quantity} {trade.asset_symbol}",
                     )
+                ] if total_return > 0 else []
 
         elif trade.trade_type == "FUTURES":
             # FUTURES CLOSE LOGIC - CORRECTED
@@ -987,39 +1075,29 @@ class CloseTradeView(APIView):
             )
 
             # STEP 1: ALWAYS unblock margin
-            WalletService.unblock_coins(
-                user=trade.user,
-                amount=margin_to_release,
-                description=f"FUTURES CLOSE: Release margin for {quantity} {trade.asset_symbol}",
-            )
+            legs = [
+                WalletService.leg(
+                    "UNBLOCK",
+                    margin_to_release,
+                    f"FUTURES CLOSE: Release margin for {quantity} {trade.asset_symbol}",
+                )
+            ]
 
-            # STEP 2: Handle P&L
+            # STEP 2: Handle P&L (a loss beyond the balance is capped at it)
             if realized_pnl > 0:
-                WalletService.credit_coins(
-                    user=trade.user,
-                    amount=realized_pnl,
-                    description=f"FUTURES PROFIT: {quantity} {trade.asset_symbol} (+{realized_pnl})",
-                )
+                legs.append(WalletService.leg(
+                    "CREDIT",
+                    realized_pnl,
+                    f"FUTURES PROFIT: {quantity} {trade.asset_symbol} (+{realized_pnl})",
+                ))
             elif realized_pnl < 0:
                 loss_amount = abs(realized_pnl)
-                current_balance = WalletService.get_balance(trade.user)
-
-                if current_balance >= loss_amount:
-                    WalletService.deduct_coins(
-                        user=trade.user,
-                        amount=loss_amount,
-                        description=f"FUTURES LOSS: {quantity} {trade.asset_symbol} (-{loss_amount})",
-                    )
-                else:
-                    if current_balance > 0:
-                        WalletService.deduct_coins(
-                            user=trade.user,
-                            amount=current_balance,
-                            description=f"FUTURES LOSS: {quantity} {trade.asset_symbol} (capped)",
-                        )
-                    logger.warning(
-                        f"Insufficient balance for full loss. Loss: {loss_amount}, Available: {current_balance}"
-                    )
+                legs.append(WalletService.leg(
+                    "DEBIT",
+                    loss_amount,
+                    f"FUTURES LOSS: {quantity} {trade.asset_symbol} (-{loss_amount})",
+                    cap_at_balance=True,
+                ))
 
         elif trade.trade_type == "OPTIONS":
             # OPTIONS CLOSE LOGIC - CORRECTED
@@ -1033,20 +1111,28 @@ class CloseTradeView(APIView):
 
             # Credit current value
             if current_value > 0:
-                WalletService.credit_coins(
-                    user=trade.user,
-                    amount=current_value,
-                    description=f"OPTIONS CLOSE: {quantity} {trade.asset_symbol} @ {price}",
-                )
+                legs = [
+                    WalletService.leg(
+                        "CREDIT",
+                        current_value,
+                        f"OPTIONS CLOSE: {quantity} {trade.asset_symbol} @ {price}",
+                    )
+                ]
             else:
+                legs = []
                 logger.info(f"OPTIONS expired worthless, no credit")
 
+        # One wallet update and one ledger insert for all legs
+        settlement = WalletService.settle(trade.user, legs)
+
         # Update trade
-        trade.remaining_quantity = Decimal("0")
-        trade.realized_pnl += realized_pnl
-        trade.status = "CLOSED"
-        trade.closed_at = timezone.now()
-        trade.save()
+        TradeMutations.update_trade(
+            trade,
+            remaining_quantity=Decimal("0"),
+            realized_pnl=trade.realized_pnl + realized_pnl,
+            status="CLOSED",
+            closed_at=timezone.now(),
+        )
 
         # Record history
         TradeHistory.objects.create(
@@ -1061,10 +1147,9 @@ class CloseTradeView(APIView):
         )
 
         # Update portfolio
-        portfolio, _ = Portfolio.objects.get_or_create(user=trade.user)
-        portfolio.update_portfolio_metrics()
+        get_portfolio(trade.user)
 
-        new_balance = WalletService.get_balance(trade.user)
+        new_balance = settlement["balance"]
 
         logger.info(
             f"TRADE CLOSED: id={trade.id}, pnl={realized_pnl}, new_balance={new_balance}"
@@ -1099,8 +1184,7 @@ class PortfolioSummaryView(APIView):
 
     def get(self, request):
         print(request.user, "user")
-        portfolio, created = Portfolio.objects.get_or_create(user=request.user)
-        portfolio.update_portfolio_metrics()
+        portfolio = get_portfolio(request.user)
 
         serializer = PortfolioSerializer(portfolio)
 
@@ -1256,30 +1340,20 @@ class UpdatePricesView(APIView):
         if serializer.is_valid():
             prices = serializer.validated_data["prices"]
 
-            updated_trades = []
-            for symbol, price in prices.items():
-                trades = Trade.objects.filter(
-                    user=request.user,
-                    asset_symbol=symbol,
-                    status__in=["OPEN", "PARTIALLY_CLOSED"],
-                )
-
-                for trade in trades:
-                    old_pnl = trade.unrealized_pnl
-                    new_pnl = trade.calculate_unrealized_pnl(price)
-                    updated_trades.append(
-                        {
-                            "trade_id": str(trade.id),
-                            "symbol": symbol,
-                            "old_pnl": str(old_pnl),
-                            "new_pnl": str(new_pnl),
-                            "price": str(price),
-                        }
-                    )
+            # One batched write per symbol, portfolio updated once for the whole request
+            updated_trades = [
+                {
+                    "trade_id": str(update["trade_id"]),
+                    "symbol": update["symbol"],
+                    "old_pnl": str(update["old_pnl"]),
+                    "new_pnl": str(update["new_pnl"]),
+                    "price": str(update["price"]),
+                }
+                for update in TradeMutations.apply_prices(prices, user=request.user)
+            ]
 
             # Update portfolio
-            portfolio, created = Portfolio.objects.get_or_create(user=request.user)
-            portfolio.update_portfolio_metrics()
+            portfolio = get_portfolio(request.user)
 
             wallet_balance = WalletService.get_balance(request.user)
 
@@ -1687,12 +1761,13 @@ def get_active_positions(request):
 @permission_classes([IsAuthenticated])
 def websocket_status(request):
     """Get WebSocket connection status"""
-    from .websocket_manager import ws_manager
+    from .websocket_manager import feed_status
     
+    status_info = feed_status()
     return Response({
-        'connected': ws_manager.websocket is not None and ws_manager.running,
-        'subscribed_symbols': list(ws_manager.subscribed_symbols),
-        'total_subscriptions': len(ws_manager.subscribed_symbols)
+        'connected': status_info['connected'],
+        'subscribed_symbols': status_info.get('subscribed_symbols', []),
+        'total_subscriptions': status_info.get('total_subscriptions', 0)
     })
 
 # # views.py
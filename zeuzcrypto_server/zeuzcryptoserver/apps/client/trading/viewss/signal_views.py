@@ -69,13 +69,15 @@ def get_active_positions(request):
 @api_view(['GET'])
 def websocket_status(request):
     """Check WebSocket connection status"""
-    from ..websocket_manager import ws_manager
+    from ..websocket_manager import feed_status
+    from apps.caching import rate_limiter
+    from apps.caching.order_gate import order_gate
     
+    # The feed runs in the run_feed_ingestor process, which publishes its stats to the cache
     status_info = {
-        'connected': ws_manager.is_connected(),
-        'subscribed_symbols': ws_manager.get_subscribed_symbols(),
-        'last_heartbeat': ws_manager.last_heartbeat_time.isoformat() if ws_manager.last_heartbeat_time else None,
-        'connection_attempts': ws_manager.connection_attempts
+        **feed_status(),
+        'order_gate': order_gate.stats(),
+        'order_throttle': rate_limiter.stats('orders'),
     }
     
     return Response(status_info)
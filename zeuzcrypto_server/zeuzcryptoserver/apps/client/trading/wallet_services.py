@@ -1,21 +1,52 @@
 
+from collections import Counter
+from datetime import datetime, timezone as dt_timezone
 from decimal import Decimal
-from django.db import transaction
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Case, Count, DecimalField, F, OuterRef, Subquery, Sum, Value, When
+from django.db.models.functions import Coalesce
 from django.core.exceptions import ValidationError
 import logging
 
 logger = logging.getLogger(__name__)
 
-from apps.accounts.models import UserWallet, WalletTransaction
+from apps.accounts.models import UserWallet, WalletTransaction, WalletCheckpoint
+
+# Checkpoint time of wallets that were never checkpointed
+LEDGER_EPOCH = datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
+
+# First key of the per-wallet advisory locks taken in ledger mode (PostgreSQL)
+WALLET_LOCK_NAMESPACE = 7301
 
 
 class WalletService:
-    """Service to handle wallet operations for trading"""
+    """
+    Service to handle wallet operations for trading
+
+    Every mutation goes through ``settle``: one conditional
+    ``UPDATE ... RETURNING`` on the wallet row plus the ``WalletTransaction``
+    inserts. The balance is never read and written back from Python, so
+    concurrent orders cannot lose updates, and debits/blocks only apply
+    while the balance covers them.
+
+    With ``TRADING_SETTINGS['WALLET_LEDGER_MODE']`` the wallet row is no
+    longer written (or, on PostgreSQL, locked) per order: ``WalletTransaction``
+    becomes the append-only source of truth and the balance is the latest
+    ``WalletCheckpoint`` plus the signed sum of the entries after it. ``tasks.checkpoint_wallets``
+    verifies and checkpoints every wallet periodically.
+    """
+
+    @staticmethod
+    def ledger_mode():
+        return getattr(settings, 'TRADING_SETTINGS', {}).get('WALLET_LEDGER_MODE', False)
     
     @staticmethod
     def get_balance(user):
         """Get user's current wallet balance"""
         try:
+            if WalletService.ledger_mode():
+                return WalletService.ledger_balance(user) or Decimal('0.00')
             return user.wallet.balance
         except Exception as e:
             logger.error(f"Error getting balance for {user.email}: {str(e)}")
@@ -28,7 +59,288 @@ class WalletService:
         return balance >= required_amount
     
     @staticmethod
-    @transaction.atomic
+    def _update_balance(user, delta, minimum=None):
+        """
+        Add ``delta`` to the wallet balance in one statement.
+
+        With ``minimum`` the update only applies while ``balance >= minimum``.
+        Returns the new balance, or None when no row matched (no wallet or
+        insufficient funds).
+        """
+        qn = connection.ops.quote_name
+        balance_field = UserWallet._meta.get_field('balance')
+        user_field = UserWallet._meta.get_field('user')
+        table = qn(UserWallet._meta.db_table)
+        balance = qn(balance_field.column)
+
+        sql = f"UPDATE {table} SET {balance} = {balance} + %s WHERE {qn(user_field.column)} = %s"
+        params = [
+            balance_field.get_db_prep_value(delta, connection),
+            user_field.get_db_prep_value(user.pk, connection),
+        ]
+        if minimum is not None:
+            sql += f" AND {balance} >= %s"
+            params.append(connection.ops.adapt_decimalfield_value(minimum))
+        sql += f" RETURNING {balance}"
+
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            row = cursor.fetchone()
+
+        if row is None:
+            return None
+        return Decimal(str(row[0])).quantize(Decimal('0.01'))
+
+    # Sign of each transaction type on the balance
+    LEG_SIGNS = {'CREDIT': 1, 'UNBLOCK': 1, 'DEBIT': -1, 'BLOCK': -1}
+
+    @staticmethod
+    def leg(transaction_type, amount, description, cap_at_balance=False):
+        """
+        One wallet movement of a settlement.
+
+        A debit leg with ``cap_at_balance`` is reduced to whatever the wallet
+        still holds instead of failing (futures losses beyond the balance).
+        """
+        return {
+            'transaction_type': transaction_type,
+            'amount': Decimal(str(amount)).quantize(Decimal('0.01')),
+            'description': description,
+            'cap_at_balance': cap_at_balance,
+        }
+
+    @staticmethod
+    def signed_amount():
+        """Ledger entry ``amount`` with the sign its transaction type has on the balance"""
+        return Case(
+            *[
+                When(transaction_type=transaction_type, then=F('amount') if sign > 0 else -F('amount'))
+                for transaction_type, sign in WalletService.LEG_SIGNS.items()
+            ],
+            output_field=DecimalField(max_digits=15, decimal_places=2),
+        )
+
+    @staticmethod
+    def annotate_ledger(wallets, upto=None):
+        """
+        Annotate a ``UserWallet`` queryset with its ledger-derived balance.
+
+        ``ledger_balance`` is the latest checkpoint (at or before ``upto``)
+        plus the signed entries after it, up to ``upto``. Wallets never
+        checkpointed open at their first entry's ``balance_before`` (or the
+        stored balance when they have no entries). Also adds
+        ``ledger_checkpoint``, ``ledger_entries`` and ``ledger_last_after``
+        (``balance_after`` of the newest entry counted). Every subquery walks
+        the (user, created_at) / (user, as_of) indexes.
+        """
+        checkpoints = WalletCheckpoint.objects.filter(user=OuterRef('user')).order_by('-as_of')
+        if upto is not None:
+            checkpoints = checkpoints.filter(as_of__lte=upto)
+        wallets = wallets.annotate(
+            ledger_checkpoint=Subquery(checkpoints.values('balance')[:1]),
+            ledger_as_of=Coalesce(Subquery(checkpoints.values('as_of')[:1]), Value(LEDGER_EPOCH)),
+        )
+
+        entries = WalletTransaction.objects.filter(user=OuterRef('user'), created_at__gt=OuterRef('ledger_as_of'))
+        if upto is not None:
+            entries = entries.filter(created_at__lte=upto)
+        totals = entries.order_by().values('user').annotate(
+            total=Sum(WalletService.signed_amount()), count=Count('id')
+        )
+        money = DecimalField(max_digits=15, decimal_places=2)
+        return wallets.annotate(
+            ledger_entries=Coalesce(Subquery(totals.values('count')), Value(0)),
+            ledger_last_after=Subquery(entries.order_by('-created_at').values('balance_after')[:1]),
+            ledger_balance=Coalesce(
+                'ledger_checkpoint',
+                Subquery(entries.order_by('created_at').values('balance_before')[:1]),
+                'balance',
+                output_field=money,
+            ) + Coalesce(Subquery(totals.values('total')), Value(Decimal('0.00')), output_field=money),
+        )
+
+    @staticmethod
+    def ledger_balance(user, upto=None):
+        """Ledger-derived balance of ``user``'s wallet, None without a wallet"""
+        row = (
+            WalletService.annotate_ledger(UserWallet.objects.filter(user=user), upto)
+            .values('ledger_balance')
+            .first()
+        )
+        if row is None:
+            return None
+        return Decimal(str(row['ledger_balance'])).quantize(Decimal('0.01'))
+
+    @staticmethod
+    def _current_balance(user):
+        if WalletService.ledger_mode():
+            return WalletService.ledger_balance(user)
+        return UserWallet.objects.filter(user=user).values_list('balance', flat=True).first()
+
+    @staticmethod
+    def _lock_wallet(user):
+        """
+        Serialize ledger-mode settlements of one wallet until commit.
+
+        On PostgreSQL this is a transaction-scoped advisory lock keyed by the
+        user, so the ``UserWallet`` row itself stays unlocked (checkpoint
+        syncs and other writers of the row never queue behind orders); other
+        backends fall back to ``SELECT ... FOR UPDATE`` on the row.
+        """
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    "SELECT pg_advisory_xact_lock(%s, hashtext(%s))",
+                    [WALLET_LOCK_NAMESPACE, str(user.pk)],
+                )
+            return
+        UserWallet.objects.select_for_update().filter(user=user).values_list('pk', flat=True).first()
+
+    @staticmethod
+    def _locked_balance(user):
+        """
+        Ledger balance of a wallet whose settlements are serialized by
+        ``_lock_wallet``: the end of the running chain among its newest
+        entries (legs of one settlement can share a ``created_at``), read from
+        the (user, created_at) index, or the checkpoint/stored balance when it
+        has no entries yet. None without a wallet.
+        """
+        newest = WalletTransaction.objects.filter(user=user).order_by('-created_at').values('created_at')[:1]
+        rows = list(
+            WalletTransaction.objects.filter(user=user, created_at=Subquery(newest))
+            .values_list('balance_before', 'balance_after')
+        )
+        if not rows:
+            return WalletService.ledger_balance(user)
+        # Every balance_after but the chain's last is the next leg's balance_before
+        end = Counter(after for _, after in rows) - Counter(before for before, _ in rows)
+        return next(iter(end), rows[0][1])
+
+    @staticmethod
+    def _apply_ledger(user, legs, net):
+        """
+        Ledger-mode counterpart of the conditional update: take the wallet's
+        lock and check the legs against its current balance.
+
+        ``balance_before``/``balance_after`` form one running chain per wallet
+        (``reconcile_wallets`` verifies it), so settlements of the same user
+        still run one at a time until their transaction commits; settlements
+        of different users never contend.
+
+        Returns ``(new_balance, legs, net, shortfall)``, new_balance None when
+        the legs cannot be paid.
+        """
+        shortfall = Decimal('0.00')
+        WalletService._lock_wallet(user)
+        balance = WalletService._locked_balance(user)
+        if balance is None:
+            return None, legs, net, shortfall
+
+        if net < 0 and balance + net < 0:
+            if not any(leg['cap_at_balance'] for leg in legs):
+                return None, legs, net, shortfall
+            capped, shortfall = WalletService._cap_legs(balance, legs)
+            if capped is None:
+                return None, legs, net, Decimal('0.00')
+            legs = capped
+            net = sum(WalletService.LEG_SIGNS[leg['transaction_type']] * leg['amount'] for leg in legs)
+        return balance + net, legs, net, shortfall
+
+    @staticmethod
+    def settle(user, legs):
+        """
+        Apply several wallet legs atomically (release margin, realize P&L, ...).
+
+        The net effect is written with one conditional ``UPDATE ... RETURNING``
+        and every leg gets its ledger row from one ``bulk_create``, with
+        running ``balance_before``/``balance_after`` in leg order. Only when the
+        net would overdraw the wallet and some leg may be capped is the row
+        locked and read to size the capped legs.
+
+        Returns ``{'balance', 'net', 'shortfall', 'legs'}``; raises
+        ValidationError when uncapped debits exceed the balance.
+        """
+        legs = [leg for leg in legs if leg['amount'] != 0]
+        if not legs:
+            balance = WalletService._current_balance(user)
+            return {'balance': balance or Decimal('0.00'), 'net': Decimal('0.00'), 'shortfall': Decimal('0.00'), 'legs': []}
+
+        signs = WalletService.LEG_SIGNS
+        net = sum(signs[leg['transaction_type']] * leg['amount'] for leg in legs)
+        shortfall = Decimal('0.00')
+
+        # No savepoint: nothing is written when the update matches no row, so
+        # the error is raised after the block and callers' transactions stay usable
+        with transaction.atomic(savepoint=False):
+            if WalletService.ledger_mode():
+                new_balance, legs, net, shortfall = WalletService._apply_ledger(user, legs, net)
+            else:
+                new_balance = WalletService._update_balance(user, net, minimum=-net if net < 0 else None)
+
+                if new_balance is None and any(leg['cap_at_balance'] for leg in legs):
+                    wallet = UserWallet.objects.select_for_update().filter(user=user).first()
+                    if wallet is not None:
+                        capped, shortfall = WalletService._cap_legs(wallet.balance, legs)
+                        if capped is not None:
+                            legs = capped
+                            net = sum(signs[leg['transaction_type']] * leg['amount'] for leg in legs)
+                            new_balance = WalletService._update_balance(user, net)
+
+            if new_balance is not None and legs:
+                running = new_balance - net
+                rows = []
+                for leg in legs:
+                    before = running
+                    running += signs[leg['transaction_type']] * leg['amount']
+                    rows.append(WalletTransaction(
+                        user=user,
+                        amount=leg['amount'],
+                        transaction_type=leg['transaction_type'],
+                        description=leg['description'],
+                        balance_before=before,
+                        balance_after=running
+                    ))
+                WalletTransaction.objects.bulk_create(rows)
+
+        if new_balance is None:
+            available = WalletService._current_balance(user)
+            if available is None:
+                raise ValidationError(f"Wallet transaction failed: no wallet for {user.email}")
+            margin = any(leg['transaction_type'] == 'BLOCK' for leg in legs)
+            raise ValidationError(
+                f"Insufficient coins{' for margin' if margin else ''}. "
+                f"Need: {-net}, Available: {available}"
+            )
+
+        if shortfall > 0:
+            logger.warning(f"Insufficient balance for full loss of {user.email}. Uncovered: {shortfall}")
+
+        # Keep an already loaded user.wallet in step with the row
+        if type(user).wallet.is_cached(user):
+            user.wallet.balance = new_balance
+        return {'balance': new_balance, 'net': net, 'shortfall': shortfall, 'legs': legs}
+
+    @staticmethod
+    def _cap_legs(balance, legs):
+        """Walk the legs from ``balance``, shrinking capped debits; (None, 0) if an uncapped one cannot be paid"""
+        signs = WalletService.LEG_SIGNS
+        capped = []
+        shortfall = Decimal('0.00')
+        for leg in legs:
+            amount = leg['amount']
+            if signs[leg['transaction_type']] < 0 and amount > balance:
+                if not leg['cap_at_balance']:
+                    return None, Decimal('0.00')
+                shortfall += amount - max(balance, Decimal('0.00'))
+                amount = max(balance, Decimal('0.00'))
+                leg = {**leg, 'amount': amount, 'description': f"{leg['description']} (capped)"}
+                if amount == 0:
+                    continue
+            balance += signs[leg['transaction_type']] * amount
+            capped.append(leg)
+        return capped, shortfall
+
+    @staticmethod
     def deduct_coins(user, amount, description):
         """
         Deduct coins from wallet (used for BUY orders)
@@ -36,33 +348,9 @@ class WalletService:
         Example: User buys 10 AAPL @ $150 = 1,500 coins deducted
         """
         try:
-            wallet = user.wallet
-            
-            # Check if user has enough coins
-            if wallet.balance < amount:
-                raise ValidationError(
-                    f"Insufficient coins. Need: {amount}, Available: {wallet.balance}"
-                )
-            
-            # Save old balance for logging
-            old_balance = wallet.balance
-            
-            # Deduct coins
-            wallet.balance -= amount
-            wallet.save()
-            
-            # Log the transaction
-            WalletTransaction.objects.create(
-                user=user,
-                amount=amount,
-                transaction_type='DEBIT',
-                description=description,
-                balance_before=old_balance,
-                balance_after=wallet.balance
-            )
-            
-            logger.info(f"{user.email} - Deducted {amount} coins. New balance: {wallet.balance}")
-            return wallet.balance
+            balance = WalletService.settle(user, [WalletService.leg('DEBIT', amount, description)])['balance']
+            logger.info(f"{user.email} - Deducted {amount} coins. New balance: {balance}")
+            return balance
             
         except ValidationError:
             raise
@@ -71,7 +359,6 @@ class WalletService:
             raise ValidationError(f"Wallet transaction failed: {str(e)}")
     
     @staticmethod
-    @transaction.atomic
     def credit_coins(user, amount, description):
         """
         Add coins to wallet (used for SELL orders)
@@ -79,34 +366,17 @@ class WalletService:
         Example: User sells 10 AAPL @ $170 = 1,700 coins credited
         """
         try:
-            wallet = user.wallet
-            
-            # Save old balance for logging
-            old_balance = wallet.balance
-            
-            # Add coins
-            wallet.balance += amount
-            wallet.save()
-            
-            # Log the transaction
-            WalletTransaction.objects.create(
-                user=user,
-                amount=amount,
-                transaction_type='CREDIT',
-                description=description,
-                balance_before=old_balance,
-                balance_after=wallet.balance
-            )
-            
-            logger.info(f"{user.email} - Credited {amount} coins. New balance: {wallet.balance}")
-            return wallet.balance
+            balance = WalletService.settle(user, [WalletService.leg('CREDIT', amount, description)])['balance']
+            logger.info(f"{user.email} - Credited {amount} coins. New balance: {balance}")
+            return balance
             
+        except ValidationError:
+            raise
         except Exception as e:
             logger.error(f"Error crediting coins for {user.email}: {str(e)}")
             raise ValidationError(f"Wallet transaction failed: {str(e)}")
     
     @staticmethod
-    @transaction.atomic
     def block_coins(user, amount, description):
         """
         Block coins for margin (used for FUTURES)
@@ -115,32 +385,9 @@ class WalletService:
         Position value: $50,000, Margin: $10,000 (blocked)
         """
         try:
-            wallet = user.wallet
-            
-            # Check if user has enough coins
-            if wallet.balance < amount:
-                raise ValidationError(
-                    f"Insufficient coins for margin. Need: {amount}, Available: {wallet.balance}"
-                )
-            
-            old_balance = wallet.balance
-            
-            # Block coins (same as deduct, but marked as BLOCK)
-            wallet.balance -= amount
-            wallet.save()
-            
-            # Log as BLOCK transaction
-            WalletTransaction.objects.create(
-                user=user,
-                amount=amount,
-                transaction_type='BLOCK',
-                description=description,
-                balance_before=old_balance,
-                balance_after=wallet.balance
-            )
-            
-            logger.info(f"{user.email} - Blocked {amount} coins for margin. New balance: {wallet.balance}")
-            return wallet.balance
+            balance = WalletService.settle(user, [WalletService.leg('BLOCK', amount, description)])['balance']
+            logger.info(f"{user.email} - Blocked {amount} coins for margin. New balance: {balance}")
+            return balance
             
         except ValidationError:
             raise
@@ -149,7 +396,6 @@ class WalletService:
             raise ValidationError(f"Wallet transaction failed: {str(e)}")
     
     @staticmethod
-    @transaction.atomic
     def unblock_coins(user, amount, description):
         """
         Unblock coins and add P&L (used when closing FUTURES)
@@ -160,27 +406,12 @@ class WalletService:
         Total returned: $12,000
         """
         try:
-            wallet = user.wallet
-            
-            old_balance = wallet.balance
-            
-            # Return coins (blocked amount + P&L)
-            wallet.balance += amount
-            wallet.save()
-            
-            # Log as UNBLOCK transaction
-            WalletTransaction.objects.create(
-                user=user,
-                amount=amount,
-                transaction_type='UNBLOCK',
-                description=description,
-                balance_before=old_balance,
-                balance_after=wallet.balance
-            )
-            
-            logger.info(f"{user.email} - Unblocked {amount} coins. New balance: {wallet.balance}")
-            return wallet.balance
+            balance = WalletService.settle(user, [WalletService.leg('UNBLOCK', amount, description)])['balance']
+            logger.info(f"{user.email} - Unblocked {amount} coins. New balance: {balance}")
+            return balance
             
+        except ValidationError:
+            raise
         except Exception as e:
             logger.error(f"Error unblocking coins for {user.email}: {str(e)}")
-            raise ValidationError(f"Wallet transaction failed: {str(e)}")
\ No newline at end of file
+            raise ValidationError(f"Wallet transaction failed: {str(e)}")
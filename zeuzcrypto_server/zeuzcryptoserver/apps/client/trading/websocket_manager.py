@@ -1,111 +1,121 @@
 import json
+import time
+import uuid
 import asyncio
-import websockets
 import logging
+from concurrent.futures import ThreadPoolExecutor
 from decimal import Decimal
+from functools import partial
 from django.utils import timezone
 from django.conf import settings
+from django.core.cache import cache
 from channels.layers import get_channel_layer
 from asgiref.sync import sync_to_async
 from typing import Dict, Optional
-from .models import Trade, FuturesDetails, PriceHistory
+from .models import Trade, FuturesDetails, PendingOrder
+from .mark_to_market import mark_to_market_engine
+from .position_index import position_index
+from .liquidation import liquidation_engine, auto_liquidate_enabled
+from .order_book import order_books
+from .conflation import TickConflator
+from .price_history import PriceHistoryBuffer
+from .feed_shards import FeedSupervisor
+from .tick_publisher import TickPublisher, FEED_CONTROL_GROUP
+from .position_stream import format_decimal
+from .events import trade_events
 
 logger = logging.getLogger(__name__)
 
+# Where the ingestor publishes its stats for web processes (see feed_status)
+FEED_STATS_KEY = "trading:feed:stats"
+
 
 class DeltaWebSocketManager:
     """Manages WebSocket connections to Delta Exchange for real-time price updates"""
     
     def __init__(self):
-        self.ws_url = "wss://socket.delta.exchange"
-        self.websocket = None
-        self.subscribed_symbols: set = set()
+        trading_settings = getattr(settings, 'TRADING_SETTINGS', {})
+        
+        self.ws_url = trading_settings.get('FEED_WS_URL', "wss://socket.delta.exchange")
         self.running = False
-        self.reconnect_delay = 5
-        self.max_reconnect_delay = 60
         self.ping_interval = 30
         self.price_cache: Dict[str, Dict] = {}  # Cache latest prices for comparison
+        self.symbol_sync_interval = trading_settings.get('FEED_SYMBOL_SYNC_INTERVAL', 30)
+        self.stats_interval = trading_settings.get('FEED_STATS_INTERVAL', 5)
+        self.tasks = []
         
-    async def connect(self):
-        """Establish WebSocket connection"""
-        try:
-            self.websocket = await websockets.connect(
-                self.ws_url,
-                ping_interval=self.ping_interval,
-                ping_timeout=10
-            )
-            logger.info("✅ Connected to Delta Exchange WebSocket")
-            self.reconnect_delay = 5
-            return True
-        except Exception as e:
-            logger.error(f"❌ Failed to connect to Delta Exchange: {e}")
-            return False
+        # Symbols are partitioned over several connections, each with its own queue
+        self.feed = FeedSupervisor(
+            self.ws_url,
+            self.handle_message,
+            shard_count=trading_settings.get('FEED_SHARD_COUNT', 1),
+            queue_size=trading_settings.get('FEED_SHARD_QUEUE_SIZE', 1000),
+            ping_interval=self.ping_interval,
+        )
+        
+        # Only the latest ticker per symbol is applied to the DB, every flush interval.
+        # Each shard has its own conflator, apply loop and DB thread (built in start()),
+        # so a slow symbol only delays the symbols of its own shard.
+        self.flush_interval = trading_settings.get('TICK_FLUSH_INTERVAL_MS', 250) / 1000
+        self.conflators: Dict[int, TickConflator] = {}
+        self.executors: Dict[int, ThreadPoolExecutor] = {}
+        
+        # Ticks and OHLCV bars are buffered and written in bulk
+        self.price_history = PriceHistoryBuffer(
+            max_size=trading_settings.get('PRICE_HISTORY_BUFFER_SIZE', 500),
+            max_age=trading_settings.get('PRICE_HISTORY_FLUSH_INTERVAL', 5),
+        )
+        
+        # Normalized ticks are fanned out to per-symbol channel layer groups
+        self.publisher = TickPublisher()
+        
+    @property
+    def subscribed_symbols(self) -> set:
+        return self.feed.subscribed_symbols
+    
+    @property
+    def connected(self) -> bool:
+        return self.running and self.feed.connected
     
     async def subscribe_symbols(self, symbols: list):
-        """Subscribe to ticker updates for given symbols"""
-        if not self.websocket:
-            logger.error("WebSocket not connected")
-            return False
-        
+        """Subscribe to ticker updates for given symbols (routed to their shards)"""
         if not symbols:
             return True
         
-        payload = {
-            "type": "subscribe",
-            "payload": {
-                "channels": [
-                    {
-                        "name": "v2/ticker",
-                        "symbols": symbols
-                    }
-                ]
-            }
-        }
-        
-        try:
-            await self.websocket.send(json.dumps(payload))
-            self.subscribed_symbols.update(symbols)
+        if await self.feed.subscribe(symbols):
             logger.info(f"📡 Subscribed to symbols: {symbols}")
             return True
-        except Exception as e:
-            logger.error(f"Failed to subscribe to symbols: {e}")
-            return False
+        logger.error(f"Failed to subscribe to symbols: {symbols}")
+        return False
     
     async def unsubscribe_symbols(self, symbols: list):
         """Unsubscribe from ticker updates"""
-        if not self.websocket or not symbols:
+        if not symbols:
             return False
         
-        payload = {
-            "type": "unsubscribe",
-            "payload": {
-                "channels": [
-                    {
-                        "name": "v2/ticker",
-                        "symbols": symbols
-                    }
-                ]
-            }
-        }
-        
-        try:
-            await self.websocket.send(json.dumps(payload))
-            self.subscribed_symbols.difference_update(symbols)
+        if await self.feed.unsubscribe(symbols):
             logger.info(f"Unsubscribed from symbols: {symbols}")
             return True
-        except Exception as e:
-            logger.error(f"Failed to unsubscribe from symbols: {e}")
-            return False
+        logger.error(f"Failed to unsubscribe from symbols: {symbols}")
+        return False
     
     @sync_to_async
     def get_active_symbols(self):
-        """Get all unique symbols from active trades"""
+        """Get all unique symbols from active trades and resting orders"""
+        if position_index.warmed and order_books.warmed:
+            position_index.ensure_fresh()
+            order_books.refresh_changed()
+            return list(set(position_index.symbols()) | set(order_books.symbols()))
+        
         trades = Trade.objects.filter(
             status__in=['OPEN', 'PARTIALLY_CLOSED'],
             trade_type__in=['FUTURES', 'OPTIONS']
         ).values_list('asset_symbol', flat=True).distinct()
+        orders = PendingOrder.objects.filter(
+            status='PENDING'
+        ).values_list('asset_symbol', flat=True).distinct()
         
-        return list(set(trades))
+        return list(set(trades) | set(orders))
     
     def compare_prices(self, symbol: str, new_price: Decimal, ticker_data: dict) -> dict:
         """Compare new price with cached price and return analysis"""
@@ -122,7 +132,7 @@ class DeltaWebSocketManager:
             'is_high': ticker_data.get('high'),
             'is_low': ticker_data.get('low'),
             'spot_price': ticker_data.get('spot_price'),
-            'timestamp': ticker_data.get('time')
+            'timestamp': ticker_data.get('time') or ticker_data.get('timestamp')
         }
         
         if old_price:
@@ -174,135 +184,196 @@ class DeltaWebSocketManager:
             logger.error(f"Error extracting ticker data: {e}")
             return None
     
-    @sync_to_async
+    def conflator_for(self, shard_id: int) -> TickConflator:
+        if shard_id not in self.conflators:
+            self.conflators[shard_id] = TickConflator(flush_interval=self.flush_interval)
+        return self.conflators[shard_id]
+    
+    async def run_on_shard(self, shard_id: int, func, *args):
+        """Run blocking work on the shard's own DB thread"""
+        executor = self.executors.get(shard_id)
+        if executor is None:
+            return await sync_to_async(func)(*args)
+        return await sync_to_async(func, thread_sensitive=False, executor=executor)(*args)
+    
+    def conflation_stats(self) -> dict:
+        shards = {shard_id: conflator.stats() for shard_id, conflator in self.conflators.items()}
+        return {
+            'ticks_received': sum(stats['ticks_received'] for stats in shards.values()),
+            'ticks_applied': sum(stats['ticks_applied'] for stats in shards.values()),
+            'pending_symbols': sum(stats['pending_symbols'] for stats in shards.values()),
+            'max_flush_duration_ms': max((stats['last_flush_duration_ms'] for stats in shards.values()), default=0),
+            'shards': shards,
+        }
+    
+    def stats(self) -> dict:
+        """Everything the feed, its shards and the in-memory indexes of this process report"""
+        return {
+            'connected': self.connected,
+            'subscribed_symbols': sorted(self.subscribed_symbols),
+            'total_subscriptions': len(self.subscribed_symbols),
+            'conflation': self.conflation_stats(),
+            'price_history': self.price_history.stats(),
+            'trade_events': trade_events.stats(),
+            'position_index': position_index.stats(),
+            'liquidation': liquidation_engine.stats(),
+            'order_books': order_books.stats(),
+            'feed': self.feed.stats(),
+            'publisher': self.publisher.stats(),
+        }
+    
+    async def publish_stats(self):
+        """Put this process's stats in the cache every stats interval, for web processes to read"""
+        while self.running:
+            try:
+                await sync_to_async(cache.set)(
+                    FEED_STATS_KEY,
+                    {**self.stats(), 'published_at': time.time()},
+                    timeout=self.stats_interval * 6,
+                )
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Error publishing feed stats: {e}")
+            await asyncio.sleep(self.stats_interval)
+    
     def update_trade_prices(self, symbol: str, ticker_data: dict, comparison: dict):
-        """Update prices for all active trades of a symbol"""
+        """Mark all active trades of a symbol in one batched pass"""
         try:
-            trades = Trade.objects.filter(
-                asset_symbol=symbol,
-                status__in=['OPEN', 'PARTIALLY_CLOSED'],
-                trade_type__in=['FUTURES', 'OPTIONS']
-            ).select_related('futures_details', 'options_details')
-            
-            new_price = ticker_data['mark_price']
-            
-            for trade in trades:
-                try:
-                    # Calculate unrealized P&L
-                    if trade.trade_type == 'FUTURES':
-                        self.update_futures_trade(trade, new_price, comparison)
-                    elif trade.trade_type == 'OPTIONS':
-                        self.update_options_trade(trade, new_price, comparison)
-                    
-                    # Check margin call
-                    if trade.trade_type == 'FUTURES' and hasattr(trade, 'futures_details'):
-                        self.check_margin_call(trade, new_price)
-                    
-                except Exception as e:
-                    logger.error(f"Error updating trade {trade.id}: {e}")
+            summary = mark_to_market_engine.mark_symbol(
+                symbol, ticker_data['mark_price'], comparison
+            )
             
-            # Store ticker data in cache and DB
+            # Store ticker data in cache
             self.price_cache[symbol] = ticker_data
-            self.store_price_history(symbol, ticker_data)
+            
+            return summary
             
         except Exception as e:
             logger.error(f"Error updating trade prices for {symbol}: {e}")
+            return None
     
-    def update_futures_trade(self, trade: Trade, current_price: Decimal, comparison: dict):
-        """Update futures trade with current price"""
-        try:
-            if trade.direction == 'BUY':
-                pnl = (current_price - trade.average_price) * trade.remaining_quantity
-            else:  # SELL
-                pnl = (trade.average_price - current_price) * trade.remaining_quantity
-            
-            trade.unrealized_pnl = pnl
-            trade.current_price = current_price
-            trade.last_price_update = timezone.now()
-            trade.save(update_fields=['unrealized_pnl', 'current_price', 'last_price_update'])
-            
-            logger.debug(
-                f"Trade {trade.id} updated - Symbol: {trade.asset_symbol}, "
-                f"Price: {current_price}, PnL: {pnl}, Direction: {comparison['direction']}"
+    async def dispatch_margin_calls(self, symbol: str, current_price: Decimal, margin_calls: list):
+        """Notify users whose positions crossed the margin call threshold on this tick"""
+        for margin_call in margin_calls:
+            logger.warning(
+                f"⚠️ MARGIN CALL TRIGGERED for trade {margin_call['trade_id']}. "
+                f"Remaining margin: {margin_call['remaining_margin']}"
             )
-            
-        except Exception as e:
-            logger.error(f"Error updating futures trade {trade.id}: {e}")
-    
-    def update_options_trade(self, trade: Trade, current_price: Decimal, comparison: dict):
-        """Update options trade with current price"""
-        try:
-            trade.current_price = current_price
-            trade.last_price_update = timezone.now()
-            trade.save(update_fields=['current_price', 'last_price_update'])
-            
-        except Exception as e:
-            logger.error(f"Error updating options trade {trade.id}: {e}")
-    
-    def check_margin_call(self, trade: Trade, current_price: Decimal):
-        """Check if margin call is needed"""
-        try:
-            futures_details = trade.futures_details
-            
-            if trade.direction == 'BUY':
-                pnl = (current_price - trade.average_price) * trade.remaining_quantity
-            else:
-                pnl = (trade.average_price - current_price) * trade.remaining_quantity
-            
-            remaining_margin = futures_details.margin_used + pnl
-            margin_threshold = futures_details.margin_required * Decimal('0.2')
-            
-            logger.info(
-                f"Margin Check - Trade {trade.id}: Current Price: {current_price}, "
-                f"Remaining Margin: {remaining_margin}, Threshold: {margin_threshold}"
+            await self._send_notification(
+                user_id=margin_call['user_id'],
+                notification_type='margin_call',
+                data={
+                    'trade_id': str(margin_call['trade_id']),
+                    'symbol': symbol,
+                    'current_price': str(current_price),
+                    'remaining_margin': str(margin_call['remaining_margin']),
+                    'pnl': str(margin_call['pnl']),
+                    'message': '⚠️ Margin Call: Your position may be liquidated',
+                    'timestamp': timezone.now().isoformat()
+                }
             )
-            
-            if remaining_margin <= margin_threshold or remaining_margin <= 0:
-                logger.warning(
-                    f"⚠️ MARGIN CALL TRIGGERED for trade {trade.id}. "
-                    f"Remaining margin: {remaining_margin}"
-                )
-                self.notify_margin_call(trade, current_price, remaining_margin, pnl)
-        
-        except Exception as e:
-            logger.error(f"Error checking margin call: {e}")
     
-    def notify_margin_call(self, trade: Trade, current_price: Decimal, remaining_margin: Decimal, pnl: Decimal):
-        """Send margin call notification"""
-        try:
-            asyncio.create_task(
-                self._send_notification(
-                    user_id=trade.user.id,
-                    notification_type='margin_call',
+    async def liquidate_positions(self, symbol: str, current_price: Decimal, positions: list, shard_id: int = None):
+        """Close positions whose margin is exhausted and notify their owners"""
+        for position in positions:
+            logger.warning(
+                f"🚨 LIQUIDATION TRIGGERED for trade {position['id']} at {current_price}"
+            )
+            if not auto_liquidate_enabled():
+                await self._send_notification(
+                    user_id=position['user_id'],
+                    notification_type='liquidation_warning',
                     data={
-                        'trade_id': str(trade.id),
-                        'symbol': trade.asset_symbol,
+                        'trade_id': str(position['id']),
+                        'symbol': symbol,
                         'current_price': str(current_price),
-                        'remaining_margin': str(remaining_margin),
-                        'pnl': str(pnl),
-                        'message': '⚠️ Margin Call: Your position may be liquidated',
+                        'message': '🚨 Liquidation level reached: your margin is exhausted',
                         'timestamp': timezone.now().isoformat()
                     }
                 )
+                continue
+            
+            result = await self.run_on_shard(shard_id, liquidation_engine.liquidate, position['id'], current_price)
+            if result is None:
+                continue
+            
+            await self._send_notification(
+                user_id=position['user_id'],
+                notification_type='liquidation',
+                data={
+                    'trade_id': str(position['id']),
+                    'symbol': symbol,
+                    'current_price': str(current_price),
+                    'realized_pnl': result.get('realized_pnl'),
+                    'wallet_balance': result.get('wallet_balance'),
+                    'message': '🚨 Your position was liquidated: margin exhausted',
+                    'timestamp': timezone.now().isoformat()
+                }
             )
-        except Exception as e:
-            logger.error(f"Error sending margin call notification: {e}")
     
-    @sync_to_async
-    def store_price_history(self, symbol: str, ticker_data: dict):
-        """Store price history for analysis"""
-        try:
-            PriceHistory.objects.create(
-                symbol=symbol,
-                mark_price=ticker_data['mark_price'],
-                ltp=ticker_data['ltp'],
-                high=ticker_data['is_high'],
-                low=ticker_data['is_low'],
-                volume=ticker_data['volume'],
-                timestamp=ticker_data['timestamp']
+    async def match_orders(self, symbol: str, current_price: Decimal, shard_id: int = None):
+        """Fill resting orders whose limit or stop price this tick crossed"""
+        if order_books.resync_due():
+            await self.run_on_shard(shard_id, order_books.refresh_changed)
+        
+        fills, triggered = order_books.match(symbol, current_price)
+        if triggered:
+            await self.run_on_shard(shard_id, order_books.mark_triggered, triggered)
+        
+        for record in fills:
+            filled = await self.run_on_shard(shard_id, order_books.fill, record, current_price)
+            if filled is None:
+                continue
+            
+            order = filled['order']
+            result = filled['result'] or {}
+            await self._send_notification(
+                user_id=order.user_id,
+                notification_type='order_filled' if order.status == 'FILLED' else 'order_rejected',
+                data={
+                    'order_id': str(order.id),
+                    'trade_id': result.get('trade_id'),
+                    'symbol': symbol,
+                    'order_type': order.order_type,
+                    'direction': order.direction,
+                    'quantity': str(order.quantity),
+                    'current_price': str(current_price),
+                    'status': order.status,
+                    'reason': order.failure_reason,
+                    'timestamp': timezone.now().isoformat()
+                }
             )
-        except Exception as e:
-            logger.error(f"Error storing price history: {e}")
+    
+    async def push_positions(self, symbol: str, current_price: Decimal, pnl_by_trade: dict):
+        """Send each user the new price and unrealized P&L of their positions in this symbol"""
+        if not pnl_by_trade:
+            return
+        
+        by_user = {}
+        for position in position_index.get(symbol):
+            if position['id'] not in pnl_by_trade:
+                continue
+            # Same keys and formatting as ActivePositionSerializer, so consumers can diff
+            by_user.setdefault(position['user_id'], []).append({
+                'id': str(position['id']),
+                'asset_symbol': symbol,
+                'current_price': format_decimal(current_price),
+                'unrealized_pnl': format_decimal(pnl_by_trade[position['id']]),
+            })
+        
+        for user_id, positions in by_user.items():
+            await self._send_notification(
+                user_id=user_id,
+                notification_type='positions.update',
+                data={'positions': positions}
+            )
+    
+    async def flush_price_history(self):
+        """Bulk-write buffered price history and OHLCV bars"""
+        rows, bars = self.price_history.drain()
+        if rows or bars:
+            await sync_to_async(self.price_history.write)(rows, bars)
     
     async def _send_notification(self, user_id: int, notification_type: str, data: dict):
         """Send notification via WebSocket channel"""
@@ -319,29 +390,52 @@ class DeltaWebSocketManager:
         except Exception as e:
             logger.error(f"Error sending notification: {e}")
     
+    async def apply_ticker(self, ticker_data: dict, shard_id: int = None):
+        """Apply the latest conflated ticker of a symbol to its open trades (on its shard's DB thread)"""
+        symbol = ticker_data['symbol']
+        mark_price = ticker_data['mark_price']
+        
+        # Compare prices
+        comparison = self.compare_prices(symbol, mark_price, ticker_data)
+        
+        logger.info(
+            f"📊 {symbol}: {mark_price} (Dir: {comparison['direction']}, "
+            f"Change: {comparison['price_change_percent']:.2f}%)"
+        )
+        
+        # Fan out to other processes before the DB work
+        await self.publisher.publish(ticker_data)
+        
+        # Update trades
+        summary = await self.run_on_shard(shard_id, self.update_trade_prices, symbol, ticker_data, comparison)
+        if summary and summary.get('pnl_by_trade'):
+            await self.push_positions(symbol, mark_price, summary['pnl_by_trade'])
+        if summary and summary['margin_calls']:
+            await self.dispatch_margin_calls(symbol, mark_price, summary['margin_calls'])
+        if summary and summary['liquidations']:
+            await self.liquidate_positions(symbol, mark_price, summary['liquidations'], shard_id)
+        
+        # Fill resting LIMIT / STOP orders
+        await self.match_orders(symbol, mark_price, shard_id)
+        
+        # Store price history for analysis
+        self.price_history.add(ticker_data)
+        if self.price_history.should_flush():
+            await self.flush_price_history()
+    
     async def handle_message(self, message: str):
         """Process incoming WebSocket messages"""
         try:
             data = json.loads(message)
             
-            # Handle ticker updates
+            # Handle ticker updates - conflated, applied by the shard's flush task
             if data.get('type') == 'v2/ticker':
                 ticker_data = self.extract_ticker_data(data)
                 
                 if ticker_data:
-                    symbol = ticker_data['symbol']
-                    mark_price = ticker_data['mark_price']
-                    
-                    # Compare prices
-                    comparison = self.compare_prices(symbol, mark_price, data)
-                    
-                    logger.info(
-                        f"📊 {symbol}: {mark_price} (Dir: {comparison['direction']}, "
-                        f"Change: {comparison['price_change_percent']:.2f}%)"
-                    )
-                    
-                    # Update trades
-                    await self.update_trade_prices(symbol, ticker_data, comparison)
+                    self.price_history.record_tick(ticker_data)
+                    shard_id = self.feed.ring.shard_for(ticker_data['symbol'])
+                    self.conflator_for(shard_id).offer(ticker_data['symbol'], ticker_data)
             
             # Handle subscription confirmations
             elif data.get('type') == 'subscriptions':
@@ -356,42 +450,67 @@ class DeltaWebSocketManager:
         except Exception as e:
             logger.error(f"Error handling message: {e}")
     
-    async def listen(self):
-        """Listen for incoming messages with reconnection logic"""
+    async def sync_symbols(self):
+        """Reconcile subscriptions with active trades and resting orders"""
+        symbols = set(await self.get_active_symbols())
+        to_subscribe = symbols - self.subscribed_symbols
+        to_unsubscribe = self.subscribed_symbols - symbols
+        
+        if to_subscribe:
+            await self.subscribe_symbols(list(to_subscribe))
+        if to_unsubscribe:
+            await self.unsubscribe_symbols(list(to_unsubscribe))
+    
+    def refresh_positions(self, trade_ids: list) -> set:
+        """Reload trades changed in another process and rebuild their trigger levels"""
+        trade_ids = [uuid.UUID(str(trade_id)) for trade_id in trade_ids]
+        symbols = {position_index.symbol_by_trade.get(trade_id) for trade_id in trade_ids}
+        position_index.refresh(trade_ids)
+        symbols |= {position_index.symbol_by_trade.get(trade_id) for trade_id in trade_ids}
+        symbols.discard(None)
+        for symbol in symbols:
+            liquidation_engine.sync(symbol)
+        return symbols
+    
+    async def handle_command(self, message: dict):
+        """Apply a subscription or position command sent by another process"""
+        command = message.get('type')
+        if command == 'feed.subscribe':
+            symbols = [s for s in message.get('symbols', []) if s not in self.subscribed_symbols]
+            await self.subscribe_symbols(symbols)
+        elif command == 'feed.unsubscribe':
+            await self.unsubscribe_symbols(message.get('symbols', []))
+        elif command == 'feed.sync':
+            await sync_to_async(position_index.resync)()
+            await self.sync_symbols()
+        elif command == 'position.refresh':
+            symbols = await sync_to_async(self.refresh_positions)(message.get('trade_ids', []))
+            await self.subscribe_symbols([s for s in symbols if s not in self.subscribed_symbols])
+        else:
+            logger.warning(f"Unknown feed command: {command}")
+    
+    async def listen_commands(self):
+        """Receive subscription commands on the feed control group"""
+        channel_layer = get_channel_layer()
+        if not channel_layer:
+            logger.warning("No channel layer configured, feed commands disabled")
+            return
+        
+        channel = await channel_layer.new_channel()
         while self.running:
             try:
-                if not self.websocket:
-                    connected = await self.connect()
-                    if connected:
-                        symbols = await self.get_active_symbols()
-                        if symbols:
-                            await self.subscribe_symbols(symbols)
-                    else:
-                        await asyncio.sleep(self.reconnect_delay)
-                        self.reconnect_delay = min(self.reconnect_delay * 2, self.max_reconnect_delay)
-                        continue
-                
-                message = await asyncio.wait_for(self.websocket.recv(), timeout=60)
-                await self.handle_message(message)
-            
+                # Re-joined periodically so group membership never expires
+                await channel_layer.group_add(FEED_CONTROL_GROUP, channel)
+                message = await asyncio.wait_for(
+                    channel_layer.receive(channel), timeout=self.symbol_sync_interval
+                )
+                await self.handle_command(message)
             except asyncio.TimeoutError:
-                logger.warning("No message received in 60 seconds, checking connection...")
-                try:
-                    pong = await self.websocket.ping()
-                    await asyncio.wait_for(pong, timeout=10)
-                    logger.info("✅ Ping successful")
-                except Exception:
-                    logger.error("Ping failed, reconnecting...")
-                    self.websocket = None
-            
-            except websockets.exceptions.ConnectionClosed:
-                logger.warning("WebSocket closed. Reconnecting...")
-                self.websocket = None
-                await asyncio.sleep(self.reconnect_delay)
-                self.reconnect_delay = min(self.reconnect_delay * 2, self.max_reconnect_delay)
-            
+                await self.sync_symbols()
+            except asyncio.CancelledError:
+                raise
             except Exception as e:
-                logger.error(f"Error in listen loop: {e}")
+                logger.error(f"Error in feed command loop: {e}")
                 await asyncio.sleep(5)
     
     async def start(self):
@@ -399,34 +518,94 @@ class DeltaWebSocketManager:
         logger.info("🚀 Starting Delta Exchange WebSocket Manager...")
         self.running = True
         
-        if await self.connect():
-            symbols = await self.get_active_symbols()
-            if symbols:
-                logger.info(f"Subscribing to {len(symbols)} symbols...")
-                await self.subscribe_symbols(symbols)
-            else:
-                logger.info("No active trades, waiting for new trades...")
-            
-            await self.listen()
+        # Open positions are kept in memory from here on
+        await sync_to_async(position_index.warm)()
+        await sync_to_async(order_books.warm)()
+        
+        symbols = await self.get_active_symbols()
+        if symbols:
+            logger.info(f"Subscribing to {len(symbols)} symbols...")
+            await self.subscribe_symbols(symbols)
         else:
-            logger.error("Failed to start WebSocket manager")
+            logger.info("No active trades or orders, waiting for new ones...")
+        
+        # Shards connect and resubscribe their own symbols on (re)connect
+        self.feed.start()
+        for shard_id in self.feed.shards:
+            self.executors[shard_id] = ThreadPoolExecutor(max_workers=1, thread_name_prefix=f"feed-shard-{shard_id}")
+            self.conflator_for(shard_id).start(partial(self.apply_ticker, shard_id=shard_id))
+        self.tasks = [
+            asyncio.create_task(self.listen_commands()),
+            asyncio.create_task(self.publish_stats()),
+        ]
+        await self.feed.wait()
     
     async def stop(self):
         """Stop the WebSocket manager"""
         logger.info("Stopping WebSocket Manager...")
         self.running = False
-        if self.websocket:
-            await self.websocket.close()
+        for task in self.tasks:
+            task.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+        self.tasks = []
+        await self.feed.stop()
+        for shard_id, conflator in self.conflators.items():
+            await conflator.stop(partial(self.apply_ticker, shard_id=shard_id))
+        for executor in self.executors.values():
+            executor.shutdown(wait=True)
+        self.executors = {}
+        await self.flush_price_history()
+        await sync_to_async(cache.delete)(FEED_STATS_KEY)
 
 
 # Global instance
 ws_manager = DeltaWebSocketManager()
 
 
+async def send_feed_command(command: str, **payload):
+    """Ask the feed ingestor process to change its subscriptions"""
+    channel_layer = get_channel_layer()
+    if channel_layer:
+        await channel_layer.group_send(FEED_CONTROL_GROUP, {'type': command, **payload})
+
+
 async def subscribe_to_symbol(symbol: str):
     """Subscribe to a new symbol"""
-    if symbol not in ws_manager.subscribed_symbols:
-        await ws_manager.subscribe_symbols([symbol])
+    if ws_manager.running:
+        # Called inside the ingestor itself
+        if symbol not in ws_manager.subscribed_symbols:
+            await ws_manager.subscribe_symbols([symbol])
+    else:
+        await send_feed_command('feed.subscribe', symbols=[symbol])
+
+
+async def unsubscribe_from_symbols(symbols: list):
+    """Drop symbols that no longer have trades or orders"""
+    if ws_manager.running:
+        await ws_manager.unsubscribe_symbols(symbols)
+    else:
+        await send_feed_command('feed.unsubscribe', symbols=symbols)
+
+
+def feed_status() -> dict:
+    """The feed ingestor's last published stats; ``running`` is False when they are missing or stale"""
+    published = cache.get(FEED_STATS_KEY)
+    if not published:
+        return {'running': False, 'connected': False}
+    age = time.time() - published['published_at']
+    return {
+        **published,
+        'running': age <= ws_manager.stats_interval * 3,
+        'stats_age_seconds': round(age, 1),
+    }
+
+
+async def refresh_positions(trade_ids: list):
+    """Have the feed ingestor reload trades opened, resized or closed in this process"""
+    if ws_manager.running:
+        # Called inside the ingestor itself - its signals already keep the index current
+        return
+    await send_feed_command('position.refresh', trade_ids=[str(trade_id) for trade_id in trade_ids])
 # # websocket_manager.py
 # import json
 # import asyncio
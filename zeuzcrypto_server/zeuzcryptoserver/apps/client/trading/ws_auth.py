@@ -0,0 +1,75 @@
+# ws_auth.py
+import logging
+from urllib.parse import parse_qs
+from channels.db import database_sync_to_async
+from channels.middleware import BaseMiddleware
+from channels.security.websocket import OriginValidator
+from django.contrib.auth.models import AnonymousUser
+
+logger = logging.getLogger(__name__)
+
+
+@database_sync_to_async
+def get_user_for_token(raw_token: str):
+    """Resolve a SimpleJWT access token to its user (AnonymousUser if invalid)"""
+    from rest_framework_simplejwt.authentication import JWTAuthentication
+    from rest_framework_simplejwt.exceptions import InvalidToken, AuthenticationFailed
+
+    authentication = JWTAuthentication()
+    try:
+        validated_token = authentication.get_validated_token(raw_token)
+        return authentication.get_user(validated_token)
+    except (InvalidToken, AuthenticationFailed) as e:
+        logger.info(f"Rejected websocket token: {e}")
+        return AnonymousUser()
+
+
+class JWTAuthMiddleware(BaseMiddleware):
+    """
+    Authenticates websocket connections with the same JWT access tokens as the REST API.
+
+    Browsers cannot set an Authorization header on a websocket handshake, so
+    the token is read from the ``token`` query parameter
+    (``ws://host/ws/trading/?token=<access>``), falling back to a
+    ``Bearer`` Authorization header for non-browser clients.
+    """
+
+    async def __call__(self, scope, receive, send):
+        scope = dict(scope)
+        raw_token = self.get_raw_token(scope)
+        scope['user'] = await get_user_for_token(raw_token) if raw_token else AnonymousUser()
+        return await super().__call__(scope, receive, send)
+
+    @staticmethod
+    def get_raw_token(scope) -> str:
+        query = parse_qs(scope.get('query_string', b'').decode())
+        if query.get('token'):
+            return query['token'][0]
+        return JWTAuthMiddleware.get_bearer_token(scope)
+
+    @staticmethod
+    def get_bearer_token(scope) -> str:
+        for name, value in scope.get('headers', []):
+            if name == b'authorization':
+                parts = value.decode().split()
+                if len(parts) == 2 and parts[0] == 'Bearer':
+                    return parts[1]
+        return ''
+
+
+class BearerOriginValidator(OriginValidator):
+    """
+    Origin check for browser handshakes that lets header-authenticated clients through.
+
+    Browsers always send an Origin header on a websocket handshake, and a
+    page cannot set an Authorization header on one. A handshake with a
+    ``Bearer`` header and no Origin therefore comes from a non-browser
+    client, not a cross-site page, so it skips the origin check and is
+    authenticated by ``JWTAuthMiddleware`` like any other connection.
+    """
+
+    async def __call__(self, scope, receive, send):
+        headers = dict(scope.get('headers', []))
+        if scope['type'] == 'websocket' and b'origin' not in headers and JWTAuthMiddleware.get_bearer_token(scope):
+            return await self.application(scope, receive, send)
+        return await super().__call__(scope, receive, send)
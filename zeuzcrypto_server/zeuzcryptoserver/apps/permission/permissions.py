@@ -83,12 +83,18 @@ class IsB2BAdminOrCreator(permissions.BasePermission):
 
 from rest_framework import permissions
 from apps.admin.subscriptions.models import Subscription
+from apps.admin.subscriptions.entitlements import get_entitlement
 from django.utils import timezone
+from django.utils.functional import SimpleLazyObject
 
 
 class HasActiveSubscription(permissions.BasePermission):
     """
     Allows access only to users with an active (non-expired) subscription.
+
+    Uses the cached entitlement (subscription id + end date), so a request
+    costs no query on a cache hit. Overdue rows are flipped to EXPIRED by
+    the ``expire_subscriptions`` beat task, not here.
     """
 
     message = {"detail": "You don't have an active subscription."}
@@ -101,25 +107,15 @@ class HasActiveSubscription(permissions.BasePermission):
             self.message = {"detail": "Authentication required."}
             return False
 
-        # Auto-expire any outdated subscriptions
-        Subscription.objects.filter(
-            user=user,
-            end_date__lt=timezone.now(),
-            status="ACTIVE"
-        ).update(status="EXPIRED")
-
-        # Check if user has a valid active subscription
-        active_subscription = (
-            Subscription.objects
-            .filter(user=user, status="ACTIVE", end_date__gte=timezone.now())
-            .order_by('-end_date')
-            .first()
-        )
-
-        if not active_subscription:
+        entitlement = get_entitlement(user.pk)
+        if not entitlement["subscription_id"] or entitlement["end_date"] < timezone.now():
             self.message = {"detail": "You don't have an active subscription."}
             return False
 
-        # Optional: attach subscription to request for easy access in views
-        request.active_subscription = active_subscription
+        # Optional: attach subscription to request for easy access in views (loaded on first use)
+        subscription_id = entitlement["subscription_id"]
+        request.active_subscription_id = subscription_id
+        request.active_subscription = SimpleLazyObject(
+            lambda: Subscription.objects.get(pk=subscription_id)
+        )
         return True
@@ -13,4 +13,22 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "zeuzcryptoserver.settings_production")
 
-application = get_asgi_application()
+# Initialise Django before importing consumers (they import models)
+django_asgi_app = get_asgi_application()
+
+from django.conf import settings
+from channels.routing import ProtocolTypeRouter, URLRouter
+
+from apps.client.trading.routing import websocket_urlpatterns as trading_websocket_urlpatterns
+from apps.client.trading.ws_auth import BearerOriginValidator, JWTAuthMiddleware
+
+application = ProtocolTypeRouter(
+    {
+        "http": django_asgi_app,
+        # Same origins as the REST API's CORS policy; Bearer clients without an Origin pass
+        "websocket": BearerOriginValidator(
+            JWTAuthMiddleware(URLRouter(trading_websocket_urlpatterns)),
+            getattr(settings, "CORS_ALLOWED_ORIGINS", []),
+        ),
+    }
+)
@@ -31,4 +31,20 @@ app.conf.beat_schedule = {
         'task': 'apps.client.trading.tasks.daily_portfolio_snapshot',
         'schedule': crontab(minute=0, hour=0),  # Every day at midnight
     },
+    'expire-subscriptions': {
+        'task': 'apps.admin.subscriptions.tasks.expire_subscriptions',
+        'schedule': timedelta(seconds=60),
+    },
+    'checkpoint-wallets': {
+        'task': 'apps.client.trading.tasks.checkpoint_wallets',
+        'schedule': timedelta(minutes=15),
+    },
+    'checkpoint-challenge-wallets': {
+        'task': 'apps.admin.challenge.tasks.checkpoint_challenge_wallets',
+        'schedule': timedelta(minutes=15),
+    },
+    'persist-leaderboards': {
+        'task': 'apps.admin.challenge.tasks.persist_leaderboards',
+        'schedule': timedelta(seconds=30),
+    },
 }
@@ -71,6 +71,7 @@ MIDDLEWARE = [
 # -----------------------------------------------------------------------------
 ROOT_URLCONF = "zeuzcryptoserver.urls"
 WSGI_APPLICATION = "zeuzcryptoserver.wsgi.application"
+ASGI_APPLICATION = "zeuzcryptoserver.asgi.application"
 
 # -----------------------------------------------------------------------------
 # Database
@@ -134,12 +135,34 @@ AUTH_PASSWORD_VALIDATORS = [
 ]
 
 # -----------------------------------------------------------------------------
-# Caches (default: local memory, use Redis in production)
+# Caches (Redis, shared by every worker: throttles, entitlements, responses)
+# Set CACHE_URL=locmem:// for an in-process cache, e.g. in tests.
 # -----------------------------------------------------------------------------
-CACHES = {
-    "default": {
-        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+CACHE_URL = os.getenv("CACHE_URL", "redis://127.0.0.1:6379/1")
+
+if CACHE_URL.startswith("locmem://"):
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        }
+    }
+else:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.redis.RedisCache",
+            "LOCATION": CACHE_URL,
+            "KEY_PREFIX": "zeuzcrypto",
+            "TIMEOUT": 300,
+        }
     }
+
+CACHE_SETTINGS = {
+    "RESPONSE_CACHE_TTL": 60,  # seconds; namespaces are also invalidated on writes
+    "LEADERBOARD_RANKING_TTL": 7 * 24 * 3600,  # seconds a loaded week ranking lives; reloaded on demand
+    "LEADERBOARD_PERSIST_BATCH": 100,  # changed weeks/programs written to their leaderboard tables per persist run
+    "PROGRAM_LEADERBOARD_REFRESH": "batched",  # "immediate": rebuild ChallengeProgramLeaderboard on each score commit
+    "EQUITY_CURVE_TTL": 7 * 24 * 3600,  # seconds a participation's equity curve state stays cached
+    "EQUITY_CURVE_LAG": 60,  # seconds of recent ledger rows applied but not cached (late commits)
 }
 
 # -----------------------------------------------------------------------------
@@ -168,6 +191,14 @@ REST_FRAMEWORK = {
         "rest_framework.parsers.MultiPartParser",
         "rest_framework.parsers.FormParser",
     ],
+    # Sliding-window limits enforced in Redis (apps.caching.throttling)
+    "DEFAULT_THROTTLE_RATES": {
+        "login": "10/minute",
+        "registration": "5/minute",
+        "password_reset": "5/hour",
+        "orders": "120/minute",
+        "challenge_orders": "120/minute",
+    },
 }
 
 # -----------------------------------------------------------------------------
@@ -289,6 +320,11 @@ SECURITY_SETTINGS = {
     "REQUIRE_EMAIL_VERIFICATION": True,
 }
 
+SUBSCRIPTION_SETTINGS = {
+    "ENTITLEMENT_CACHE_TTL": 300,  # seconds; entries are also invalidated on subscription changes
+    "EXPIRY_CHUNK_SIZE": 1000,  # subscriptions expired per UPDATE / history bulk insert
+}
+
 
 # -----------------------------------------------------------------------------
 # Trading System
@@ -330,6 +366,28 @@ TRADING_SETTINGS = {
     # Price Update Settings
     "PRICE_UPDATE_INTERVAL": 5,  # seconds
     "BATCH_SIZE": 100,  # trades to update in one batch
+    "FEED_WS_URL": "wss://socket.delta.exchange",  # run_feed_ingestor --url overrides (e.g. fake_exchange)
+    "FEED_SYMBOL_SYNC_INTERVAL": 30,  # seconds between subscription reconciles in the ingestor
+    "FEED_STATS_INTERVAL": 5,  # seconds between the ingestor's stats snapshots in the cache
+    "WS_MAX_SYMBOLS": 50,  # ticker groups one trading websocket may join
+    "POSITION_STREAM_BUFFER_SIZE": 100,  # delta messages kept per stream for resumes
+    "POSITION_STREAM_TTL": 300,  # seconds a disconnected stream can still be resumed
+    "POSITION_STREAM_SAVE_INTERVAL": 5,  # seconds between stream saves while connected (always saved on disconnect)
+    "FEED_SHARD_COUNT": 4,  # exchange websocket connections, symbols consistent-hashed across them
+    "FEED_SHARD_QUEUE_SIZE": 1000,  # frames buffered per shard before the oldest is dropped
+    "TICK_FLUSH_INTERVAL_MS": 250,  # conflated ticks are applied to the DB at this cadence
+    "PRICE_HISTORY_BUFFER_SIZE": 500,  # ticks buffered before a bulk insert
+    "PRICE_HISTORY_FLUSH_INTERVAL": 5,  # seconds, max age of buffered ticks
+    "PORTFOLIO_INCREMENTAL": True,  # apply trade deltas to portfolios instead of full recomputes
+    "POSITION_INDEX_MAX_AGE": 60,  # seconds before the feed reloads its open-position index
+    "AUTO_LIQUIDATE": True,  # close futures positions whose margin reaches zero
+    "ORDER_BOOK_RESYNC_INTERVAL": 2,  # seconds between re-reads of orders changed by other processes
+    "ORDER_GATE_MAX_INFLIGHT": 3,  # orders per user admitted at once (running or queued); more get 429
+    "ORDER_GATE_LOCK_TTL": 10,  # seconds a (user, symbol) order lock lives if never released
+    "ORDER_GATE_LOCK_WAIT": 2.0,  # seconds an admitted order waits for its (user, symbol) lock
+    "WALLET_LEDGER_MODE": False,  # derive balances from checkpoint + ledger instead of updating the wallet row
+    "WALLET_CHECKPOINT_CHUNK_SIZE": 1000,  # wallets verified and checkpointed per chunk
+    "WALLET_CHECKPOINT_LAG": 60,  # seconds; checkpoints stop this far behind now so in-flight entries land later
     # Webhook Settings
     "WEBHOOK_TIMEOUT": 30,  # seconds
     "WEBHOOK_RETRY_ATTEMPTS": 3,
@@ -370,6 +428,22 @@ CELERY_BEAT_SCHEDULE = {
         'task': 'apps.client.trading.tasks.monitor_all_margins',
         'schedule': 60.0,  # every minute
     },
+    'expire-subscriptions': {
+        'task': 'apps.admin.subscriptions.tasks.expire_subscriptions',
+        'schedule': 60.0,  # every minute
+    },
+    'checkpoint-wallets': {
+        'task': 'apps.client.trading.tasks.checkpoint_wallets',
+        'schedule': 900.0,  # every 15 minutes
+    },
+    'checkpoint-challenge-wallets': {
+        'task': 'apps.admin.challenge.tasks.checkpoint_challenge_wallets',
+        'schedule': 900.0,  # every 15 minutes
+    },
+    'persist-leaderboards': {
+        'task': 'apps.admin.challenge.tasks.persist_leaderboards',
+        'schedule': 30.0,  # every 30 seconds
+    },
 }
 
 # Logging Configuration